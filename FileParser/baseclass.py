@@ -1,8 +1,21 @@
 from abc import ABC, abstractmethod
-from typing import Any
+from typing import Any, Iterator
 
 class FileParserBaseClass(ABC):
     @abstractmethod
     def parse(cls) -> Any:
         raise NotImplementedError
-    
\ No newline at end of file
+
+    def iter_parse(self) -> Iterator[Any]:
+        """
+        Yield the parsed content piece by piece (pages, records or text blocks)
+        so it can be chunked while the file is still being read. Parsers that
+        cannot stream fall back to parse().
+        """
+        content = self.parse()
+        if content is None:
+            return
+        if isinstance(content, list):
+            yield from content
+        else:
+            yield content
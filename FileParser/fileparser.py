@@ -3,14 +3,27 @@ from langchain_community.document_loaders import PyPDFLoader
 from langchain_community.document_loaders import TextLoader
 from langchain_community.document_loaders import JSONLoader
 from langchain_community.document_loaders import UnstructuredHTMLLoader
+from langchain_core.documents import Document
 import json
 
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+from source.tracing import span, traced_iter
+
 from .baseclass import FileParserBaseClass
 
-#### csv file parser currently not used
 class CSVParser(FileParserBaseClass):
-    def __init__(self,filename):
+    # pandas infers the column types (nullable, so an int column with gaps stays int) and
+    # row templates can format them, e.g. "{age:.1f}"; pass dtype to fix types, e.g. {"zip": str}
+    params = {"chunksize": 50000, "dtype": None, "usecols": None}
+
+    def __init__(self,filename,options=None):
         self.file_name=filename
+        # options override params for this file; keys of other stages (row_template, ...) are ignored
+        self.params={**self.params,**{key: value for key, value in (options or {}).items() if key in self.params}}
     
     def parse(self):
         try:
@@ -19,6 +32,23 @@ class CSVParser(FileParserBaseClass):
         except:
             return None
 
+    def iter_parse(self):
+        """
+        Yield the rows as DataFrames of at most params["chunksize"] rows; each
+        carries the file name in frame.attrs["source"] and the position of its
+        first row in frame.attrs["first_row"].
+        """
+        first_row = 0
+        # only empty cells are missing, so "NA" or "None" in a text column stay text
+        with pd.read_csv(self.file_name, chunksize=self.params["chunksize"], dtype=self.params["dtype"],
+                         usecols=self.params["usecols"], na_values=[""], keep_default_na=False,
+                         dtype_backend="numpy_nullable") as reader:
+            for frame in reader:
+                frame.attrs["source"] = self.file_name
+                frame.attrs["first_row"] = first_row
+                first_row += len(frame)
+                yield frame
+
 class JSONparser(FileParserBaseClass):
     def __init__(self,filename):
         self.file_name=filename
@@ -30,6 +60,35 @@ class JSONparser(FileParserBaseClass):
                 return data
         except:
             return None
+
+    def iter_parse(self):
+        """
+        Yield the top level of the file one entry at a time, as single key
+        dicts: {key: value} for an object and {"<index>": item} for an array.
+        With ijson installed the file is parsed incrementally, so only one
+        entry is in memory at a time; without it the file is loaded with json.
+        """
+        with open(self.file_name, "rb") as file:
+            first = file.read(1)
+            while first.isspace():
+                first = file.read(1)
+            file.seek(file.tell() - len(first))
+            if ijson is not None and first == b"{":
+                for key, value in ijson.kvitems(file, "", use_float=True):
+                    yield {key: value}
+            elif ijson is not None and first == b"[":
+                for index, item in enumerate(ijson.items(file, "item", use_float=True)):
+                    yield {str(index): item}
+            else:
+                data = json.load(file)
+                if isinstance(data, dict):
+                    for key, value in data.items():
+                        yield {key: value}
+                elif isinstance(data, list):
+                    for index, item in enumerate(data):
+                        yield {str(index): item}
+                else:
+                    yield {"value": data}
         
 class HTMLparser(FileParserBaseClass):
     def __init__(self,filename):
@@ -42,6 +101,9 @@ class HTMLparser(FileParserBaseClass):
         except:
             return None
 
+    def iter_parse(self):
+        yield from UnstructuredHTMLLoader(self.file_name).lazy_load()
+
 class PDFParser(FileParserBaseClass):
     def __init__(self, filename):
         self.file_name = filename
@@ -54,6 +116,12 @@ class PDFParser(FileParserBaseClass):
         except:
             return None
 
+    def iter_parse(self):
+        """
+        Yield one page at a time; the splitter chunks each page as it arrives.
+        """
+        yield from PyPDFLoader(self.file_name).lazy_load()
+
 
 class TextFileParser(FileParserBaseClass):
     def __init__(self, filename):
@@ -68,12 +136,32 @@ class TextFileParser(FileParserBaseClass):
         except Exception as e:
             return None
 
+    def iter_parse(self, block_size=1 << 20):
+        """
+        Yield the file as blocks of about block_size characters, each cut at
+        the last paragraph break (or line break, or space for very long lines)
+        so a paragraph is not split across blocks.
+        """
+        metadata = {"source": self.file_name}
+        with open(self.file_name, "r", encoding="UTF-8") as file:
+            buffer = ""
+            for block in iter(lambda: file.read(block_size), ""):
+                buffer += block
+                for separator in ("\n\n", "\n", " "):
+                    cut = buffer.rfind(separator)
+                    if cut > 0 and (separator != " " or len(buffer) > 4 * block_size):
+                        yield Document(page_content=buffer[:cut], metadata=dict(metadata))
+                        buffer = buffer[cut + len(separator):]
+                        break
+            if buffer:
+                yield Document(page_content=buffer, metadata=dict(metadata))
+
 
 class FileParserFactory():
-    def __init__(self,file_type,file_name) -> None:
+    def __init__(self,file_type,file_name,csv_options=None) -> None:
         self.type=file_type
         self.file_parsers={
-            "csv":CSVParser(file_name),
+            "csv":CSVParser(file_name,csv_options),
             "pdf":PDFParser(file_name),
             "txt":TextFileParser(file_name),
             "html":HTMLparser(file_name),
@@ -81,7 +169,19 @@ class FileParserFactory():
             "json":JSONparser(file_name)
         }
 
+    def iter_parse(self):
+        """
+        Stream the file through the parser's iter_parse(), timed as the
+        "parser.parse" span.
+        """
+        return traced_iter("parser.parse", self.file_parsers[self.type].iter_parse(), file_type=self.type,
+                           streaming=True)
+
     def parse(self):
-        return self.file_parsers[self.type].parse()
+        with span("parser.parse", file_type=self.type) as parse_span:
+            content = self.file_parsers[self.type].parse()
+            if isinstance(content, list):
+                parse_span.add("documents", len(content))
+            return content
 
 
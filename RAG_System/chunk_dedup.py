@@ -0,0 +1,176 @@
+import hashlib
+import math
+import re
+import zlib
+
+import numpy as np
+
+MERSENNE_PRIME = np.uint64((1 << 31) - 1)
+WORD_PATTERN = re.compile(r"\w+")
+
+
+def chunk_location(doc):
+    """
+    Where a chunk came from: its source, chunk_id and page when known.
+    """
+    return {key: doc.metadata[key] for key in ("source", "chunk_id", "page") if key in doc.metadata}
+
+
+def normalized_hash(text):
+    return hashlib.sha1(" ".join(text.split()).lower().encode("utf-8")).hexdigest()
+
+
+class ChunkDeduplicator:
+    """
+    Drops duplicate chunks between splitting and indexing.
+
+    Exact duplicates (same text up to whitespace and case) are caught by a
+    hash. Near duplicates are found with MinHash signatures of word
+    shingles, computed in NumPy, and LSH banding: chunks sharing a band are
+    compared and one whose estimated Jaccard similarity to an already kept
+    chunk is at least threshold is dropped. The kept chunk gets
+    metadata["sources"], the locations of itself and every chunk folded into it.
+
+    add() works incrementally, so files can be deduplicated against each
+    other as they stream in.
+    """
+
+    def __init__(self, threshold=0.85, num_perm=128, bands=16, shingle_size=5, seed=1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+        self.bands = bands
+        self.rows = num_perm // bands
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, MERSENNE_PRIME, num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, MERSENNE_PRIME, num_perm, dtype=np.uint64)
+        self._exact = {}
+        self._buckets = [{} for _ in range(bands)]
+        self._signatures = []
+        self.kept = []
+        self.input_chunks = 0
+        self.exact_duplicates = 0
+        self.near_duplicates = 0
+        self.bytes_dropped = 0
+
+    def signature(self, text):
+        words = WORD_PATTERN.findall(text.lower())
+        size = self.shingle_size
+        shingles = {" ".join(words[i:i + size]) for i in range(max(1, len(words) - size + 1))}
+        hashes = np.fromiter((zlib.crc32(shingle.encode("utf-8")) for shingle in shingles),
+                             dtype=np.uint64, count=len(shingles)) % MERSENNE_PRIME
+        # (a * h + b) mod p stays below 2**63 because a, h < 2**31
+        return ((hashes[:, None] * self._a + self._b) % MERSENNE_PRIME).min(axis=0)
+
+    def _band_keys(self, signature):
+        return [signature[band * self.rows:(band + 1) * self.rows].tobytes() for band in range(self.bands)]
+
+    def _near_duplicate_of(self, signature, band_keys):
+        candidates = set()
+        for buckets, key in zip(self._buckets, band_keys):
+            candidates.update(buckets.get(key, ()))
+        best, best_similarity = None, self.threshold
+        for candidate in candidates:
+            similarity = float(np.mean(self._signatures[candidate] == signature))
+            if similarity >= best_similarity:
+                best, best_similarity = candidate, similarity
+        return best
+
+    def _fold(self, kept_doc, duplicate):
+        sources = kept_doc.metadata.get("sources") or [chunk_location(kept_doc)]
+        kept_doc.metadata["sources"] = sources + [chunk_location(duplicate)]
+        self.bytes_dropped += len(duplicate.page_content.encode("utf-8"))
+
+    def add(self, chunks):
+        """
+        Args:
+            chunks (list): New chunk documents.
+        Returns:
+            list: The chunks that are not duplicates of anything seen so far.
+        """
+        unique = []
+        for doc in chunks:
+            self.input_chunks += 1
+            text_hash = normalized_hash(doc.page_content)
+            kept_index = self._exact.get(text_hash)
+            if kept_index is not None:
+                self.exact_duplicates += 1
+                self._fold(self.kept[kept_index], doc)
+                continue
+            signature = self.signature(doc.page_content)
+            band_keys = self._band_keys(signature)
+            kept_index = self._near_duplicate_of(signature, band_keys)
+            if kept_index is not None:
+                self.near_duplicates += 1
+                self._exact[text_hash] = kept_index
+                self._fold(self.kept[kept_index], doc)
+                continue
+            kept_index = len(self.kept)
+            self.kept.append(doc)
+            self._signatures.append(signature)
+            self._exact[text_hash] = kept_index
+            for buckets, key in zip(self._buckets, band_keys):
+                buckets.setdefault(key, []).append(kept_index)
+            unique.append(doc)
+        return unique
+
+    def merged_sources(self):
+        """
+        Returns:
+            dict: chunk_id of every kept chunk that absorbed duplicates -> its source locations.
+        """
+        return {doc.metadata.get("chunk_id"): doc.metadata["sources"]
+                for doc in self.kept if "sources" in doc.metadata}
+
+    def report(self, embedding_dim=None, embed_batch_size=None):
+        """
+        What deduplication saved.
+        Args:
+            embedding_dim (int): Vector size, to count the dense index bytes saved.
+            embed_batch_size (int): Texts per embedding request, to count the requests saved.
+        Returns:
+            dict: Chunk counts, embedding calls and index bytes saved.
+        """
+        dropped = self.exact_duplicates + self.near_duplicates
+        report = {
+            "input_chunks": self.input_chunks,
+            "kept_chunks": len(self.kept),
+            "exact_duplicates": self.exact_duplicates,
+            "near_duplicates": self.near_duplicates,
+            "embedding_calls_saved": dropped,
+            "text_bytes_saved": self.bytes_dropped,
+        }
+        if embed_batch_size:
+            report["embedding_requests_saved"] = (math.ceil(self.input_chunks / embed_batch_size)
+                                                  - math.ceil(len(self.kept) / embed_batch_size))
+        if embedding_dim:
+            # float32 vectors in a flat FAISS index, plus the stored chunk text
+            report["index_bytes_saved"] = dropped * embedding_dim * 4 + self.bytes_dropped
+        return report
+
+
+def deduplicate_chunks(chunks, **kwargs):
+    """
+    Deduplicate one list of chunks.
+    Returns:
+        tuple: (kept chunks, ChunkDeduplicator) - call .report() on the latter for the savings.
+    """
+    deduplicator = ChunkDeduplicator(**kwargs)
+    return deduplicator.add(chunks), deduplicator
+
+
+def format_dedup_report(report):
+    """
+    One line summary of a ChunkDeduplicator.report().
+    """
+    line = (f"dedup: {report['input_chunks']} chunks -> {report['kept_chunks']} "
+            f"({report['exact_duplicates']} exact, {report['near_duplicates']} near duplicates), "
+            f"{report['embedding_calls_saved']} embedding calls saved")
+    if "index_bytes_saved" in report:
+        line += f", {report['index_bytes_saved'] / 1e6:.2f} MB index saved"
+    return line
+
+
+def print_dedup_report(report):
+    print(format_dedup_report(report))
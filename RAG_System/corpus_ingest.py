@@ -0,0 +1,326 @@
+import hashlib
+import itertools
+import os
+import time
+from collections import defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from langchain_community.vectorstores import FAISS
+
+from FileParser.fileparser import FileParserFactory
+from .chunk_dedup import ChunkDeduplicator, format_dedup_report
+from .dense_index import convert_vectorstore
+from .index_cache import file_hash
+from .keyword_index import CompactBM25Retriever
+from .vector_store_maker import VectorStoreMakingFactory
+
+SUPPORTED_EXTENSIONS = ("pdf", "txt", "json", "html", "htm", "csv")
+# parsed in the main process and streamed into embedding batches instead of returned whole by a worker
+STREAMED_EXTENSIONS = ("csv",)
+
+
+def find_corpus_files(folder, extensions=SUPPORTED_EXTENSIONS):
+    """
+    Walk a folder and collect the files the parsers can handle.
+    Args:
+        folder (str): Root folder of the corpus.
+        extensions (tuple): File extensions to keep, without the dot.
+    Returns:
+        list: Paths of the matching files.
+    """
+    files = []
+    for root, _, names in os.walk(folder):
+        for name in names:
+            if os.path.splitext(name)[1][1:].lower() in extensions:
+                files.append(os.path.join(root, name))
+    return files
+
+
+def assign_chunk_ids(chunks, source, content_hash, start=0):
+    """
+    Tag chunks with their source file, content hash and a stable chunk id.
+    Args:
+        chunks (list): Chunks of one file, in order.
+        source (str): Path of the file.
+        content_hash (str): Hash of the file content.
+        start (int): Position of the first chunk in the file, for files chunked in batches.
+    Returns:
+        list: The chunk ids, in the order of the chunks.
+    """
+    prefix = hashlib.sha1(f"{os.path.abspath(source)}\0{content_hash}".encode("utf-8")).hexdigest()[:16]
+    ids = []
+    for i, chunk in enumerate(chunks, start):
+        chunk_id = f"{prefix}-{i}"
+        chunk.metadata.setdefault("source", source)
+        chunk.metadata["content_hash"] = content_hash
+        chunk.metadata["chunk_id"] = chunk_id
+        ids.append(chunk_id)
+    return ids
+
+
+def timed_iter(iterable, stats, key):
+    """
+    Yield from an iterable, adding the time spent producing its items to stats[key].
+    """
+    iterator = iter(iterable)
+    while True:
+        start = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            # also counted when the producer fails, so a stage pulling this one can still subtract it
+            stats[key] += time.perf_counter() - start
+        yield item
+
+
+def parse_and_chunk(file_path, splitting_type="recursive"):
+    """
+    Parse and chunk one file. Runs inside a worker process.
+    The parser is streamed into the splitter, so pages, records or text
+    blocks are chunked as they are read.
+    Args:
+        file_path (str): Path of the file.
+        splitting_type (str): Splitter used for non html/json files.
+    Returns:
+        tuple: (chunks, stats) where stats holds timings and the error, if any.
+    """
+    file_extension = os.path.splitext(file_path)[1][1:].lower()
+    stats = {"file": file_path, "type": file_extension, "bytes": 0, "chunks": 0,
+             "content_hash": None, "parse_seconds": 0.0, "chunk_seconds": 0.0, "error": None}
+    try:
+        stats["bytes"] = os.path.getsize(file_path)
+        stats["content_hash"] = file_hash(file_path)
+        start = time.perf_counter()
+        content = timed_iter(FileParserFactory(file_type=file_extension, file_name=file_path).iter_parse(),
+                             stats, "parse_seconds")
+        chunks = list(VectorStoreMakingFactory(splitting_type=splitting_type, document=content,
+                                               file_extension=file_extension).iter_splittext())
+        stats["chunk_seconds"] = time.perf_counter() - start - stats["parse_seconds"]
+    except Exception as e:
+        stats["error"] = f"{type(e).__name__}: {e}"
+        return [], stats
+
+    assign_chunk_ids(chunks, file_path, stats["content_hash"])
+    stats["chunks"] = len(chunks)
+    return chunks, stats
+
+
+class CorpusIngestor:
+    """
+    Builds one merged FAISS + BM25 index over a folder of files.
+
+    Parsing and chunking run in a process pool. Files are submitted grouped
+    by type, largest first, with a bounded number in flight, and the chunks of
+    every finished file are streamed into embedding batches while the workers
+    keep parsing the rest.
+    """
+
+    def __init__(self, embeddings, splitting_type="recursive", max_workers=None,
+                 embed_batch_size=64, max_pending_files=None, dedup=True, index_mode="flat", index_params=None,
+                 csv_options=None):
+        self.embeddings = embeddings
+        self.splitting_type = splitting_type
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.embed_batch_size = embed_batch_size
+        self.max_pending_files = max_pending_files or self.max_workers * 2
+        self.deduplicator = ChunkDeduplicator() if dedup else None
+        self.index_mode = index_mode
+        self.index_params = index_params or {}
+        self.csv_options = csv_options
+        self.vectorstore = None
+        self.chunks = []
+        self._pending = []
+
+    def _submission_order(self, files):
+        by_type = defaultdict(list)
+        for file_path in files:
+            by_type[os.path.splitext(file_path)[1][1:].lower()].append(file_path)
+        ordered = []
+        for file_type in sorted(by_type):
+            ordered.extend(sorted(by_type[file_type], key=os.path.getsize, reverse=True))
+        return ordered
+
+    def _embed_pending(self, flush=False):
+        while len(self._pending) >= self.embed_batch_size or (flush and self._pending):
+            batch = self._pending[:self.embed_batch_size]
+            self._pending = self._pending[self.embed_batch_size:]
+            texts = [chunk.page_content for chunk in batch]
+            vectors = self.embeddings.embed_documents(texts)
+            metadatas = [chunk.metadata for chunk in batch]
+            ids = [chunk.metadata["chunk_id"] for chunk in batch]
+            if self.vectorstore is None:
+                self.vectorstore = FAISS.from_embeddings(list(zip(texts, vectors)), self.embeddings,
+                                                         metadatas=metadatas, ids=ids)
+            else:
+                self.vectorstore.add_embeddings(list(zip(texts, vectors)), metadatas=metadatas, ids=ids)
+
+    def ingest(self, files):
+        """
+        Parse, chunk, embed and index a list of files.
+        Args:
+            files (list): Paths of the files to ingest.
+        Returns:
+            dict: Per file stats, failures and totals.
+        """
+        started = time.perf_counter()
+        file_stats = []
+        streamed = [file_path for file_path in files
+                    if os.path.splitext(file_path)[1][1:].lower() in STREAMED_EXTENSIONS]
+        queue = deque(self._submission_order(
+            [file_path for file_path in files if os.path.splitext(file_path)[1][1:].lower() not in STREAMED_EXTENSIONS]))
+        with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+            in_flight = {}
+            while queue or in_flight:
+                while queue and len(in_flight) < self.max_pending_files:
+                    file_path = queue.popleft()
+                    in_flight[executor.submit(parse_and_chunk, file_path, self.splitting_type)] = time.perf_counter()
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    submitted = in_flight.pop(future)
+                    chunks, stats = future.result()
+                    stats["seconds"] = time.perf_counter() - submitted
+                    stats["mb_per_second"] = stats["bytes"] / 1e6 / stats["seconds"] if stats["seconds"] else 0.0
+                    file_stats.append(stats)
+                    if self.deduplicator is not None:
+                        chunks = self.deduplicator.add(chunks)
+                    self.chunks.extend(chunks)
+                    self._pending.extend(chunks)
+                self._embed_pending()
+        for file_path in streamed:
+            file_stats.append(self.ingest_stream(file_path))
+        self._embed_pending(flush=True)
+        self._sync_duplicate_sources()
+        if self.vectorstore is not None and self.index_mode != "flat":
+            # vectors stream into a flat index; IVF/PQ needs them all (or a sample) before training
+            self.vectorstore = convert_vectorstore(self.vectorstore, self.index_mode, **self.index_params)
+
+        elapsed = time.perf_counter() - started
+        failures = [stats for stats in file_stats if stats["error"]]
+        report = {
+            "files": file_stats,
+            "failures": failures,
+            "totals": {
+                "files": len(file_stats),
+                "failed": len(failures),
+                "chunks": len(self.chunks),
+                "bytes": sum(stats["bytes"] for stats in file_stats),
+                "seconds": elapsed,
+                "files_per_second": len(file_stats) / elapsed if elapsed else 0.0,
+                "chunks_per_second": len(self.chunks) / elapsed if elapsed else 0.0,
+            },
+        }
+        if self.deduplicator is not None and self.vectorstore is not None:
+            report["dedup"] = self.deduplicator.report(embedding_dim=self.vectorstore.index.d,
+                                                       embed_batch_size=self.embed_batch_size)
+        return report
+
+    def ingest_stream(self, file_path):
+        """
+        Parse and chunk one file in this process, embedding its chunks batch by
+        batch as they are produced, so the parsed file (a big CSV's rows) is
+        never held whole. The chunks themselves are kept, in the FAISS
+        docstore and in self.chunks for the BM25 index, so memory still grows
+        with the rendered text. If the file fails midway, the chunks before
+        the error stay indexed and the error is reported in the stats.
+        Returns:
+            dict: The file stats, as for the files parsed by the workers.
+        """
+        file_extension = os.path.splitext(file_path)[1][1:].lower()
+        stats = {"file": file_path, "type": file_extension, "bytes": 0, "chunks": 0,
+                 "content_hash": None, "parse_seconds": 0.0, "chunk_seconds": 0.0, "embed_seconds": 0.0,
+                 "error": None}
+        started = time.perf_counter()
+        try:
+            stats["bytes"] = os.path.getsize(file_path)
+            stats["content_hash"] = file_hash(file_path)
+            content = timed_iter(FileParserFactory(file_type=file_extension, file_name=file_path,
+                                                   csv_options=self.csv_options).iter_parse(),
+                                 stats, "parse_seconds")
+            chunks = timed_iter(VectorStoreMakingFactory(splitting_type=self.splitting_type, document=content,
+                                                         file_extension=file_extension,
+                                                         csv_options=self.csv_options).iter_splittext(),
+                                stats, "chunk_seconds")
+            while True:
+                batch = list(itertools.islice(chunks, self.embed_batch_size))
+                if not batch:
+                    break
+                assign_chunk_ids(batch, file_path, stats["content_hash"], start=stats["chunks"])
+                stats["chunks"] += len(batch)
+                if self.deduplicator is not None:
+                    batch = self.deduplicator.add(batch)
+                self.chunks.extend(batch)
+                self._pending.extend(batch)
+                start = time.perf_counter()
+                self._embed_pending()
+                stats["embed_seconds"] += time.perf_counter() - start
+        except Exception as e:
+            stats["error"] = f"{type(e).__name__}: {e}"
+        # the chunk stream pulls the parser, so its time includes parsing
+        stats["chunk_seconds"] -= stats["parse_seconds"]
+        stats["seconds"] = time.perf_counter() - started
+        stats["mb_per_second"] = stats["bytes"] / 1e6 / stats["seconds"] if stats["seconds"] else 0.0
+        return stats
+
+    def _sync_duplicate_sources(self):
+        # duplicates found after a chunk was embedded only updated our copy of its metadata
+        if self.deduplicator is None or self.vectorstore is None:
+            return
+        for chunk_id, sources in self.deduplicator.merged_sources().items():
+            doc = self.vectorstore.docstore.search(chunk_id)
+            if hasattr(doc, "metadata"):
+                doc.metadata["sources"] = sources
+
+    def keyword_retriever(self, k=5):
+        return CompactBM25Retriever.from_documents(self.chunks, k=k)
+
+
+def ingest_corpus(folder, embeddings, splitting_type="recursive", max_workers=None, embed_batch_size=64, dedup=True,
+                  index_mode="flat", index_params=None, csv_options=None):
+    """
+    Ingest every supported file under a folder into one FAISS + BM25 index.
+    Args:
+        folder (str): Root folder of the corpus.
+        embeddings (Embeddings): Embeddings used to build the dense index.
+        splitting_type (str): Splitter used for non html/json files.
+        max_workers (int): Number of parser processes, defaults to the CPU count.
+        embed_batch_size (int): Number of chunks sent to the embedder at once.
+        dedup (bool): Drop exact and near duplicate chunks across the corpus before embedding.
+        index_mode (str): Dense index type, see dense_index.INDEX_MODES.
+        index_params (dict): nlist, nprobe, ef_search, ... for the index mode.
+        csv_options (dict): CSVParser and CSVRowGroupChunker params for the CSV files, e.g.
+            {"dtype": {"zip": str}, "row_template": "{name}: {age:.1f}", "rows_per_document": 50}.
+    Returns:
+        tuple: (chunks, vectorstore, keyword_retriever, report)
+    """
+    ingestor = CorpusIngestor(embeddings, splitting_type=splitting_type, max_workers=max_workers,
+                              embed_batch_size=embed_batch_size, dedup=dedup, index_mode=index_mode,
+                              index_params=index_params, csv_options=csv_options)
+    report = ingestor.ingest(find_corpus_files(folder))
+    if not ingestor.chunks:
+        raise ValueError(f"No chunks could be built from {folder}")
+    return ingestor.chunks, ingestor.vectorstore, ingestor.keyword_retriever(), report
+
+
+def format_ingest_report(report):
+    """
+    Returns:
+        list: One line per file, then the totals and the dedup savings.
+    """
+    lines = []
+    for stats in sorted(report["files"], key=lambda stats: stats["file"]):
+        status = stats["error"] or "ok"
+        lines.append(f"{stats['file']}: {stats['chunks']} chunks, {stats['seconds']:.2f}s, "
+                     f"{stats['mb_per_second']:.2f} MB/s [{status}]")
+    totals = report["totals"]
+    lines.append(f"{totals['files']} files ({totals['failed']} failed), {totals['chunks']} chunks in "
+                 f"{totals['seconds']:.1f}s: {totals['files_per_second']:.1f} files/s, "
+                 f"{totals['chunks_per_second']:.1f} chunks/s")
+    if "dedup" in report:
+        lines.append(format_dedup_report(report["dedup"]))
+    return lines
+
+
+def print_ingest_report(report):
+    print("\n".join(format_ingest_report(report)))
@@ -0,0 +1,147 @@
+import math
+import uuid
+
+import faiss
+import numpy as np
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+
+INDEX_MODES = ("flat", "hnsw", "ivf_flat", "ivf_pq", "ivf_sq8")
+
+DEFAULT_PARAMS = {
+    "nlist": None,           # IVF lists, about 4 * sqrt(n) when None
+    "nprobe": 16,            # IVF lists scanned per query
+    "pq_m": None,            # PQ sub-quantizers, d / 8 rounded to a divisor of d when None
+    "pq_bits": None,         # bits per PQ code, 8 unless the corpus is too small to train 256 centroids
+    "hnsw_m": 32,            # HNSW graph degree
+    "ef_construction": 200,
+    "ef_search": 64,         # HNSW candidate list per query
+    "train_size": None,      # training vectors, enough for the clustering when None
+    "seed": 0,
+}
+
+
+def default_nlist(count):
+    # FAISS wants at least 39 training points per list
+    return max(1, min(int(4 * math.sqrt(count)), count // 39))
+
+
+def default_pq_m(dim):
+    target = max(1, dim // 8)
+    return max(m for m in range(1, target + 1) if dim % m == 0)
+
+
+def training_sample(vectors, mode, params):
+    """
+    Pick the vectors an IVF index is trained on: a uniform random sample,
+    big enough for nlist centroids (and the 2**pq_bits PQ codebook entries),
+    without training on the whole corpus.
+    """
+    count = len(vectors)
+    size = params["train_size"]
+    if size is None:
+        size = 64 * params["nlist"]
+        if mode == "ivf_pq":
+            size = max(size, 64 * (1 << params["pq_bits"]))
+    if size >= count:
+        return vectors
+    rng = np.random.default_rng(params["seed"])
+    return vectors[np.sort(rng.choice(count, size=size, replace=False))]
+
+
+def resolve_params(mode, count, dim, **overrides):
+    if mode not in INDEX_MODES:
+        raise ValueError(f"Unknown index mode {mode}, expected one of {INDEX_MODES}")
+    unknown = set(overrides) - set(DEFAULT_PARAMS)
+    if unknown:
+        raise ValueError(f"Unknown index parameters: {sorted(unknown)}")
+    params = {**DEFAULT_PARAMS, **{key: value for key, value in overrides.items() if value is not None}}
+    if params["nlist"] is None:
+        params["nlist"] = default_nlist(count)
+    if params["pq_m"] is None:
+        params["pq_m"] = default_pq_m(dim)
+    if params["pq_bits"] is None:
+        params["pq_bits"] = max(1, min(8, int(math.log2(max(2, count // 39)))))
+    return params
+
+
+def set_search_params(index, nprobe=None, ef_search=None):
+    """
+    Query-time recall/speed knobs: nprobe for IVF indexes, efSearch for HNSW.
+    """
+    if nprobe is not None:
+        try:
+            faiss.extract_index_ivf(index).nprobe = nprobe
+        except RuntimeError:
+            pass
+    if ef_search is not None and hasattr(index, "hnsw"):
+        index.hnsw.efSearch = ef_search
+
+
+def build_index(vectors, mode="flat", add_batch_size=65536, **params):
+    """
+    Build a FAISS index (L2, like FAISS.from_documents) over float32 vectors.
+    Args:
+        vectors (np.ndarray): n x d vectors.
+        mode (str): flat, hnsw, ivf_flat, ivf_pq or ivf_sq8.
+        params: See DEFAULT_PARAMS.
+    Returns:
+        faiss.Index: The trained index holding every vector, in input order.
+    """
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    count, dim = vectors.shape
+    params = resolve_params(mode, count, dim, **params)
+    if mode == "flat":
+        index = faiss.IndexFlatL2(dim)
+    elif mode == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, params["hnsw_m"])
+        index.hnsw.efConstruction = params["ef_construction"]
+    else:
+        quantizer = faiss.IndexFlatL2(dim)
+        if mode == "ivf_flat":
+            index = faiss.IndexIVFFlat(quantizer, dim, params["nlist"])
+        elif mode == "ivf_pq":
+            index = faiss.IndexIVFPQ(quantizer, dim, params["nlist"], params["pq_m"], params["pq_bits"])
+        else:
+            index = faiss.IndexIVFScalarQuantizer(quantizer, dim, params["nlist"], faiss.ScalarQuantizer.QT_8bit)
+        # the index keeps the quantizer alive only on the C++ side
+        index.own_fields = True
+        quantizer.this.disown()
+        index.train(training_sample(vectors, mode, params))
+    for start in range(0, count, add_batch_size):
+        index.add(vectors[start:start + add_batch_size])
+    set_search_params(index, nprobe=params["nprobe"], ef_search=params["ef_search"])
+    return index
+
+
+def index_memory_bytes(index):
+    return int(faiss.serialize_index(index).nbytes)
+
+
+def vectorstore_from_documents(documents, embeddings, mode="flat", ids=None, **params):
+    """
+    FAISS.from_documents with a selectable index mode.
+    Returns:
+        FAISS: A LangChain vector store over the chosen index.
+    """
+    vectors = np.asarray(embeddings.embed_documents([doc.page_content for doc in documents]), dtype=np.float32)
+    ids = ids or [doc.metadata.get("chunk_id") or str(uuid.uuid4()) for doc in documents]
+    return FAISS(
+        embedding_function=embeddings,
+        index=build_index(vectors, mode=mode, **params),
+        docstore=InMemoryDocstore(dict(zip(ids, documents))),
+        index_to_docstore_id=dict(enumerate(ids)),
+    )
+
+
+def convert_vectorstore(vectorstore, mode, **params):
+    """
+    Rebuild the index of an existing flat FAISS store in another mode, keeping
+    its documents and ids. HNSW indexes cannot delete vectors, so use an IVF
+    mode for stores that IndexManager updates in place.
+    """
+    if mode == "flat" and isinstance(vectorstore.index, faiss.IndexFlat):
+        return vectorstore
+    vectors = vectorstore.index.reconstruct_n(0, vectorstore.index.ntotal)
+    vectorstore.index = build_index(vectors, mode=mode, **params)
+    return vectorstore
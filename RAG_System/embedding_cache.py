@@ -0,0 +1,155 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from source.tracing import span
+
+from .index_cache import embedding_model_name
+
+DEFAULT_STORE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".embedding_cache.sqlite")
+
+
+class SQLiteVectorStore:
+    """
+    Local key/vector store backed by a single SQLite file.
+
+    Vectors are kept as float32 blobs. When the stored bytes exceed max_bytes
+    the least recently used vectors are deleted until the store is back under
+    the limit.
+    """
+
+    def __init__(self, path=DEFAULT_STORE_PATH, max_bytes=512 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS vectors ("
+            "key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS vectors_last_used ON vectors(last_used)")
+        self._conn.commit()
+        self._size = self._conn.execute("SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM vectors").fetchone()[0]
+
+    def get_many(self, keys):
+        """
+        Look up vectors by key.
+        Args:
+            keys (list): Keys to look up.
+        Returns:
+            dict: The vectors found, keyed by key.
+        """
+        found = {}
+        with self._lock:
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                rows = self._conn.execute(
+                    "SELECT key, vector FROM vectors WHERE key IN (%s)" % ",".join("?" * len(batch)),
+                    batch,
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+            if found:
+                now = time.time()
+                self._conn.executemany("UPDATE vectors SET last_used=? WHERE key=?", [(now, key) for key in found])
+                self._conn.commit()
+        return found
+
+    def put_many(self, items):
+        """
+        Store vectors and evict the least recently used ones above max_bytes.
+        Args:
+            items (dict): Vectors keyed by key.
+        """
+        now = time.time()
+        rows = [(key, np.asarray(vector, dtype=np.float32).tobytes(), now) for key, vector in items.items()]
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO vectors(key, vector, last_used) VALUES (?, ?, ?)", rows)
+            self._size += sum(len(row[1]) for row in rows)
+            if self._size > self.max_bytes:
+                self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        self._size = self._conn.execute("SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM vectors").fetchone()[0]
+        cursor = self._conn.execute("SELECT key, LENGTH(vector) FROM vectors ORDER BY last_used")
+        stale = []
+        for key, size in cursor:
+            if self._size <= self.max_bytes:
+                break
+            stale.append((key,))
+            self._size -= size
+        self._conn.executemany("DELETE FROM vectors WHERE key=?", stale)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that deduplicates texts, serves repeated texts from a
+    local vector store and sends only the misses upstream, in batches of
+    batch_size with at most max_concurrency batches in flight.
+
+    Keys are hash(model, text), so the same chunk text is embedded once
+    across files and runs. Queries are cached under their own namespace as
+    some models embed queries differently from documents.
+    """
+
+    def __init__(self, embeddings, store=None, batch_size=32, max_concurrency=4):
+        self.embeddings = embeddings
+        self.store = store if store is not None else SQLiteVectorStore()
+        self.model_name = embedding_model_name(embeddings)
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, kind, text):
+        return hashlib.sha256(f"{self.model_name}\0{kind}\0{text}".encode("utf-8")).hexdigest()
+
+    def _embed_batches(self, texts):
+        batches = [texts[start:start + self.batch_size] for start in range(0, len(texts), self.batch_size)]
+        if len(batches) == 1 or self.max_concurrency <= 1:
+            return [vector for batch in batches for vector in self.embeddings.embed_documents(batch)]
+        with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(batches))) as executor:
+            results = executor.map(self.embeddings.embed_documents, batches)
+            return [vector for batch_vectors in results for vector in batch_vectors]
+
+    def embed_documents(self, texts):
+        with span("embedder.documents") as embed_span:
+            keys = [self._key("doc", text) for text in texts]
+            unique = dict(zip(keys, texts))
+            vectors = self.store.get_many(list(unique))
+            missing = [key for key in unique if key not in vectors]
+            self.hits += len(unique) - len(missing)
+            self.misses += len(missing)
+            embed_span.add("cache_hits", len(unique) - len(missing))
+            embed_span.add("cache_misses", len(missing))
+            if missing:
+                fresh = dict(zip(missing, self._embed_batches([unique[key] for key in missing])))
+                self.store.put_many(fresh)
+                vectors.update(fresh)
+            return [vectors[key] for key in keys]
+
+    def embed_query(self, text):
+        with span("embedder.query") as embed_span:
+            key = self._key("query", text)
+            vector = self.store.get_many([key]).get(key)
+            if vector is not None:
+                self.hits += 1
+                embed_span.add("cache_hits")
+                return vector
+            self.misses += 1
+            embed_span.add("cache_misses")
+            vector = self.embeddings.embed_query(text)
+            self.store.put_many({key: vector})
+            return vector
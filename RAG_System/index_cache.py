@@ -0,0 +1,202 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+
+from .mmap_store import MmapDocuments, load_mmap_vectorstore, save_mmap_vectorstore, write_documents
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".index_cache")
+
+
+def file_hash(file_name, block_size=1 << 20):
+    """
+    Hash the content of a file without reading it into memory at once.
+    Args:
+        file_name (str): Path of the file to hash.
+        block_size (int): Number of bytes read per step.
+    Returns:
+        str: The sha256 hex digest of the file content.
+    """
+    digest = hashlib.sha256()
+    with open(file_name, "rb") as file:
+        for block in iter(lambda: file.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def embedding_model_name(embeddings):
+    """
+    Best effort name of the model behind a LangChain embeddings object.
+    """
+    for attribute in ("model_name", "model", "deployment"):
+        value = getattr(embeddings, attribute, None)
+        if isinstance(value, str) and value:
+            return value
+    return type(embeddings).__name__
+
+
+class VectorStoreCache:
+    """
+    On-disk cache of FAISS indexes and their chunk lists.
+
+    Entries are content addressed: the key is built from the file hash, the
+    splitter type and parameters and the embedding model name, so a changed
+    file, splitter or model never returns a stale index. Entries built from an
+    older version of a source file are evicted when the new one is saved, and
+    the cache keeps at most max_entries entries, dropping the least recently used.
+
+    Entries are stored in the memory mapped format of mmap_store and, with
+    mmap=True, loaded as read-only stores whose vectors and chunks stay in
+    the page cache: loading is near-instant and every worker process serving
+    the same entry shares one copy. When the chunk list is the vector store's
+    own documents it is stored once.
+    """
+
+    INDEX_DIR = "faiss"
+    CHUNKS_DIR = "chunks"
+    META_FILE = "meta.json"
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_entries=16, mmap=True):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.mmap = mmap
+
+    def make_key(self, content_hash, splitter_signature, model_name):
+        """
+        Build the cache key of one (file, splitter, embedding model) combination.
+        Args:
+            content_hash (str): Hash of the source file content.
+            splitter_signature (dict): Splitter type and parameters.
+            model_name (str): Name of the embedding model.
+        Returns:
+            str: The cache key.
+        """
+        payload = json.dumps(
+            {"file": content_hash, "splitter": splitter_signature, "model": model_name},
+            sort_keys=True,
+            # CSV dtypes are Python types
+            default=str,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _entry_dir(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def _read_meta(self, key):
+        try:
+            with open(os.path.join(self._entry_dir(key), self.META_FILE), "r") as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+    def _write_meta(self, key, meta):
+        meta_path = os.path.join(self._entry_dir(key), self.META_FILE)
+        with open(meta_path + ".tmp", "w") as file:
+            json.dump(meta, file)
+        os.replace(meta_path + ".tmp", meta_path)
+
+    def load(self, key, embeddings):
+        """
+        Load a cached index without touching the parser, splitter or embedder.
+        Args:
+            key (str): The cache key.
+            embeddings (Embeddings): Embeddings used for queries against the index.
+        Returns:
+            tuple: (chunks, vectorstore) on a hit, None on a miss.
+        """
+        meta = self._read_meta(key)
+        if meta is None:
+            return None
+        entry_dir = self._entry_dir(key)
+        try:
+            vectorstore = load_mmap_vectorstore(os.path.join(entry_dir, self.INDEX_DIR), embeddings, mmap=self.mmap)
+            if meta.get("chunks_in_index"):
+                chunks = MmapDocuments(os.path.join(entry_dir, self.INDEX_DIR))
+            else:
+                chunks = MmapDocuments(os.path.join(entry_dir, self.CHUNKS_DIR))
+            if not self.mmap:
+                chunks = list(chunks)
+        except Exception:
+            self.evict(key)
+            return None
+        meta["last_used"] = time.time()
+        self._write_meta(key, meta)
+        return chunks, vectorstore
+
+    def save(self, key, chunks, vectorstore, source=None, content_hash=None):
+        """
+        Store an index and its chunks, then evict stale and surplus entries.
+        Args:
+            key (str): The cache key.
+            chunks (list): The chunk documents the index was built from.
+            vectorstore (FAISS): The index to store.
+            source (str): Path of the source file.
+            content_hash (str): Hash of the source file; entries of the same source
+                with another hash are stale and get evicted.
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_dir = self._entry_dir(key) + ".tmp-%d" % os.getpid()
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        save_mmap_vectorstore(vectorstore, os.path.join(tmp_dir, self.INDEX_DIR))
+        chunks_in_index = self._chunks_in_index(chunks, vectorstore)
+        if not chunks_in_index:
+            write_documents(os.path.join(tmp_dir, self.CHUNKS_DIR), chunks)
+        now = time.time()
+        with open(os.path.join(tmp_dir, self.META_FILE), "w") as file:
+            json.dump(
+                {
+                    "source": os.path.abspath(source) if source else None,
+                    "file_hash": content_hash,
+                    "chunks_in_index": chunks_in_index,
+                    "created": now,
+                    "last_used": now,
+                },
+                file,
+            )
+        self.evict(key)
+        os.replace(tmp_dir, self._entry_dir(key))
+        self._evict_stale(key, source, content_hash)
+
+    @staticmethod
+    def _chunks_in_index(chunks, vectorstore):
+        if len(chunks) != vectorstore.index.ntotal:
+            return False
+        for position, chunk in enumerate(chunks):
+            doc = vectorstore.docstore.search(vectorstore.index_to_docstore_id[position])
+            if doc.page_content != chunk.page_content or doc.metadata != chunk.metadata:
+                return False
+        return True
+
+    def evict(self, key):
+        shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+
+    def entries(self):
+        """
+        List the cache entries with their metadata.
+        Returns:
+            dict: Metadata of every readable entry keyed by cache key.
+        """
+        if not os.path.isdir(self.cache_dir):
+            return {}
+        entries = {}
+        for key in os.listdir(self.cache_dir):
+            meta = self._read_meta(key)
+            if meta is not None:
+                entries[key] = meta
+        return entries
+
+    def _evict_stale(self, current_key, source, content_hash):
+        entries = self.entries()
+        if source:
+            source = os.path.abspath(source)
+            for key, meta in list(entries.items()):
+                if key != current_key and meta.get("source") == source and meta.get("file_hash") != content_hash:
+                    self.evict(key)
+                    del entries[key]
+        surplus = len(entries) - self.max_entries
+        if surplus > 0:
+            oldest = sorted(entries, key=lambda key: entries[key].get("last_used", 0))
+            for key in oldest[:surplus]:
+                self.evict(key)
@@ -0,0 +1,176 @@
+import hashlib
+import json
+import os
+
+from langchain_community.vectorstores import FAISS
+
+from .corpus_ingest import find_corpus_files, parse_and_chunk
+from .index_cache import file_hash
+from .keyword_index import CompactBM25Retriever
+from .mmap_store import STORE_FILE, load_mmap_vectorstore, save_mmap_vectorstore
+
+
+class IndexManager:
+    """
+    Keeps the dense (FAISS) and keyword (BM25) indexes of a corpus up to date
+    one document at a time.
+
+    A registry records which chunk ids came from which source file and which
+    content hash they were built from. Adding, replacing or deleting a file
+    only parses, embeds and indexes that file's chunks; the rest of the corpus
+    is never touched. Retrievers built on top of vectorstore and
+    keyword_retriever see the updates immediately.
+    """
+
+    REGISTRY_FILE = "registry.json"
+    KEYWORD_DIR = "keyword"
+    INDEX_DIR = "faiss"
+
+    def __init__(self, embeddings, splitting_type="recursive", vectorstore=None, keyword_retriever=None,
+                 registry=None, k=5):
+        self.embeddings = embeddings
+        self.splitting_type = splitting_type
+        self.vectorstore = vectorstore
+        self.keyword_retriever = keyword_retriever or CompactBM25Retriever(k=k)
+        self.registry = registry or {}
+
+    @classmethod
+    def from_chunks(cls, embeddings, vectorstore, chunks, keyword_retriever=None, **kwargs):
+        """
+        Adopt an index built by the corpus ingestion, whose chunks carry
+        source, content_hash and chunk_id metadata. Ingest with dedup=False:
+        a chunk folded into another file's copy would be lost when that file
+        is replaced or deleted.
+        """
+        registry = {}
+        for chunk in chunks:
+            if len(chunk.metadata.get("sources", ())) > 1:
+                raise ValueError("IndexManager needs chunks ingested with dedup=False, "
+                                 f"{chunk.metadata['chunk_id']} stands for {len(chunk.metadata['sources'])} chunks")
+            source = os.path.abspath(chunk.metadata["source"])
+            entry = registry.setdefault(source, {"hash": chunk.metadata["content_hash"], "chunk_ids": []})
+            entry["chunk_ids"].append(chunk.metadata["chunk_id"])
+        if keyword_retriever is None:
+            keyword_retriever = CompactBM25Retriever.from_documents(chunks, k=kwargs.pop("k", 5))
+        return cls(embeddings, vectorstore=vectorstore, keyword_retriever=keyword_retriever,
+                   registry=registry, **kwargs)
+
+    def documents(self):
+        return self.keyword_retriever.documents()
+
+    def corpus_version(self):
+        """
+        Version string of the indexed corpus; changes whenever a file is added,
+        replaced or deleted.
+        """
+        digest = hashlib.sha1(self.splitting_type.encode("utf-8"))
+        for source in sorted(self.registry):
+            digest.update(f"\0{source}\0{self.registry[source]['hash']}".encode("utf-8"))
+        return digest.hexdigest()
+
+    def _add_chunks(self, chunks):
+        texts = [chunk.page_content for chunk in chunks]
+        metadatas = [chunk.metadata for chunk in chunks]
+        ids = [chunk.metadata["chunk_id"] for chunk in chunks]
+        text_embeddings = list(zip(texts, self.embeddings.embed_documents(texts)))
+        if self.vectorstore is None:
+            self.vectorstore = FAISS.from_embeddings(text_embeddings, self.embeddings, metadatas=metadatas, ids=ids)
+        else:
+            self.vectorstore.add_embeddings(text_embeddings, metadatas=metadatas, ids=ids)
+        self.keyword_retriever.add_documents(chunks, ids=ids)
+
+    def _remove_chunks(self, chunk_ids):
+        if not chunk_ids:
+            return
+        if self.vectorstore is not None:
+            self.vectorstore.delete(chunk_ids)
+        self.keyword_retriever.delete(chunk_ids)
+
+    def upsert_file(self, file_path):
+        """
+        Add a file, or replace its chunks if its content changed.
+        Args:
+            file_path (str): Path of the file.
+        Returns:
+            str: "unchanged", "added" or "replaced".
+        """
+        source = os.path.abspath(file_path)
+        entry = self.registry.get(source)
+        if entry is not None and entry["hash"] == file_hash(source):
+            return "unchanged"
+
+        chunks, stats = parse_and_chunk(source, self.splitting_type)
+        if stats["error"]:
+            raise ValueError(f"Could not index {file_path}: {stats['error']}")
+
+        if entry is not None:
+            self._remove_chunks(entry["chunk_ids"])
+        if chunks:
+            self._add_chunks(chunks)
+        self.registry[source] = {"hash": stats["content_hash"],
+                                 "chunk_ids": [chunk.metadata["chunk_id"] for chunk in chunks]}
+        return "added" if entry is None else "replaced"
+
+    def delete_file(self, file_path):
+        """
+        Remove every chunk of a file from both indexes.
+        Returns:
+            bool: False if the file was not indexed.
+        """
+        entry = self.registry.pop(os.path.abspath(file_path), None)
+        if entry is None:
+            return False
+        self._remove_chunks(entry["chunk_ids"])
+        return True
+
+    def sync_folder(self, folder):
+        """
+        Bring the indexes in line with the files currently in a folder.
+        Returns:
+            dict: Paths of the added, replaced, deleted and failed files.
+        """
+        changes = {"added": [], "replaced": [], "deleted": [], "failed": []}
+        present = {os.path.abspath(file_path) for file_path in find_corpus_files(folder)}
+        root = os.path.abspath(folder) + os.sep
+        for source in [source for source in self.registry if source.startswith(root) and source not in present]:
+            self.delete_file(source)
+            changes["deleted"].append(source)
+        for source in sorted(present):
+            try:
+                status = self.upsert_file(source)
+            except ValueError:
+                changes["failed"].append(source)
+                continue
+            if status != "unchanged":
+                changes[status].append(source)
+        return changes
+
+    def save(self, folder):
+        os.makedirs(folder, exist_ok=True)
+        if self.vectorstore is not None:
+            save_mmap_vectorstore(self.vectorstore, os.path.join(folder, self.INDEX_DIR))
+        self.keyword_retriever.save(os.path.join(folder, self.KEYWORD_DIR))
+        with open(os.path.join(folder, self.REGISTRY_FILE), "w") as file:
+            json.dump(self.registry, file)
+
+    @classmethod
+    def load(cls, folder, embeddings, mmap=False, **kwargs):
+        """
+        Args:
+            mmap (bool): Open the FAISS index memory mapped and read-only, for
+                worker processes that only serve queries; they share one copy
+                of the vectors and chunks through the page cache. The keyword
+                index is always memory mapped and stays updatable.
+        """
+        vectorstore = None
+        index_dir = os.path.join(folder, cls.INDEX_DIR)
+        if os.path.exists(os.path.join(index_dir, STORE_FILE)):
+            vectorstore = load_mmap_vectorstore(index_dir, embeddings, mmap=mmap)
+        elif os.path.isdir(index_dir):
+            # folders saved with FAISS.save_local
+            vectorstore = FAISS.load_local(index_dir, embeddings, allow_dangerous_deserialization=True)
+        keyword_retriever = CompactBM25Retriever.load(os.path.join(folder, cls.KEYWORD_DIR))
+        with open(os.path.join(folder, cls.REGISTRY_FILE), "r") as file:
+            registry = json.load(file)
+        return cls(embeddings, vectorstore=vectorstore, keyword_retriever=keyword_retriever,
+                   registry=registry, **kwargs)
@@ -0,0 +1,354 @@
+import json
+import math
+import os
+import pickle
+from array import array
+from collections import Counter
+from typing import Any, Callable, ClassVar, Dict, List, Optional
+
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from pydantic import ConfigDict, Field
+
+from source.tracing import span
+
+from .mmap_store import MmapDocuments, replace_file, write_documents
+
+
+def default_preprocessing_func(text: str) -> List[str]:
+    return text.split()
+
+
+class IncrementalBM25Retriever(BaseRetriever):
+    """
+    BM25 keyword retriever whose documents can be added and deleted in place.
+
+    Postings are kept per term, so adding or deleting a chunk only touches the
+    terms of that chunk, and a query only scores the chunks sharing a term with
+    it. Drop-in replacement for BM25Retriever in the EnsembleRetriever.
+    """
+
+    k: int = 5
+    k1: float = 1.5
+    b: float = 0.75
+    preprocess_func: Callable[[str], List[str]] = default_preprocessing_func
+    docs: Dict[str, Document] = Field(default_factory=dict, repr=False)
+    postings: Dict[str, Dict[str, int]] = Field(default_factory=dict, repr=False)
+    doc_lengths: Dict[str, int] = Field(default_factory=dict, repr=False)
+    total_length: int = 0
+    next_id: int = 0
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    @classmethod
+    def from_documents(cls, documents, ids: Optional[List[str]] = None, **kwargs: Any):
+        retriever = cls(**kwargs)
+        retriever.add_documents(list(documents), ids=ids)
+        return retriever
+
+    def documents(self) -> List[Document]:
+        return list(self.docs.values())
+
+    def add_documents(self, documents: List[Document], ids: Optional[List[str]] = None) -> List[str]:
+        """
+        Index documents, replacing any already stored under the same ids.
+        Args:
+            documents (list): Documents to index.
+            ids (list): Chunk ids, defaults to metadata["chunk_id"] or a running number.
+        Returns:
+            list: The ids of the indexed documents.
+        """
+        if ids is None:
+            ids = [doc.metadata.get("chunk_id") or self._new_id() for doc in documents]
+        self.delete([doc_id for doc_id in ids if doc_id in self.docs])
+        for doc_id, doc in zip(ids, documents):
+            tokens = self.preprocess_func(doc.page_content)
+            for term, frequency in Counter(tokens).items():
+                self.postings.setdefault(term, {})[doc_id] = frequency
+            self.docs[doc_id] = doc
+            self.doc_lengths[doc_id] = len(tokens)
+            self.total_length += len(tokens)
+        return list(ids)
+
+    def _new_id(self) -> str:
+        # a running number never handed out before, so it cannot replace a live chunk after deletions
+        while str(self.next_id) in self.docs:
+            self.next_id += 1
+        self.next_id += 1
+        return str(self.next_id - 1)
+
+    def delete(self, ids: List[str]) -> None:
+        for doc_id in ids:
+            doc = self.docs.pop(doc_id, None)
+            if doc is None:
+                continue
+            for term in set(self.preprocess_func(doc.page_content)):
+                term_postings = self.postings.get(term)
+                if term_postings is not None:
+                    term_postings.pop(doc_id, None)
+                    if not term_postings:
+                        del self.postings[term]
+            self.total_length -= self.doc_lengths.pop(doc_id)
+
+    def score(self, query: str) -> Dict[str, float]:
+        """
+        BM25 scores of every document sharing a term with the query.
+        """
+        n_docs = len(self.docs)
+        if n_docs == 0:
+            return {}
+        average_length = self.total_length / n_docs or 1.0
+        scores = {}
+        for term in self.preprocess_func(query):
+            term_postings = self.postings.get(term)
+            if not term_postings:
+                continue
+            idf = math.log(1 + (n_docs - len(term_postings) + 0.5) / (len(term_postings) + 0.5))
+            for doc_id, frequency in term_postings.items():
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_id] / average_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * frequency * (self.k1 + 1) / (frequency + norm)
+        return scores
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        scores = self.score(query)
+        best = sorted(scores, key=scores.get, reverse=True)[:self.k]
+        return [self.docs[doc_id] for doc_id in best]
+
+
+class CompactBM25Retriever(BaseRetriever):
+    """
+    BM25 keyword retriever backed by a CSR inverted index in NumPy arrays.
+
+    Postings are stored per term as slices of two flat arrays (document
+    positions and term frequencies) addressed by indptr, so memory is a few
+    bytes per (term, chunk) pair instead of Python lists per chunk, and a
+    query only scores the postings of its own terms, vectorized. The arrays
+    and the chunk documents can be saved and loaded back with mmap, so
+    workers serving the same folder share them through the page cache.
+
+    Added documents go to a small IncrementalBM25Retriever delta segment and
+    deleted ones are masked out, so in-place updates stay cheap. The delta is
+    folded into the arrays by compact() once it outgrows compact_ratio of the
+    corpus.
+    """
+
+    k: int = 5
+    k1: float = 1.5
+    b: float = 0.75
+    preprocess_func: Callable[[str], List[str]] = default_preprocessing_func
+    compact_ratio: float = 0.2
+    vocabulary: Dict[str, int] = Field(default_factory=dict, repr=False)
+    indptr: Any = Field(default=None, repr=False)
+    postings_docs: Any = Field(default=None, repr=False)
+    postings_tfs: Any = Field(default=None, repr=False)
+    doc_lengths: Any = Field(default=None, repr=False)
+    live: Any = Field(default=None, repr=False)
+    live_count: int = 0
+    live_length: float = 0.0
+    chunk_ids: List[str] = Field(default_factory=list, repr=False)
+    positions: Dict[str, int] = Field(default_factory=dict, repr=False)
+    main_docs: Any = Field(default_factory=list, repr=False)
+    df_adjust: Dict[int, int] = Field(default_factory=dict, repr=False)
+    delta: Optional[IncrementalBM25Retriever] = Field(default=None, repr=False)
+    next_id: int = 0
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    ARRAYS: ClassVar[tuple] = ("indptr", "postings_docs", "postings_tfs", "doc_lengths")
+
+    def __init__(self, **kwargs: Any):
+        super().__init__(**kwargs)
+        if self.indptr is None:
+            self._build([], [])
+        if self.delta is None:
+            self.delta = IncrementalBM25Retriever(preprocess_func=self.preprocess_func)
+
+    @classmethod
+    def from_documents(cls, documents, ids: Optional[List[str]] = None, **kwargs: Any):
+        documents = list(documents)
+        if ids is None:
+            ids = [doc.metadata.get("chunk_id") or str(i) for i, doc in enumerate(documents)]
+        retriever = cls(**kwargs)
+        retriever._build(documents, list(ids))
+        retriever.next_id = len(documents)
+        return retriever
+
+    def _build(self, documents, ids):
+        vocabulary = {}
+        term_ids = array("q")
+        doc_positions = array("i")
+        frequencies = array("H")
+        doc_lengths = array("f")
+        for position, doc in enumerate(documents):
+            tokens = self.preprocess_func(doc.page_content)
+            doc_lengths.append(len(tokens))
+            for term, frequency in Counter(tokens).items():
+                term_ids.append(vocabulary.setdefault(term, len(vocabulary)))
+                doc_positions.append(position)
+                frequencies.append(min(frequency, 65535))
+
+        term_ids = np.frombuffer(term_ids, dtype=np.int64)
+        order = np.argsort(term_ids, kind="stable")
+        self.indptr = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(term_ids, minlength=len(vocabulary)), out=self.indptr[1:])
+        self.postings_docs = np.frombuffer(doc_positions, dtype=np.int32)[order]
+        self.postings_tfs = np.frombuffer(frequencies, dtype=np.uint16)[order]
+        self.doc_lengths = np.frombuffer(doc_lengths, dtype=np.float32).copy()
+        self.vocabulary = vocabulary
+        self.live = np.ones(len(documents), dtype=bool)
+        self.live_count = len(documents)
+        self.live_length = float(self.doc_lengths.sum())
+        self.chunk_ids = list(ids)
+        self.positions = {doc_id: position for position, doc_id in enumerate(ids)}
+        self.main_docs = list(documents)
+        self.df_adjust = {}
+        self.delta = IncrementalBM25Retriever(preprocess_func=self.preprocess_func)
+
+    def documents(self) -> List[Document]:
+        live_docs = [doc for doc, alive in zip(self.main_docs, self.live) if alive]
+        return live_docs + list(self.delta.docs.values())
+
+    def add_documents(self, documents: List[Document], ids: Optional[List[str]] = None) -> List[str]:
+        """
+        Index documents in the delta segment, replacing any stored under the same ids.
+        """
+        if ids is None:
+            ids = [doc.metadata.get("chunk_id") or self._new_id() for doc in documents]
+        self.delete(list(ids))
+        self.delta.add_documents(documents, ids=list(ids))
+        if len(self.delta.docs) > self.compact_ratio * max(self.live_count, 1):
+            self.compact()
+        return list(ids)
+
+    def _new_id(self) -> str:
+        # a running number never handed out before, so it cannot replace a live chunk after deletions
+        while str(self.next_id) in self.positions or str(self.next_id) in self.delta.docs:
+            self.next_id += 1
+        self.next_id += 1
+        return str(self.next_id - 1)
+
+    def delete(self, ids: List[str]) -> None:
+        for doc_id in ids:
+            if doc_id in self.delta.docs:
+                self.delta.delete([doc_id])
+                continue
+            position = self.positions.pop(doc_id, None)
+            if position is None or not self.live[position]:
+                continue
+            self.live[position] = False
+            self.live_count -= 1
+            self.live_length -= float(self.doc_lengths[position])
+            for term in set(self.preprocess_func(self.main_docs[position].page_content)):
+                term_id = self.vocabulary[term]
+                self.df_adjust[term_id] = self.df_adjust.get(term_id, 0) - 1
+
+    def compact(self) -> None:
+        """
+        Rebuild the arrays from the live documents and the delta segment.
+        """
+        live_positions = np.flatnonzero(self.live)
+        documents = [self.main_docs[position] for position in live_positions] + list(self.delta.docs.values())
+        ids = [self.chunk_ids[position] for position in live_positions] + list(self.delta.docs)
+        self._build(documents, ids)
+
+    def score(self, query: str):
+        """
+        BM25 scores of the documents sharing a term with the query.
+        Returns:
+            tuple: (positions, scores) for the main segment and a dict of scores for the delta segment.
+        """
+        n_docs = self.live_count + len(self.delta.docs)
+        if n_docs == 0:
+            return np.empty(0, dtype=np.int32), np.empty(0), {}
+        average_length = (self.live_length + self.delta.total_length) / n_docs or 1.0
+
+        main_positions, main_scores, delta_scores = [], [], {}
+        for term in self.preprocess_func(query):
+            term_id = self.vocabulary.get(term)
+            delta_postings = self.delta.postings.get(term, {})
+            main_df = 0
+            if term_id is not None:
+                main_df = int(self.indptr[term_id + 1] - self.indptr[term_id]) + self.df_adjust.get(term_id, 0)
+            df = main_df + len(delta_postings)
+            if df <= 0:
+                continue
+            idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            if main_df > 0:
+                start, end = self.indptr[term_id], self.indptr[term_id + 1]
+                positions = self.postings_docs[start:end]
+                frequencies = self.postings_tfs[start:end].astype(np.float32)
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[positions] / average_length)
+                main_positions.append(positions)
+                main_scores.append(idf * frequencies * (self.k1 + 1) / (frequencies + norm))
+            for doc_id, frequency in delta_postings.items():
+                norm = self.k1 * (1 - self.b + self.b * self.delta.doc_lengths[doc_id] / average_length)
+                delta_scores[doc_id] = delta_scores.get(doc_id, 0.0) + idf * frequency * (self.k1 + 1) / (frequency + norm)
+
+        if not main_positions:
+            return np.empty(0, dtype=np.int32), np.empty(0), delta_scores
+        positions, inverse = np.unique(np.concatenate(main_positions), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(main_scores))
+        alive = self.live[positions]
+        return positions[alive], scores[alive], delta_scores
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        with span("retriever.bm25"):
+            return self._top_k(query)
+
+    def _top_k(self, query):
+        positions, scores, delta_scores = self.score(query)
+        if len(scores) > self.k:
+            best = np.argpartition(-scores, self.k)[:self.k]
+            positions, scores = positions[best], scores[best]
+        candidates = [(float(score), self.main_docs[position]) for position, score in zip(positions, scores)]
+        candidates.extend((score, self.delta.docs[doc_id]) for doc_id, score in delta_scores.items())
+        candidates.sort(key=lambda candidate: candidate[0], reverse=True)
+        return [doc for _, doc in candidates[:self.k]]
+
+    def save(self, folder: str) -> None:
+        """
+        Write the index to a folder; the arrays are stored as .npy files and
+        the documents as flat files (see mmap_store) so load() can mmap them.
+        """
+        if len(self.delta.docs) or self.live_count != len(self.main_docs):
+            self.compact()
+        os.makedirs(folder, exist_ok=True)
+        for name in self.ARRAYS:
+            # the arrays may be memory mapped from these very files
+            array_data = np.ascontiguousarray(getattr(self, name))
+            replace_file(os.path.join(folder, f"{name}.npy"), lambda file: np.save(file, array_data))
+        terms = sorted(self.vocabulary, key=self.vocabulary.get)
+        with open(os.path.join(folder, "keyword_index.json"), "w") as file:
+            json.dump({"k": self.k, "k1": self.k1, "b": self.b, "terms": terms, "chunk_ids": self.chunk_ids,
+                       "next_id": self.next_id}, file)
+        write_documents(folder, self.main_docs, ids=self.chunk_ids)
+        if os.path.exists(os.path.join(folder, "documents.pkl")):
+            os.remove(os.path.join(folder, "documents.pkl"))
+
+    @classmethod
+    def load(cls, folder: str, mmap: bool = True, **kwargs: Any):
+        mmap_mode = "r" if mmap else None
+        arrays = {name: np.load(os.path.join(folder, f"{name}.npy"), mmap_mode=mmap_mode) for name in cls.ARRAYS}
+        with open(os.path.join(folder, "keyword_index.json"), "r") as file:
+            meta = json.load(file)
+        if os.path.exists(os.path.join(folder, "documents.pkl")):
+            # folders saved before the documents moved to flat files
+            with open(os.path.join(folder, "documents.pkl"), "rb") as file:
+                main_docs = pickle.load(file)
+        else:
+            main_docs = MmapDocuments(folder)
+            if not mmap:
+                main_docs = list(main_docs)
+        chunk_ids = meta["chunk_ids"]
+        retriever = cls(k=meta["k"], k1=meta["k1"], b=meta["b"], **arrays, **kwargs)
+        retriever.vocabulary = {term: term_id for term_id, term in enumerate(meta["terms"])}
+        retriever.live = np.ones(len(main_docs), dtype=bool)
+        retriever.live_count = len(main_docs)
+        retriever.live_length = float(np.sum(retriever.doc_lengths, dtype=np.float64))
+        retriever.chunk_ids = chunk_ids
+        retriever.positions = {doc_id: position for position, doc_id in enumerate(chunk_ids)}
+        retriever.main_docs = main_docs
+        retriever.next_id = meta.get("next_id", 0)
+        return retriever
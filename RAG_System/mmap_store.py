@@ -0,0 +1,229 @@
+import json
+import mmap
+import os
+from array import array
+from collections.abc import Mapping, Sequence
+
+import faiss
+import numpy as np
+from langchain_community.docstore.base import Docstore
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from langchain_community.vectorstores.utils import DistanceStrategy
+from langchain_core.documents import Document
+
+TEXTS_FILE = "texts.bin"
+METADATA_FILE = "metadata.bin"
+IDS_FILE = "ids.bin"
+OFFSETS_FILE = "offsets.npy"
+INDEX_FILE = "index.faiss"
+STORE_FILE = "store.json"
+
+# flat codes (flat, HNSW storage, IVF lists) stay in the page cache instead of the heap
+MMAP_FLAGS = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+
+
+def replace_file(path, write):
+    """
+    Write a file next to its final path and move it into place, so processes
+    that have the old file memory mapped keep reading the old contents.
+    Args:
+        path (str): Final path.
+        write (callable): Called with the temporary file object.
+    """
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    with open(tmp_path, "wb") as file:
+        write(file)
+    os.replace(tmp_path, path)
+
+
+def write_documents(folder, documents, ids=None):
+    """
+    Write documents as three flat files (UTF-8 text, JSON metadata, ids) and
+    one array of their offsets, so MmapDocuments can read any of them without
+    loading the rest.
+    Args:
+        folder (str): Target folder, created if needed.
+        documents (iterable): The documents, in position order.
+        ids (list): Chunk ids, defaults to metadata["chunk_id"] or the position.
+    Returns:
+        int: The number of documents written.
+    """
+    os.makedirs(folder, exist_ok=True)
+    paths = [os.path.join(folder, name) for name in (TEXTS_FILE, METADATA_FILE, IDS_FILE)]
+    files = [open(f"{path}.tmp-{os.getpid()}", "wb") for path in paths]
+    offsets = array("q", [0, 0, 0])
+    positions = [0, 0, 0]
+    count = 0
+    try:
+        for position, doc in enumerate(documents):
+            doc_id = ids[position] if ids is not None else doc.metadata.get("chunk_id") or str(position)
+            parts = (doc.page_content.encode("utf-8"),
+                     json.dumps(doc.metadata, default=str).encode("utf-8"),
+                     str(doc_id).encode("utf-8"))
+            for column, (file, data) in enumerate(zip(files, parts)):
+                file.write(data)
+                positions[column] += len(data)
+            offsets.extend(positions)
+            count += 1
+    finally:
+        for file in files:
+            file.close()
+    # documents may be read from the files being replaced, so move them only once all are written
+    for path, file in zip(paths, files):
+        os.replace(file.name, path)
+    replace_file(os.path.join(folder, OFFSETS_FILE),
+                 lambda file: np.save(file, np.frombuffer(offsets, dtype=np.int64).reshape(-1, 3)))
+    return count
+
+
+def _map_file(path):
+    with open(path, "rb") as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return b""
+        return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class ReadOnlyStoreError(RuntimeError):
+    """
+    Raised when a memory mapped store is asked to add or delete documents.
+    """
+
+
+class MmapDocuments(Sequence):
+    """
+    Read-only list of the documents written by write_documents().
+
+    The files are opened with mmap, so opening costs nothing per document,
+    processes reading the same folder share one copy through the page
+    cache, and a Document is only built when an item is accessed.
+    """
+
+    def __init__(self, folder):
+        self.folder = folder
+        self._offsets = np.load(os.path.join(folder, OFFSETS_FILE), mmap_mode="r")
+        self._texts = _map_file(os.path.join(folder, TEXTS_FILE))
+        self._metadatas = _map_file(os.path.join(folder, METADATA_FILE))
+        self._ids = _map_file(os.path.join(folder, IDS_FILE))
+        self._positions = None
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def _slice(self, data, column, position):
+        return data[int(self._offsets[position, column]):int(self._offsets[position + 1, column])].decode("utf-8")
+
+    def text(self, position):
+        return self._slice(self._texts, 0, position)
+
+    def chunk_id(self, position):
+        return self._slice(self._ids, 2, position)
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return [self[i] for i in range(*position.indices(len(self)))]
+        if position < 0:
+            position += len(self)
+        if not 0 <= position < len(self):
+            raise IndexError(position)
+        return Document(id=self.chunk_id(position), page_content=self.text(position),
+                        metadata=json.loads(self._slice(self._metadatas, 1, position)))
+
+    def position(self, chunk_id):
+        """
+        Position of a chunk id; the id lookup table is built on first use.
+        """
+        if self._positions is None:
+            self._positions = {self.chunk_id(position): position for position in range(len(self))}
+        return self._positions.get(chunk_id)
+
+    def __reduce__(self):
+        # worker processes reopen the files instead of copying the documents
+        return MmapDocuments, (self.folder,)
+
+
+class MmapDocstore(Docstore):
+    """
+    Read-only docstore over MmapDocuments, looked up by position or chunk id.
+    """
+
+    def __init__(self, documents):
+        self.documents = documents
+
+    def search(self, search):
+        if isinstance(search, (int, np.integer)):
+            position = int(search)
+        else:
+            position = self.documents.position(search)
+        if position is None or not 0 <= position < len(self.documents):
+            return f"ID {search} not found."
+        return self.documents[position]
+
+    def add(self, texts):
+        raise ReadOnlyStoreError("Memory mapped stores are read-only, load with mmap=False to update them")
+
+    def delete(self, ids):
+        raise ReadOnlyStoreError("Memory mapped stores are read-only, load with mmap=False to update them")
+
+
+class IndexPositions(Mapping):
+    """
+    index_to_docstore_id of a memory mapped store: vector i is document i,
+    so no per-vector id table has to be loaded.
+    """
+
+    def __init__(self, count):
+        self.count = count
+
+    def __getitem__(self, position):
+        if not 0 <= position < self.count:
+            raise KeyError(position)
+        return int(position)
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        return iter(range(self.count))
+
+
+def save_mmap_vectorstore(vectorstore, folder):
+    """
+    Write a FAISS vector store in the memory mapped format: the faiss index
+    file plus its documents in vector order.
+    """
+    os.makedirs(folder, exist_ok=True)
+    count = vectorstore.index.ntotal
+    ids = [vectorstore.index_to_docstore_id[position] for position in range(count)]
+    write_documents(folder, (vectorstore.docstore.search(doc_id) for doc_id in ids), ids=ids)
+    index_path = os.path.join(folder, INDEX_FILE)
+    faiss.write_index(vectorstore.index, f"{index_path}.tmp-{os.getpid()}")
+    os.replace(f"{index_path}.tmp-{os.getpid()}", index_path)
+    with open(os.path.join(folder, STORE_FILE), "w") as file:
+        json.dump({"count": count, "distance_strategy": str(vectorstore.distance_strategy.value),
+                   "normalize_L2": vectorstore._normalize_L2}, file)
+
+
+def load_mmap_vectorstore(folder, embeddings, mmap=True):
+    """
+    Open a store written by save_mmap_vectorstore().
+    Args:
+        folder (str): The store folder.
+        embeddings (Embeddings): Embeddings used for queries.
+        mmap (bool): Memory map the index and documents (read-only, shared
+            between processes); False loads a regular, updatable FAISS store.
+    Returns:
+        FAISS: The vector store.
+    """
+    with open(os.path.join(folder, STORE_FILE), "r") as file:
+        meta = json.load(file)
+    index = faiss.read_index(os.path.join(folder, INDEX_FILE), MMAP_FLAGS if mmap else 0)
+    documents = MmapDocuments(folder)
+    options = {"distance_strategy": DistanceStrategy(meta["distance_strategy"]), "normalize_L2": meta["normalize_L2"]}
+    if mmap:
+        return FAISS(embedding_function=embeddings, index=index, docstore=MmapDocstore(documents),
+                     index_to_docstore_id=IndexPositions(len(documents)), **options)
+    ids = [documents.chunk_id(position) for position in range(len(documents))]
+    return FAISS(embedding_function=embeddings, index=index,
+                 docstore=InMemoryDocstore(dict(zip(ids, documents))),
+                 index_to_docstore_id=dict(enumerate(ids)), **options)
@@ -0,0 +1,208 @@
+import asyncio
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from typing import Any, Optional, Sequence
+
+try:
+    from langchain.retrievers import EnsembleRetriever
+except ImportError:
+    # langchain 1.x moved the legacy retrievers to langchain-classic
+    from langchain_classic.retrievers import EnsembleRetriever
+from langchain_core.callbacks import Callbacks
+from langchain_core.runnables.config import patch_config
+from langchain_core.documents import BaseDocumentCompressor, Document
+from pydantic import ConfigDict, PrivateAttr
+
+from source.tracing import span
+
+
+def chunk_key(doc):
+    """
+    Stable identity of a chunk: its chunk_id, or a hash of its text.
+    """
+    chunk_id = doc.metadata.get("chunk_id")
+    if chunk_id is not None:
+        return str(chunk_id)
+    return hashlib.sha1(doc.page_content.encode("utf-8")).hexdigest()
+
+
+def normalize_query(query):
+    return re.sub(r"\s+", " ", query.lower()).strip(" ?!.")
+
+
+class ScoredEnsembleRetriever(EnsembleRetriever):
+    """
+    EnsembleRetriever that keeps the weighted RRF score of every fused
+    document in metadata["fusion_score"], so later stages can tell how
+    clear the winner is.
+    """
+
+    def rank_fusion(self, query, run_manager, *, config=None):
+        doc_lists = []
+        for i, retriever in enumerate(self.retrievers):
+            with span(f"retriever.{type(retriever).__name__}") as retriever_span:
+                child_config = patch_config(config, callbacks=run_manager.get_child(tag=f"retriever_{i + 1}"))
+                docs = retriever.invoke(query, child_config)
+                retriever_span.add("documents", len(docs))
+            doc_lists.append(docs)
+        return self.weighted_reciprocal_rank(doc_lists)
+
+    async def arank_fusion(self, query, run_manager, *, config=None):
+        async def retrieve(i, retriever):
+            with span(f"retriever.{type(retriever).__name__}") as retriever_span:
+                child_config = patch_config(config, callbacks=run_manager.get_child(tag=f"retriever_{i + 1}"))
+                docs = await retriever.ainvoke(query, child_config)
+                retriever_span.add("documents", len(docs))
+                return docs
+        doc_lists = await asyncio.gather(*[retrieve(i, retriever) for i, retriever in enumerate(self.retrievers)])
+        return self.weighted_reciprocal_rank(list(doc_lists))
+
+    def weighted_reciprocal_rank(self, doc_lists):
+        with span("retriever.fusion"):
+            return self._fuse(doc_lists)
+
+    def _fuse(self, doc_lists):
+        if len(doc_lists) != len(self.weights):
+            raise ValueError("Number of rank lists must be equal to the number of weights.")
+        key = (lambda doc: doc.page_content) if self.id_key is None else (lambda doc: doc.metadata[self.id_key])
+        scores = defaultdict(float)
+        first_seen = {}
+        for doc_list, weight in zip(doc_lists, self.weights):
+            for rank, doc in enumerate(doc_list, start=1):
+                scores[key(doc)] += weight / (rank + self.c)
+                first_seen.setdefault(key(doc), doc)
+        ranked = sorted(first_seen, key=scores.get, reverse=True)
+        return [
+            Document(page_content=first_seen[doc_key].page_content,
+                     metadata={**first_seen[doc_key].metadata, "fusion_score": scores[doc_key]})
+            for doc_key in ranked
+        ]
+
+
+class CachedRerankCompressor(BaseDocumentCompressor):
+    """
+    Wraps a reranker (e.g. CohereRerank) with an LRU + TTL result cache and
+    an adaptive skip.
+
+    The cache is keyed on the normalized query and the ids of the candidate
+    chunks, so a repeated question over the same candidates never reaches the
+    reranker. When skip_margin is set and the fused ensemble scores already
+    show a clear winner, i.e. (top - runner_up) / top >= skip_margin, the
+    rerank call is skipped and the first top_n candidates are returned as
+    ranked by the ensemble.
+    """
+
+    base_compressor: BaseDocumentCompressor
+    top_n: int = 3
+    max_entries: int = 1024
+    ttl_seconds: float = 3600.0
+    skip_margin: Optional[float] = None
+    hits: int = 0
+    misses: int = 0
+    skips: int = 0
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    _cache: Any = PrivateAttr(default_factory=OrderedDict)
+    _lock: Any = PrivateAttr(default_factory=threading.Lock)
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "skips": self.skips, "entries": len(self._cache)}
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def _should_skip(self, documents):
+        if self.skip_margin is None or not documents:
+            return False
+        scores = [doc.metadata.get("fusion_score") for doc in documents[:2]]
+        if scores[0] is None or scores[0] <= 0:
+            return False
+        if len(scores) == 1:
+            return True
+        if scores[1] is None:
+            return False
+        return (scores[0] - scores[1]) / scores[0] >= self.skip_margin
+
+    def _lookup(self, key):
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is None:
+                return None
+            expires, ranking = entry
+            if expires < time.monotonic():
+                del self._cache[key]
+                return None
+            self._cache.move_to_end(key)
+            return ranking
+
+    def _store(self, key, ranking):
+        with self._lock:
+            self._cache[key] = (time.monotonic() + self.ttl_seconds, ranking)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+
+    def _prepare(self, documents, query):
+        ids = [chunk_key(doc) for doc in documents]
+        return (normalize_query(query), tuple(ids)), ids
+
+    @staticmethod
+    def _ranking(reranked):
+        return [(chunk_key(doc), doc.metadata.get("relevance_score")) for doc in reranked]
+
+    @staticmethod
+    def _apply(ranking, documents, ids):
+        by_id = dict(zip(ids, documents))
+        results = []
+        for doc_id, relevance_score in ranking:
+            doc = by_id[doc_id]
+            metadata = dict(doc.metadata)
+            if relevance_score is not None:
+                metadata["relevance_score"] = relevance_score
+            results.append(Document(page_content=doc.page_content, metadata=metadata))
+        return results
+
+    def compress_documents(self, documents: Sequence[Document], query: str,
+                           callbacks: Optional[Callbacks] = None) -> Sequence[Document]:
+        with span("rerank") as rerank_span:
+            documents = list(documents)
+            if self._should_skip(documents):
+                self.skips += 1
+                rerank_span.add("skips")
+                return documents[:self.top_n]
+            key, ids = self._prepare(documents, query)
+            ranking = self._lookup(key)
+            if ranking is not None:
+                self.hits += 1
+                rerank_span.add("cache_hits")
+                return self._apply(ranking, documents, ids)
+            self.misses += 1
+            rerank_span.add("cache_misses")
+            reranked = self.base_compressor.compress_documents(documents, query, callbacks=callbacks)
+            self._store(key, self._ranking(reranked))
+            return reranked
+
+    async def acompress_documents(self, documents: Sequence[Document], query: str,
+                                  callbacks: Optional[Callbacks] = None) -> Sequence[Document]:
+        with span("rerank") as rerank_span:
+            documents = list(documents)
+            if self._should_skip(documents):
+                self.skips += 1
+                rerank_span.add("skips")
+                return documents[:self.top_n]
+            key, ids = self._prepare(documents, query)
+            ranking = self._lookup(key)
+            if ranking is not None:
+                self.hits += 1
+                rerank_span.add("cache_hits")
+                return self._apply(ranking, documents, ids)
+            self.misses += 1
+            rerank_span.add("cache_misses")
+            reranked = await self.base_compressor.acompress_documents(documents, query, callbacks=callbacks)
+            self._store(key, self._ranking(reranked))
+            return reranked
@@ -1,84 +1,375 @@
+import copy
+import json
+import os
+import string
+from functools import lru_cache
+
+from langchain_core.documents import Document
 from langchain_text_splitters import CharacterTextSplitter
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_text_splitters import HTMLHeaderTextSplitter
 from langchain_text_splitters import RecursiveJsonSplitter
 
+from source.tracing import span, traced_iter
+
+
+def batched_documents(documents, max_chars=4 << 20):
+    """
+    Group a stream of documents into lists of about max_chars characters.
+    """
+    batch, size = [], 0
+    for doc in documents:
+        batch.append(doc)
+        size += len(doc.page_content)
+        if size >= max_chars:
+            yield batch
+            batch, size = [], 0
+    if batch:
+        yield batch
+
 
 class CharacterTextSplitting:
+    params = {"encoding_name": "cl100k_base", "chunk_size": 1000, "chunk_overlap": 200}
+
     def __init__(self, document):
         self.document = document
     
     def chunking(self):
         try:
-            text_splitter = CharacterTextSplitter.from_tiktoken_encoder(
-            encoding_name="cl100k_base", chunk_size=1000, chunk_overlap=200
-        )
+            text_splitter = CharacterTextSplitter.from_tiktoken_encoder(**self.params)
             texts = text_splitter.split_documents(self.document)
             return texts
         except:
             return None
 
+    def iter_chunking(self, documents):
+        text_splitter = CharacterTextSplitter.from_tiktoken_encoder(**self.params)
+        for doc in documents:
+            yield from text_splitter.split_documents([doc])
+
+
+@lru_cache(maxsize=None)
+def get_encoder(encoding_name="cl100k_base"):
+    """
+    The tiktoken encoding, loaded once per process.
+    """
+    import tiktoken
+    return tiktoken.get_encoding(encoding_name)
+
+
+class TokenTextSplitting:
+    """
+    Drop-in for CharacterTextSplitting that produces the same chunks faster.
+
+    CharacterTextSplitter.from_tiktoken_encoder builds a splitter per call and,
+    while merging splits, encodes every split again each time it is added or
+    dropped from the window. Here all separator splits of all documents are
+    encoded once, in batches, with a cached encoder; the merge then only
+    moves two offsets over the array of split token counts, with the same
+    rules as TextSplitter._merge_splits, so chunk boundaries are unchanged.
+    Splits are counted one by one (not sliced from a whole-document
+    encoding) because BPE tokens can span a separator.
+    """
+
+    params = {"encoding_name": "cl100k_base", "chunk_size": 1000, "chunk_overlap": 200, "separator": "\n\n"}
+    encode_batch_size = 4096
+
+    def __init__(self, document):
+        self.document = document
+
+    def token_counts(self, texts):
+        encoder = get_encoder(self.params["encoding_name"])
+        counts = []
+        for start in range(0, len(texts), self.encode_batch_size):
+            batch = texts[start:start + self.encode_batch_size]
+            counts.extend(len(tokens) for tokens in encoder.encode_ordinary_batch(batch))
+        return counts
+
+    def merge(self, splits, counts, separator_len):
+        separator = self.params["separator"]
+        chunk_size, chunk_overlap = self.params["chunk_size"], self.params["chunk_overlap"]
+        chunks = []
+        start = total = 0
+        # the window is splits[start:i], total its token count including separators
+        for i, length in enumerate(counts):
+            if total + length + (separator_len if i > start else 0) > chunk_size and i > start:
+                chunk = separator.join(splits[start:i]).strip()
+                if chunk:
+                    chunks.append(chunk)
+                while total > chunk_overlap or (total + length + (separator_len if i > start else 0) > chunk_size
+                                                and total > 0):
+                    total -= counts[start] + (separator_len if i - start > 1 else 0)
+                    start += 1
+            total += length + (separator_len if i > start else 0)
+        chunk = separator.join(splits[start:]).strip()
+        if chunk:
+            chunks.append(chunk)
+        return chunks
+
+    def split_texts(self, texts):
+        """
+        Split many texts with one batched encoding pass.
+        Returns:
+            list: The chunks of every text.
+        """
+        separator = self.params["separator"]
+        all_splits = [[split for split in text.split(separator) if split] for text in texts]
+        counts = self.token_counts([separator] + [split for splits in all_splits for split in splits])
+        separator_len = counts[0]
+        results, offset = [], 1
+        for splits in all_splits:
+            results.append(self.merge(splits, counts[offset:offset + len(splits)], separator_len))
+            offset += len(splits)
+        return results
+
+    def split_documents(self, documents):
+        texts = [doc.page_content for doc in documents]
+        return [
+            Document(page_content=chunk, metadata=copy.deepcopy(doc.metadata))
+            for doc, chunks in zip(documents, self.split_texts(texts))
+            for chunk in chunks
+        ]
+
+    def chunking(self):
+        try:
+            return self.split_documents(self.document)
+        except:
+            return None
+
+    def iter_chunking(self, documents):
+        # batches keep the batched encoding while bounding the text held at once
+        for batch in batched_documents(documents):
+            yield from self.split_documents(batch)
+
 
 class RecursiveCharacterTextSplitting:
+    params = {"chunk_size": 1000, "chunk_overlap": 200}
+
     def __init__(self, document):
         self.document = document
     
     def chunking(self):
         try:
-            text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
+            text_splitter = RecursiveCharacterTextSplitter(**self.params)
             texts = text_splitter.split_documents(self.document)
             return texts
         except:
             return None
 
+    def iter_chunking(self, documents):
+        text_splitter = RecursiveCharacterTextSplitter(**self.params)
+        for doc in documents:
+            yield from text_splitter.split_documents([doc])
+
 class JSONChunker:
+    params = {"max_chunk_size": 300}
+
     def __init__(self, document):
         self.document = document
     
     def chunking(self):
         try:
-            splitter = RecursiveJsonSplitter(max_chunk_size=300)
+            splitter = RecursiveJsonSplitter(**self.params)
             json_chunks = splitter.create_documents(texts=[self.document])
             return json_chunks
         except:
             return None
 
+    def iter_chunking(self, records):
+        """
+        Chunk a stream of single key dicts (see JSONparser.iter_parse).
+        Every entry is split into the same running chunk list that
+        split_json() uses for a whole object, so the chunks are the same as
+        for the loaded file, and each chunk is yielded once it is full.
+        """
+        splitter = RecursiveJsonSplitter(**self.params)
+        chunks = [{}]
+        for record in records:
+            splitter._json_split(record, None, chunks)
+            while len(chunks) > 1:
+                yield Document(page_content=json.dumps(chunks.pop(0)))
+        if chunks[-1]:
+            yield Document(page_content=json.dumps(chunks[-1]))
+
+def render_rows(frame, row_template=None):
+    """
+    Render every row of a DataFrame with a str.format style template, one
+    column at a time with vectorized string concatenation instead of a
+    format() call per row.
+    Args:
+        frame (pd.DataFrame): The rows.
+        row_template (str): E.g. "{name} ({city}): {review}"; by default
+            "column: value" pairs joined by ", ".
+    Returns:
+        list: One string per row.
+    """
+    if row_template is None:
+        parts = [(f"{', ' if i else ''}{column}: ", column, "", None) for i, column in enumerate(frame.columns)]
+    else:
+        parts = list(string.Formatter().parse(row_template))
+    pieces = []
+    for literal, field, spec, conversion in parts:
+        if literal:
+            pieces.append(literal)
+        if field is None:
+            continue
+        column = frame[field]
+        if spec or conversion:
+            convert = {"r": repr, "a": ascii, "s": str}.get(conversion, lambda value: value)
+            column = column.map(lambda value: format(convert(value), spec), na_action="ignore")
+        # missing values render as "", not "nan"; filled before the cast, which would turn NaN into text
+        pieces.append(column.astype(object).where(column.notna(), "").astype(str))
+    text = ""
+    for piece in pieces:
+        text = text + piece
+    if isinstance(text, str):
+        return [text] * len(frame)
+    return text.tolist()
+
+
+class CSVRowGroupChunker:
+    """
+    Turns CSV rows into documents of rows_per_document rendered rows each.
+
+    Consumes the DataFrame chunks of CSVParser.iter_parse() and yields the
+    documents as soon as their rows are read, so a CSV of any size streams
+    straight into embedding batches. Rows are rendered with row_template
+    (see render_rows); each document records its source and row range.
+    """
+
+    params = {"row_template": None, "rows_per_document": 20}
+
+    def __init__(self, document, options=None):
+        self.document = document
+        # options override params for this file; the parser's keys (dtype, ...) are ignored
+        self.params = {**self.params, **{key: value for key, value in (options or {}).items() if key in self.params}}
+
+    def chunking(self):
+        try:
+            return list(self.iter_chunking([self.document]))
+        except:
+            return None
+
+    def iter_chunking(self, frames):
+        rows_per_document = self.params["rows_per_document"]
+        pending, pending_start, source = [], 0, None
+        for frame in frames:
+            source = frame.attrs.get("source", source)
+            if not pending:
+                pending_start = frame.attrs.get("first_row", pending_start)
+            pending.extend(render_rows(frame, self.params["row_template"]))
+            full = len(pending) - len(pending) % rows_per_document
+            for start in range(0, full, rows_per_document):
+                yield self._document(pending[start:start + rows_per_document], pending_start + start, source)
+            pending, pending_start = pending[full:], pending_start + full
+        if pending:
+            yield self._document(pending, pending_start, source)
+
+    @staticmethod
+    def _document(rows, first_row, source):
+        metadata = {"first_row": first_row, "last_row": first_row + len(rows) - 1}
+        if source is not None:
+            metadata["source"] = source
+        return Document(page_content="\n".join(rows), metadata=metadata)
+
+
 class HTMLSplitting:
+    params = {"headers_to_split_on": [("h1", "Header 1"), ("h2", "Header 2"), ("h3", "Header 3")],
+              "chunk_size": 1000, "chunk_overlap": 200}
+
     def __init__(self, document):
-        self.headers_to_split_on = document
+        self.document = document
     
     def chunking(self):
         try:
-            headers_to_split_on = [
-                ("h1", "Header 1"),
-                ("h2", "Header 2"),
-                ("h3", "Header 3"),
-            ]
-
-            html_splitter = HTMLHeaderTextSplitter(headers_to_split_on)
-            html_header_splits = html_splitter.split_documents(self.html_string)
-            return html_header_splits
+            return list(self.iter_chunking(self.document))
         except:
             return None
 
+    def iter_chunking(self, documents):
+        """
+        Split each page into its h1-h3 sections, then cut long sections with
+        the recursive splitter. UnstructuredHTMLLoader drops the markup, so
+        the headers are read from the source file while it is on disk.
+        """
+        html_splitter = HTMLHeaderTextSplitter(headers_to_split_on=self.params["headers_to_split_on"])
+        text_splitter = RecursiveCharacterTextSplitter(chunk_size=self.params["chunk_size"],
+                                                       chunk_overlap=self.params["chunk_overlap"])
+        split_sources = set()
+        for doc in documents:
+            source = doc.metadata.get("source")
+            if source and os.path.isfile(source):
+                if source in split_sources:
+                    continue
+                split_sources.add(source)
+                sections = html_splitter.split_text_from_file(source)
+            else:
+                sections = html_splitter.split_text(doc.page_content)
+            for section in sections:
+                section.metadata = {**doc.metadata, **section.metadata}
+            yield from text_splitter.split_documents(sections)
+
 class VectorStoreMakingFactory():
-    def __init__(self,document,file_extension,splitting_type:str=None):
+    def __init__(self,document,file_extension,splitting_type:str=None,csv_options=None):
         self.type=splitting_type
+        self.document=document
         self.file_parsers={
             "character":CharacterTextSplitting(document),
+            "token":TokenTextSplitting(document),
             "recursive":RecursiveCharacterTextSplitting(document),
             "html":HTMLSplitting(document),
-            "json":JSONChunker(document)
+            "json":JSONChunker(document),
+            "csv":CSVRowGroupChunker(document,csv_options)
         }
         self.file_extension=file_extension
 
-    def splittext(self):
+    def splitter_type(self):
         if self.file_extension in ["htm","html"]:
-            return self.file_parsers["html"].chunking()
-        if self.file_extension in ["json","csv"]:
-            return self.file_parsers["json"].chunking()
+            return "html"
+        if self.file_extension=="csv":
+            return "csv"
+        if self.file_extension=="json":
+            return "json"
         if self.type is not None:
-            return self.file_parsers[self.type].chunking()
+            return self.type
         else:
             print("Please enter a valid splitting type")
-            raise ValueError
\ No newline at end of file
+            raise ValueError
+
+    def splitter_signature(self):
+        """
+        Describe the splitter that splittext() will use for this file.
+        Returns:
+            dict: The splitter type and the parameters it chunks with.
+        """
+        splitter_type = self.splitter_type()
+        return {"type": splitter_type, "params": self.file_parsers[splitter_type].params}
+
+    def iter_splittext(self):
+        """
+        Chunk a stream of parsed content (a parser's iter_parse()) as it
+        arrives, so the whole file is never held in memory at once. Splitters
+        without iter_chunking() collect the stream first.
+        """
+        splitter_type = self.splitter_type()
+        splitter = self.file_parsers[splitter_type]
+        if hasattr(splitter, "iter_chunking"):
+            chunks = splitter.iter_chunking(self.document)
+        else:
+            chunks = self._collect_and_chunk(splitter, splitter_type)
+        # the span times the splitter's own work, not the parser it pulls or the consumer of the chunks
+        yield from traced_iter("splitter.split", chunks, counter="chunks", splitter=splitter_type, streaming=True)
+
+    def _collect_and_chunk(self, splitter, splitter_type):
+        chunks = type(splitter)(list(self.document)).chunking()
+        if chunks is None:
+            raise ValueError(f"The {splitter_type} splitter could not chunk the document")
+        yield from chunks
+
+    def splittext(self):
+        splitter_type = self.splitter_type()
+        with span("splitter.split", splitter=splitter_type) as split_span:
+            chunks = self.file_parsers[splitter_type].chunking()
+            if chunks is not None:
+                split_span.add("chunks", len(chunks))
+            return chunks
\ No newline at end of file
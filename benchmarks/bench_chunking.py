@@ -0,0 +1,65 @@
+"""
+Throughput of the tiktoken based chunkers of RAG_System/vector_store_maker.py.
+
+    character  CharacterTextSplitting (CharacterTextSplitter.from_tiktoken_encoder)
+    token      TokenTextSplitting (batched single-pass encoding, offset merge)
+
+Both run over the same generated documents; the chunks are compared so the
+speedup is only reported for identical output.
+
+Usage: python benchmarks/bench_chunking.py [--documents 200] [--document-bytes 100000]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from langchain_core.documents import Document  # noqa: E402
+
+from RAG_System.vector_store_maker import CharacterTextSplitting, TokenTextSplitting, get_encoder  # noqa: E402
+from stubs import generate_sentences  # noqa: E402
+
+
+def make_documents(count, size_bytes):
+    sentences = generate_sentences(10 ** 9)
+    documents = []
+    for i in range(count):
+        paragraphs, size = [], 0
+        while size < size_bytes:
+            paragraph = " ".join(next(sentences) for _ in range(4))
+            paragraphs.append(paragraph)
+            size += len(paragraph) + 2
+        documents.append(Document(page_content="\n\n".join(paragraphs), metadata={"source": f"doc_{i}.txt"}))
+    return documents
+
+
+def run(splitter_class, documents):
+    start = time.perf_counter()
+    chunks = splitter_class(documents).chunking()
+    return chunks, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--documents", type=int, default=200)
+    arg_parser.add_argument("--document-bytes", type=int, default=100000)
+    args = arg_parser.parse_args()
+
+    documents = make_documents(args.documents, args.document_bytes)
+    total_mb = sum(len(doc.page_content) for doc in documents) / 1e6
+    get_encoder(TokenTextSplitting.params["encoding_name"])  # load the encoding outside the timings
+
+    results = {}
+    outputs = {}
+    for name, splitter_class in (("character", CharacterTextSplitting), ("token", TokenTextSplitting)):
+        chunks, seconds = run(splitter_class, documents)
+        outputs[name] = [(chunk.page_content, chunk.metadata) for chunk in chunks]
+        results[name] = {"seconds": seconds, "chunks": len(chunks), "chunks_per_second": len(chunks) / seconds,
+                         "mb_per_second": total_mb / seconds}
+    results["identical_chunks"] = outputs["character"] == outputs["token"]
+    results["speedup"] = results["character"]["seconds"] / results["token"]["seconds"]
+    print(json.dumps({"documents": args.documents, "megabytes": total_mb, **results}, indent=2))
@@ -0,0 +1,110 @@
+"""
+Throughput of the streaming CSV ingestion path.
+
+A CSV of --rows generated rows (id, user, city, rating, review) is written once
+to --path, then:
+    read       CSVParser.iter_parse: chunked pd.read_csv with inferred column types, rows/sec
+    documents  + CSVRowGroupChunker: rows rendered with a row template and grouped
+               into documents (VectorStoreMakingFactory.iter_splittext), rows/sec and docs/sec
+    ingest     + CorpusIngestor.ingest_stream into FAISS with the stub embedder, on the
+               first --ingest-rows rows, docs/sec
+Peak RSS is reported after every stage (the CSV is generated in a child
+process so it does not count); it stays flat as --rows grows.
+
+Usage: python benchmarks/bench_csv_ingest.py [--rows 10000000] [--path /tmp/bench_rows.csv] [--ingest-rows 200000]
+"""
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from FileParser.fileparser import CSVParser  # noqa: E402
+from RAG_System.corpus_ingest import CorpusIngestor  # noqa: E402
+from RAG_System.vector_store_maker import CSVRowGroupChunker, VectorStoreMakingFactory  # noqa: E402
+from stubs import HashingEmbeddings, generate_sentences  # noqa: E402
+
+CITIES = ["Kathmandu", "Pokhara", "Lalitpur", "Bhaktapur", "Biratnagar", "Butwal", "Dharan", "Chitwan"]
+ROW_TEMPLATE = "{user} from {city} rated {rating}: {review}"
+
+
+def write_csv(path, rows, batch=1000000, seed=0):
+    rng = np.random.default_rng(seed)
+    reviews = np.array(list(generate_sentences(5000, seed=seed)), dtype=object)
+    for start in range(0, rows, batch):
+        count = min(batch, rows - start)
+        ids = np.arange(start, start + count)
+        frame = pd.DataFrame({
+            "id": ids,
+            "user": np.char.add("user_", (ids % 250000).astype(str)),
+            "city": np.array(CITIES, dtype=object)[rng.integers(0, len(CITIES), count)],
+            "rating": np.round(rng.uniform(1, 5, count), 1),
+            "review": reviews[rng.integers(0, len(reviews), count)],
+        })
+        frame.to_csv(path, mode="w" if start == 0 else "a", header=start == 0, index=False)
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def head_csv(path, rows, target):
+    with open(path, "r", encoding="utf-8") as source, open(target, "w", encoding="utf-8") as file:
+        file.writelines(itertools.islice(source, rows + 1))
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--rows", type=int, default=10000000)
+    arg_parser.add_argument("--path", default=os.path.join(tempfile.gettempdir(), "bench_rows.csv"))
+    arg_parser.add_argument("--ingest-rows", type=int, default=200000)
+    arg_parser.add_argument("--chunksize", type=int, default=CSVParser.params["chunksize"])
+    arg_parser.add_argument("--rows-per-document", type=int, default=CSVRowGroupChunker.params["rows_per_document"])
+    args = arg_parser.parse_args()
+
+    csv_options = {"chunksize": args.chunksize, "row_template": ROW_TEMPLATE,
+                   "rows_per_document": args.rows_per_document}
+    if not os.path.exists(args.path) or sum(1 for _ in open(args.path, "rb")) != args.rows + 1:
+        start = time.perf_counter()
+        writer = multiprocessing.get_context("spawn").Process(target=write_csv, args=(args.path, args.rows))
+        writer.start()
+        writer.join()
+        print(f"wrote {args.rows} rows to {args.path} in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+    megabytes = os.path.getsize(args.path) / 1e6
+    results = {"rows": args.rows, "megabytes": megabytes}
+
+    start = time.perf_counter()
+    rows = sum(len(frame) for frame in CSVParser(args.path, csv_options).iter_parse())
+    seconds = time.perf_counter() - start
+    results["read"] = {"seconds": seconds, "rows_per_second": rows / seconds, "mb_per_second": megabytes / seconds,
+                       "peak_rss_mb": peak_rss_mb()}
+
+    start = time.perf_counter()
+    documents = sum(1 for _ in VectorStoreMakingFactory(document=CSVParser(args.path, csv_options).iter_parse(),
+                                                       file_extension="csv", csv_options=csv_options).iter_splittext())
+    seconds = time.perf_counter() - start
+    results["documents"] = {"seconds": seconds, "documents": documents, "rows_per_second": rows / seconds,
+                            "documents_per_second": documents / seconds, "peak_rss_mb": peak_rss_mb()}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        ingest_path = os.path.join(tmp, "head.csv")
+        head_csv(args.path, args.ingest_rows, ingest_path)
+        ingestor = CorpusIngestor(HashingEmbeddings(), embed_batch_size=64, dedup=False, csv_options=csv_options)
+        stats = ingestor.ingest_stream(ingest_path)
+        ingestor._embed_pending(flush=True)
+    results["ingest"] = {"rows": args.ingest_rows, "documents": stats["chunks"], "seconds": stats["seconds"],
+                         "documents_per_second": stats["chunks"] / stats["seconds"],
+                         "parse_seconds": stats["parse_seconds"], "chunk_seconds": stats["chunk_seconds"],
+                         "embed_seconds": stats["embed_seconds"], "error": stats["error"],
+                         "peak_rss_mb": peak_rss_mb()}
+    print(json.dumps(results, indent=2))
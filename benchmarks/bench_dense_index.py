@@ -0,0 +1,93 @@
+"""
+Recall@k, latency and memory of the dense index modes of RAG_System/dense_index.py
+against the exact flat index, on synthetic clustered vectors.
+
+    flat      IndexFlatL2, what FAISS.from_documents builds (ground truth)
+    hnsw      IndexHNSWFlat, swept over efSearch
+    ivf_flat  IndexIVFFlat, swept over nprobe
+    ivf_pq    IndexIVFPQ, swept over nprobe
+    ivf_sq8   IndexIVFScalarQuantizer (8 bit), swept over nprobe
+
+Latency is measured one query at a time, as the retriever issues them.
+
+Usage: python benchmarks/bench_dense_index.py [--vectors 200000] [--dim 768] [--queries 500] [--k 10]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import faiss
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from RAG_System.dense_index import INDEX_MODES, build_index, index_memory_bytes, set_search_params  # noqa: E402
+
+SWEEPS = {
+    "flat": [{}],
+    "hnsw": [{"ef_search": ef_search} for ef_search in (16, 32, 64, 128)],
+    "ivf_flat": [{"nprobe": nprobe} for nprobe in (1, 4, 16, 64)],
+    "ivf_pq": [{"nprobe": nprobe} for nprobe in (1, 4, 16, 64)],
+    "ivf_sq8": [{"nprobe": nprobe} for nprobe in (1, 4, 16, 64)],
+}
+
+
+def synthetic_vectors(count, dim, clusters, seed=0):
+    # embeddings are clustered by topic, which is what IVF partitions exploit
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, clusters, count)] + 0.5 * rng.normal(size=(count, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) * 1000
+
+
+def evaluate(index, queries, truth, k):
+    latencies = []
+    hits = 0
+    for query, expected in zip(queries, truth):
+        start = time.perf_counter()
+        _, found = index.search(query[None, :], k)
+        latencies.append(time.perf_counter() - start)
+        hits += len(set(found[0].tolist()) & set(expected.tolist()))
+    return {"recall_at_k": hits / truth.size, "p50_ms": percentile(latencies, 50), "p95_ms": percentile(latencies, 95)}
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--vectors", type=int, default=200000)
+    arg_parser.add_argument("--dim", type=int, default=768)
+    arg_parser.add_argument("--queries", type=int, default=500)
+    arg_parser.add_argument("--clusters", type=int, default=256)
+    arg_parser.add_argument("--k", type=int, default=10)
+    arg_parser.add_argument("--modes", nargs="+", default=list(INDEX_MODES), choices=INDEX_MODES)
+    arg_parser.add_argument("--threads", type=int, default=1, help="FAISS threads, 1 keeps latencies comparable")
+    args = arg_parser.parse_args()
+
+    faiss.omp_set_num_threads(args.threads)
+    data = synthetic_vectors(args.vectors + args.queries, args.dim, args.clusters)
+    vectors, queries = data[:args.vectors], data[args.vectors:]
+
+    start = time.perf_counter()
+    flat = build_index(vectors, mode="flat")
+    flat_seconds = time.perf_counter() - start
+    _, truth = flat.search(queries, args.k)
+    flat_bytes = index_memory_bytes(flat)
+
+    results = []
+    for mode in args.modes:
+        start = time.perf_counter()
+        index = flat if mode == "flat" else build_index(vectors, mode=mode)
+        build_seconds = flat_seconds if mode == "flat" else time.perf_counter() - start
+        memory = index_memory_bytes(index)
+        for knobs in SWEEPS[mode]:
+            set_search_params(index, **knobs)
+            results.append({"mode": mode, **knobs, "build_seconds": build_seconds, "index_mb": memory / 1e6,
+                            "memory_vs_flat": memory / flat_bytes, **evaluate(index, queries, truth, args.k)})
+    print(json.dumps({"vectors": args.vectors, "dim": args.dim, "queries": args.queries, "k": args.k,
+                      "results": results}, indent=2))
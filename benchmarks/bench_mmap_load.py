@@ -0,0 +1,98 @@
+"""
+Startup time and memory of worker processes loading the same index.
+
+    pickle  FAISS.save_local / load_local: every worker unpickles its own
+            docstore and reads the whole index into its heap
+    mmap    mmap_store.save_mmap_vectorstore / load_mmap_vectorstore: the index
+            codes and the chunks stay in the page cache, shared by all workers,
+            and only the retrieved chunks become Document objects
+
+Each worker is a fresh process that loads the store and answers --queries
+similarity searches. Reported per format: mean load seconds, mean query ms and
+the private (anonymous) RSS summed over all workers, which is what multiplies
+with the worker count.
+
+Usage: python benchmarks/bench_mmap_load.py [--chunks 200000] [--workers 4] [--queries 200]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from langchain_community.vectorstores import FAISS  # noqa: E402
+
+from RAG_System.mmap_store import load_mmap_vectorstore, save_mmap_vectorstore  # noqa: E402
+from stubs import HashingEmbeddings, generate_sentences  # noqa: E402
+
+
+def rss_anon_mb():
+    with open("/proc/self/status") as file:
+        for line in file:
+            if line.startswith("RssAnon:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def build_store(count, dim):
+    sentences = generate_sentences(10 ** 9)
+    texts = [" ".join(next(sentences) for _ in range(6)) for _ in range(count)]
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(count, dim)).astype(np.float32)
+    metadatas = [{"source": f"doc_{i // 50}.txt", "chunk_id": f"chunk-{i}"} for i in range(count)]
+    return FAISS.from_embeddings(list(zip(texts, vectors.tolist())), HashingEmbeddings(dim=dim),
+                                 metadatas=metadatas, ids=[meta["chunk_id"] for meta in metadatas]), texts
+
+
+def worker(store_format, folder, dim, queries):
+    baseline = rss_anon_mb()
+    embeddings = HashingEmbeddings(dim=dim)
+    start = time.perf_counter()
+    if store_format == "pickle":
+        vectorstore = FAISS.load_local(folder, embeddings, allow_dangerous_deserialization=True)
+    else:
+        vectorstore = load_mmap_vectorstore(folder, embeddings)
+    load_seconds = time.perf_counter() - start
+    sentences = generate_sentences(queries, seed=1)
+    start = time.perf_counter()
+    for query in sentences:
+        vectorstore.similarity_search(query, k=5)
+    query_ms = (time.perf_counter() - start) / queries * 1000
+    return {"load_seconds": load_seconds, "query_ms": query_ms, "rss_anon_mb": rss_anon_mb() - baseline}
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--chunks", type=int, default=200000)
+    arg_parser.add_argument("--dim", type=int, default=384)
+    arg_parser.add_argument("--workers", type=int, default=4)
+    arg_parser.add_argument("--queries", type=int, default=200)
+    args = arg_parser.parse_args()
+
+    vectorstore, _ = build_store(args.chunks, args.dim)
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        folders = {"pickle": os.path.join(tmp, "pickle"), "mmap": os.path.join(tmp, "mmap")}
+        vectorstore.save_local(folders["pickle"])
+        save_mmap_vectorstore(vectorstore, folders["mmap"])
+        del vectorstore
+        context = multiprocessing.get_context("spawn")
+        for store_format, folder in folders.items():
+            with context.Pool(args.workers) as pool:
+                runs = pool.starmap(worker, [(store_format, folder, args.dim, args.queries)] * args.workers)
+            disk_mb = sum(entry.stat().st_size for entry in os.scandir(folder)) / 1e6
+            results[store_format] = {
+                "disk_mb": disk_mb,
+                "load_seconds": float(np.mean([run["load_seconds"] for run in runs])),
+                "query_ms": float(np.mean([run["query_ms"] for run in runs])),
+                "rss_anon_mb_all_workers": sum(run["rss_anon_mb"] for run in runs),
+            }
+    results["load_speedup"] = results["pickle"]["load_seconds"] / results["mmap"]["load_seconds"]
+    print(json.dumps({"chunks": args.chunks, "dim": args.dim, "workers": args.workers, **results}, indent=2))
@@ -0,0 +1,176 @@
+"""
+Offline benchmark of the RAG and appointment form pipeline.
+
+The LLM, the HuggingFace embedder and Cohere rerank are replaced by the
+deterministic stand-ins of benchmarks/stubs.py and the "fake" LLM provider,
+so runs need no network and are comparable across commits. For each
+generated corpus size it measures:
+    ingest     vector_store_creator_from_file (parse, split, embed, FAISS), chunks/sec
+    retrieval  the compression retriever of retriever_maker_for_rag_and_compressor
+    turn       handle_user_input for normal questions (classification, retrieval, answer)
+    form       UserInfoCollectorWithToolAndAgent.process_user_input per reply, plus its
+               extraction_report() (LLM calls made and avoided per booking)
+with p50/p95/p99 latencies in ms. Every corpus size and the form run in a
+fresh process, so each reports its own peak RSS.
+
+Usage:
+    python benchmarks/bench_pipeline.py --output baseline.json
+    python benchmarks/bench_pipeline.py --compare baseline.json
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault("LLM_TYPE", "fake")
+sys.path.insert(0, ROOT)
+
+import rag_pipeline as app  # noqa: E402
+from stubs import HashingEmbeddings, KeywordOverlapReranker, generate_queries, write_text_corpus  # noqa: E402
+
+FORM_REPLIES = ["My name is John Smith", "john.smith@example.com", "tomorrow"]
+
+
+def percentiles(samples):
+    values = np.array(samples) * 1000 if samples else np.zeros(1)
+    return {
+        "n": len(samples),
+        "p50_ms": float(np.percentile(values, 50)),
+        "p95_ms": float(np.percentile(values, 95)),
+        "p99_ms": float(np.percentile(values, 99)),
+    }
+
+
+def timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_isolated(function, *args):
+    """
+    Run one benchmark in a fresh process, so the peak RSS it reports is its own
+    and not the high-water mark of the runs before it.
+    """
+    with multiprocessing.get_context("spawn").Pool(1) as pool:
+        return pool.apply(function, args)
+
+
+def bench_form(bookings):
+    latencies, completed = [], 0
+    for _ in range(bookings):
+        form = app.UserInfoCollectorWithToolAndAgent(api_key=None, model="fake", provider="fake")
+        for reply in FORM_REPLIES:
+            if form.next_question() is None:
+                break
+            _, elapsed = timed(form.process_user_input, reply)
+            latencies.append(elapsed)
+        # next_question() returning None is what records the booking in extraction_report()
+        completed += form.next_question() is None
+    # runs in a process of its own, so the class-wide counters only cover these bookings
+    return {**percentiles(latencies), "bookings": bookings, "completed": completed,
+            **app.UserInfoCollectorWithToolAndAgent.extraction_report(), "peak_rss_mb": peak_rss_mb()}
+
+
+def bench_size(size_bytes, workdir, queries, turns, embeddings):
+    path = write_text_corpus(os.path.join(workdir, f"corpus_{size_bytes}.txt"), size_bytes)
+    (docs, vectorstore), ingest_seconds = timed(app.vector_store_creator_from_file, path, embeddings,
+                                                use_cache=False)
+    ingest_rss = peak_rss_mb()
+    compression_retriever = app.retriever_maker_for_rag_and_compressor(
+        vectorstore, docs, embeddings=embeddings, reranker=KeywordOverlapReranker())
+    classification_chain = app.get_classification_llm_chain(model="fake", used_api_key=None,
+                                                            intent_model_path="", label_log_path=None)
+    qa_chain = app.qa_chain_maker(api_key=None, model_name="fake", compression_retriever=compression_retriever)
+
+    retrieval = [timed(compression_retriever.invoke, query)[1] for query in queries]
+    turn = [timed(app.handle_user_input, query, classification_chain, qa_chain)[1] for query in queries[:turns]]
+    return {
+        "bytes": size_bytes,
+        "chunks": len(docs),
+        "ingest_seconds": ingest_seconds,
+        "chunks_per_second": len(docs) / ingest_seconds if ingest_seconds else None,
+        "retrieval": percentiles(retrieval),
+        "turn": percentiles(turn),
+        "ingest_peak_rss_mb": ingest_rss,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current, baseline):
+    """
+    Print the relative change of every latency percentile and throughput against a baseline run.
+    """
+    old_sizes = {str(entry["bytes"]): entry for entry in baseline["sizes"]}
+    for entry in current["sizes"]:
+        old = old_sizes.get(str(entry["bytes"]))
+        if old is None:
+            continue
+        print(f"corpus {entry['bytes']} bytes")
+        print(f"  chunks/sec  {old['chunks_per_second']:.1f} -> {entry['chunks_per_second']:.1f}")
+        print(f"  peak RSS MB {old['peak_rss_mb']:.1f} -> {entry['peak_rss_mb']:.1f}")
+        for stage in ("retrieval", "turn"):
+            for key in ("p50_ms", "p95_ms", "p99_ms"):
+                before, after = old[stage][key], entry[stage][key]
+                change = (after - before) / before * 100 if before else 0.0
+                print(f"  {stage:<9} {key}  {before:8.2f} -> {after:8.2f}  ({change:+.1f}%)")
+    for key in ("p50_ms", "p95_ms", "p99_ms"):
+        print(f"form {key}  {baseline['form'][key]:8.2f} -> {current['form'][key]:8.2f}")
+    if "llm_calls_per_booking" in baseline["form"]:
+        print(f"form llm_calls_per_booking  {baseline['form']['llm_calls_per_booking']:.2f} -> "
+              f"{current['form']['llm_calls_per_booking']:.2f}")
+    print(f"peak RSS MB  {baseline['peak_rss_mb']:.1f} -> {current['peak_rss_mb']:.1f}")
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--sizes", default="50000,500000,2000000", help="corpus sizes in bytes")
+    arg_parser.add_argument("--queries", type=int, default=200)
+    arg_parser.add_argument("--turns", type=int, default=50)
+    arg_parser.add_argument("--bookings", type=int, default=20)
+    arg_parser.add_argument("--embed-delay", type=float, default=0.0, help="seconds added per embedding call")
+    arg_parser.add_argument("--output", help="write the results as a JSON baseline")
+    arg_parser.add_argument("--compare", help="baseline JSON to compare against")
+    args = arg_parser.parse_args()
+
+    embeddings = HashingEmbeddings(delay=args.embed_delay)
+    queries = generate_queries(args.queries)
+    with tempfile.TemporaryDirectory() as workdir:
+        sizes = [run_isolated(bench_size, int(size), workdir, queries, args.turns, embeddings)
+                 for size in args.sizes.split(",")]
+    form = run_isolated(bench_form, args.bookings)
+    results = {
+        "meta": {"commit": git_commit(), "python": platform.python_version(), "llm": "fake",
+                 "embeddings": HashingEmbeddings.model_name, "reranker": "keyword-overlap"},
+        "sizes": sizes,
+        "form": form,
+        "peak_rss_mb": max([entry["peak_rss_mb"] for entry in sizes] + [form["peak_rss_mb"]]),
+    }
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+    if args.compare:
+        with open(args.compare) as file:
+            compare(results, json.load(file))
@@ -0,0 +1,62 @@
+"""
+Import time, resident memory and throughput of the spaCy name extraction.
+
+Each scenario runs in a fresh interpreter so import costs and peak RSS are
+not shared between them:
+    eager      import spacy and load the full pipeline (the old import-time behaviour)
+    lazy       import conversationa_form only; spaCy is not loaded yet
+    ner_only   import conversationa_form and load the NER-only pipeline on first use
+
+Usage: python benchmarks/bench_spacy_load.py [--texts 2000]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCENARIOS = {
+    "eager": "import spacy\nnlp = spacy.load('en_core_web_sm')\n",
+    "lazy": "import conversationa_form\n",
+    "ner_only": "import conversationa_form\nconversationa_form.get_nlp()\n",
+}
+
+MEASURE = """
+import resource, time, json
+start = time.perf_counter()
+{code}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}}))
+"""
+
+THROUGHPUT = """
+import json, time
+import conversationa_form
+texts = ["Hi, my name is Person%d Smith and I want an appointment" % i for i in range({n})]
+nlp = conversationa_form.get_nlp()
+start = time.perf_counter()
+for text in texts:
+    [ent.text for ent in nlp(text).ents if ent.label_ == "PERSON"]
+single = time.perf_counter() - start
+start = time.perf_counter()
+conversationa_form.extract_person_names(texts)
+batched = time.perf_counter() - start
+print(json.dumps({{"texts": {n}, "single_texts_per_s": {n} / single, "batched_texts_per_s": {n} / batched}}))
+"""
+
+
+def run(code):
+    output = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--texts", type=int, default=2000)
+    args = arg_parser.parse_args()
+
+    results = {name: run(MEASURE.format(code=code)) for name, code in SCENARIOS.items()}
+    results["throughput"] = run(THROUGHPUT.format(n=args.texts))
+    print(json.dumps(results, indent=2))
@@ -0,0 +1,107 @@
+"""
+Deterministic local stand-ins for the remote services, used by the benchmarks.
+
+    HashingEmbeddings       replaces the HuggingFace inference embeddings
+    KeywordOverlapReranker  replaces CohereRerank
+    the LLM                 is the "fake" provider of source/chain.py (LLM_TYPE=fake)
+"""
+import random
+import re
+import time
+import zlib
+from typing import Optional, Sequence
+
+import numpy as np
+from langchain_core.callbacks import Callbacks
+from langchain_core.documents import BaseDocumentCompressor, Document
+from langchain_core.embeddings import Embeddings
+
+WORD_PATTERN = re.compile(r"\w+")
+
+TOPICS = ["python", "machine learning", "retrieval", "databases", "cloud", "chatbots", "embeddings",
+          "vector search", "web servers", "testing", "security", "analytics", "search engines"]
+VERBS = ["builds", "improves", "explains", "evaluates", "deploys", "monitors", "designs", "documents"]
+NOUNS = ["pipelines", "services", "models", "indexes", "reports", "dashboards", "workflows", "APIs"]
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    Bag of hashed words projected to dim dimensions and L2 normalized; texts
+    sharing words get similar vectors, so retrieval behaves sensibly. delay
+    adds a fixed latency per call to mimic a remote endpoint.
+    """
+
+    model_name = "stub-hashing"
+
+    def __init__(self, dim=384, delay=0.0):
+        self.dim = dim
+        self.delay = delay
+
+    def _embed(self, text):
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for word in WORD_PATTERN.findall(text.lower()):
+            hashed = zlib.crc32(word.encode("utf-8"))
+            vector[hashed % self.dim] += 1.0 if hashed & 0x80000000 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts):
+        if self.delay:
+            time.sleep(self.delay)
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        if self.delay:
+            time.sleep(self.delay)
+        return self._embed(text)
+
+
+class KeywordOverlapReranker(BaseDocumentCompressor):
+    """
+    Reranks by the share of query words found in each document and sets
+    metadata["relevance_score"] like CohereRerank does.
+    """
+
+    top_n: int = 3
+    delay: float = 0.0
+
+    def compress_documents(self, documents: Sequence[Document], query: str,
+                           callbacks: Optional[Callbacks] = None) -> Sequence[Document]:
+        if self.delay:
+            time.sleep(self.delay)
+        query_words = set(WORD_PATTERN.findall(query.lower()))
+        scored = []
+        for doc in documents:
+            words = set(WORD_PATTERN.findall(doc.page_content.lower()))
+            score = len(query_words & words) / len(query_words) if query_words else 0.0
+            scored.append((score, doc))
+        scored.sort(key=lambda pair: pair[0], reverse=True)
+        return [Document(page_content=doc.page_content, metadata={**doc.metadata, "relevance_score": score})
+                for score, doc in scored[:self.top_n]]
+
+
+def generate_sentences(count, seed=0):
+    rng = random.Random(seed)
+    for i in range(count):
+        topic = rng.choice(TOPICS)
+        yield (f"Project {i} {rng.choice(VERBS)} {rng.choice(NOUNS)} for {topic} "
+               f"using {rng.choice(TOPICS)} and {rng.choice(NOUNS)} at scale.")
+
+
+def write_text_corpus(path, size_bytes, seed=0):
+    """
+    Write a synthetic text document of about size_bytes bytes, in paragraphs of five sentences.
+    """
+    written = 0
+    with open(path, "w", encoding="utf-8") as file:
+        sentences = generate_sentences(10 ** 9, seed=seed)
+        while written < size_bytes:
+            paragraph = " ".join(next(sentences) for _ in range(5)) + "\n\n"
+            file.write(paragraph)
+            written += len(paragraph)
+    return path
+
+
+def generate_queries(count, seed=1):
+    rng = random.Random(seed)
+    return [f"What {rng.choice(NOUNS)} did he build for {rng.choice(TOPICS)}?" for _ in range(count)]
@@ -1,19 +1,128 @@
-from langchain.agents import initialize_agent, Tool, AgentType
-from langchain.chat_models import ChatOpenAI
-from langchain.prompts import PromptTemplate
-from langchain.memory import ConversationBufferMemory
-from langchain_google_genai import ChatGoogleGenerativeAI
+try:
+    from langchain.memory import ConversationBufferMemory
+except ImportError:
+    # langchain 1.x moved the legacy memory classes to langchain-classic
+    from langchain_classic.memory import ConversationBufferMemory
+from source.chain import get_llm_client
+from source.tracing import span, traced
 import re
 from dateutil import parser
 from datetime import datetime, timedelta
-import spacy
-from langchain.tools import BaseTool, StructuredTool, tool
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from langchain_core.tools import BaseTool
 from pydantic import BaseModel, Field
 from typing import List, Type, Union, Optional
-from langchain.agents import AgentExecutor, create_tool_calling_agent
 import random
 
-nlp = spacy.load("en_core_web_sm")
+SPACY_MODEL = "en_core_web_sm"
+# only NER is needed for name extraction; tok2vec is kept in case ner listens to it
+SPACY_EXCLUDE = ["tagger", "parser", "senter", "attribute_ruler", "lemmatizer"]
+_nlp = None
+_nlp_lock = threading.Lock()
+
+
+def get_nlp():
+    """
+    The spaCy pipeline, loaded on first use and shared by every thread.
+    """
+    global _nlp
+    if _nlp is None:
+        with _nlp_lock:
+            if _nlp is None:
+                import spacy
+                _nlp = spacy.load(SPACY_MODEL, exclude=SPACY_EXCLUDE)
+    return _nlp
+
+
+@traced("form.name_extraction")
+def extract_person_names(texts, batch_size=64):
+    """
+    Run NER over many texts in one nlp.pipe pass.
+    Args:
+        texts (list): Texts to look for names in.
+        batch_size (int): Texts per spaCy batch.
+    Returns:
+        list: The first PERSON entity of every text, or None.
+    """
+    names = []
+    for doc in get_nlp().pipe(texts, batch_size=batch_size):
+        names.append(next((ent.text for ent in doc.ents if ent.label_ == "PERSON"), None))
+    return names
+
+
+class NameExtractionBatcher:
+    """
+    Collects name extraction requests from concurrent sessions and runs them
+    through spaCy together: a batch is flushed when it reaches max_batch
+    texts or max_delay seconds after its first request.
+    """
+
+    def __init__(self, max_batch=64, max_delay=0.005):
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._pending = []
+        self._flush_handle = None
+        # the loop only keeps weak references to tasks, so running batches are held here
+        self._tasks = set()
+        # a thread of its own: callers may be blocking default executor threads while they wait
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="name-extraction")
+
+    async def extract(self, text):
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((text, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(self.max_delay, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch):
+        try:
+            names = await asyncio.get_running_loop().run_in_executor(
+                self._executor, extract_person_names, [text for text, _ in batch], self.max_batch)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), name in zip(batch, names):
+            if not future.done():
+                future.set_result(name)
+
+EMAIL_PATTERN = re.compile(r'^[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+$')
+EMAIL_SEARCH_PATTERN = re.compile(r'[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]*[a-zA-Z0-9]')
+_MONTH = r"(?:jan|feb|mar|apr|may|jun|jul|aug|sep|sept|oct|nov|dec)[a-z]*\.?"
+DATE_PATTERN = re.compile(
+    r"\b(?:day after tomorrow|today|tomorrow|next week"
+    r"|next (?:monday|tuesday|wednesday|thursday|friday|saturday|sunday)"
+    r"|\d{4}-\d{1,2}-\d{1,2}"
+    r"|\d{1,2}[/.-]\d{1,2}[/.-]\d{2,4}"
+    r"|" + _MONTH + r"\s+\d{1,2}(?:st|nd|rd|th)?(?:,?\s+\d{4})?"
+    r"|\d{1,2}(?:st|nd|rd|th)?\s+(?:of\s+)?" + _MONTH + r"(?:,?\s+\d{4})?"
+    r")\b",
+    re.IGNORECASE,
+)
+NAME_CUE_PATTERN = re.compile(
+    r"\b(?:my name is|my name's|name is|under the name|i'm called|i am called)\s+"
+    r"([a-zA-Z]+(?:\s+[a-zA-Z]+){0,2})",
+    re.IGNORECASE,
+)
+# "this is urgent" is not a name, so this cue only counts when the name was just asked for
+WEAK_NAME_CUE_PATTERN = re.compile(r"\bthis is\s+([a-zA-Z]+(?:\s+[a-zA-Z]+){0,2})", re.IGNORECASE)
+NAME_STOPWORDS = {"and", "my", "email", "mail", "is", "on", "for", "at", "the", "please", "date",
+                  "yes", "no", "ok", "okay", "sure", "hi", "hello", "thanks"}
 
 class NameField(BaseModel):
     text: str = Field(description="name of person present in user query")
@@ -28,8 +137,7 @@ class EmailValidationTool(BaseTool):
     args_schema: Type[BaseModel] =EmailField
     return_direct: bool = True
     def _run(self, email: str) -> str:
-        pattern = r'^[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+$'
-        if re.match(pattern, email):
+        if EMAIL_PATTERN.match(email):
             return f"{email}"
         return "Invalid Entry: Invalid email format"
     async def _arun(self, email: str) -> str:
@@ -81,7 +189,7 @@ class NameExtractionTool(BaseTool):
         return match.group(1) if match else None
 
     def extract_name_with_spacy(self,text):
-        doc = nlp(text)
+        doc = get_nlp()(text)
         for ent in doc.ents:
             if ent.label_ == "PERSON":
                 return ent.text
@@ -96,14 +204,101 @@ class NameExtractionTool(BaseTool):
             return simple_name
         return text
 
+class LocalFieldExtractor:
+    """
+    Deterministic pre-pass over a form reply, run before any LLM tool call.
+
+    It looks for an email with a compiled pattern, a date with a small
+    relative/absolute date grammar and a name after an explicit cue (or,
+    when the name was asked for, after "this is" or as a spaCy PERSON entity),
+    and validates every hit with the same tools the LLM would call. A field
+    is only reported when exactly one candidate is found for it.
+    """
+
+    def __init__(self, tool_mapping):
+        self.tool_mapping = tool_mapping
+
+    def _email(self, text):
+        candidates = set(EMAIL_SEARCH_PATTERN.findall(text))
+        if len(candidates) == 1:
+            return self.tool_mapping["email_extractor"].invoke({"email": candidates.pop()})
+        if not candidates and "@" in text and len(text.split()) == 1:
+            return "Invalid Entry: Invalid email format"
+        return None
+
+    def _date(self, text):
+        candidates = {match.lower() for match in DATE_PATTERN.findall(text)}
+        if len(candidates) == 1:
+            return self.tool_mapping["date_extractor"].invoke({"date_string": candidates.pop()})
+        return None
+
+    def _name(self, text, expecting_name, find_person=None):
+        match = NAME_CUE_PATTERN.search(text) or (expecting_name and WEAK_NAME_CUE_PATTERN.search(text))
+        if match:
+            words = []
+            for word in match.group(1).split():
+                if word.lower() in NAME_STOPWORDS:
+                    break
+                words.append(word)
+            if words:
+                return " ".join(words)
+        if not expecting_name:
+            return None
+        # without a cue only a spaCy PERSON counts: a bare reply such as "Maybe later"
+        # or "Not sure" is left to the LLM rather than stored as the name
+        if find_person is not None:
+            person = find_person(text)
+        else:
+            persons = {ent.text for ent in get_nlp()(text).ents if ent.label_ == "PERSON"}
+            person = persons.pop() if len(persons) == 1 else None
+        if person is None or any(word.lower() in NAME_STOPWORDS for word in person.split()):
+            return None
+        return person
+
+    def extract(self, text, expecting=None, find_person=None):
+        """
+        Extract the form fields that can be read off the text without an LLM.
+        Args:
+            text (str): The user reply.
+            expecting (str): The field the user was just asked for.
+            find_person (callable): Returns the PERSON name of a text or None; runs spaCy directly when not given.
+        Returns:
+            dict: Tool output per field found, e.g. {"email": "a@b.com"}.
+        """
+        found = {}
+        email = self._email(text)
+        if email is not None:
+            found["email"] = email
+        date = self._date(text)
+        if date is not None:
+            found["date"] = date
+        # names are looked for in what is left once emails and dates are removed
+        rest = DATE_PATTERN.sub(" ", EMAIL_SEARCH_PATTERN.sub(" ", text))
+        name = self._name(rest, expecting_name=expecting == "name" and not found, find_person=find_person)
+        if name is not None:
+            found["name"] = name
+        return found
+
+
 class UserInfoCollectorWithToolAndAgent:
-    def __init__(self, api_key,model):
+    completed_bookings = 0
+    total_llm_calls = 0
+    total_llm_calls_avoided = 0
+
+    def __init__(self, api_key,model,provider="gemini",name_batcher=None):
         self.api_key = api_key
         self.model_name=model
+        self.provider=provider
+        # NameExtractionBatcher shared by the sessions of a server, used by aprocess_user_input
+        self.name_batcher=name_batcher
         self.user_info = {"name": {"value":None,"Error":False}, "email": {"value":None,"Error":False}, "date": {"value":None,"Error":False}}
         self.memory=ConversationBufferMemory(memory_key="chat_history")
         self.tools = self._initialize_tools()
         self.tool_mapping=self._initialize_tool_mapper()
+        self.local_extractor=LocalFieldExtractor(self.tool_mapping)
+        self.llm_calls=0
+        self.llm_calls_avoided=0
+        self._completion_recorded=False
         self.agent = self._initialize_agent()
         
         
@@ -121,7 +316,8 @@ class UserInfoCollectorWithToolAndAgent:
         ]
     
     def _initialize_agent(self):
-        llm = ChatGoogleGenerativeAI(api_key=self.api_key, model=self.model_name,temperature=0.1)
+        # shared client from the registry; bind_tools only wraps it
+        llm = get_llm_client(self.provider, self.api_key, self.model_name, temperature=0.1)
         llm_with_tools=llm.bind_tools(self.tools)
         return llm_with_tools
 
@@ -155,17 +351,103 @@ class UserInfoCollectorWithToolAndAgent:
         else:
             return questions.get(field, {}).get("none", ["No value provided. Please fill in this field."])
     
-    def process_user_input(self, user_input):
-        result=self.agent.invoke(user_input)
-        for tool_call in result.tool_calls:
+    def _set_field(self, field, tool_output):
+        if "Invalid Entry:" in tool_output:
+            self.user_info[field]["Error"] = True
+        else:
+            self.user_info[field]["value"]= tool_output
+            self.user_info[field]["Error"] = False
+
+    def _apply_tool_calls(self, tool_calls):
+        for tool_call in tool_calls:
             tool = self.tool_mapping[tool_call["name"].lower()]
-            tool_output = tool.invoke(tool_call["args"])
-            if "Invalid Entry:" in tool_output:
-                self.user_info[str(tool.name).replace("_extractor", "")]["Error"] = True
+            with span(f"form.tool.{tool.name}"):
+                tool_output = tool.invoke(tool_call["args"])
+            self._set_field(str(tool.name).replace("_extractor", ""), tool_output)
+
+    def _local_prepass(self, user_input, find_person=None):
+        """
+        Fill whatever the local extractor finds; True when the field being asked
+        for was resolved, so the LLM round trip can be skipped.
+        """
+        expecting, _ = self.find_incomplete_field()
+        with span("form.local_prepass") as prepass_span:
+            found = self.local_extractor.extract(user_input, expecting=expecting, find_person=find_person)
+            prepass_span.add("fields_found", len(found))
+        for field, tool_output in found.items():
+            self._set_field(field, tool_output)
+        if expecting in found:
+            self.llm_calls_avoided += 1
+            return True
+        self.llm_calls += 1
+        return False
+
+    def process_user_input(self, user_input):
+        if self._local_prepass(user_input):
+            return
+        with span("form.llm") as llm_span:
+            result=self.agent.invoke(user_input)
+            llm_span.add("tool_calls", len(result.tool_calls))
+        self._apply_tool_calls(result.tool_calls)
+
+    async def aprocess_user_input(self, user_input):
+        # the pre-pass may run spaCy, keep it off the event loop
+        find_person = None
+        if self.name_batcher is not None:
+            # the pre-pass thread hands its text to the batcher on this loop, so
+            # concurrent sessions share one nlp.pipe pass
+            loop = asyncio.get_running_loop()
+            find_person = lambda text: asyncio.run_coroutine_threadsafe(self.name_batcher.extract(text), loop).result()
+        if await asyncio.to_thread(self._local_prepass, user_input, find_person):
+            return
+        with span("form.llm") as llm_span:
+            result=await self.agent.ainvoke(user_input)
+            llm_span.add("tool_calls", len(result.tool_calls))
+        self._apply_tool_calls(result.tool_calls)
+
+    @classmethod
+    def extraction_report(cls):
+        """
+        LLM calls made and avoided by the local pre-pass, per completed booking.
+        """
+        bookings = cls.completed_bookings
+        return {
+            "completed_bookings": bookings,
+            "llm_calls_per_booking": cls.total_llm_calls / bookings if bookings else 0.0,
+            "llm_calls_avoided_per_booking": cls.total_llm_calls_avoided / bookings if bookings else 0.0,
+        }
+
+    def _record_completion(self):
+        if self._completion_recorded:
+            return
+        self._completion_recorded = True
+        cls = type(self)
+        cls.completed_bookings += 1
+        cls.total_llm_calls += self.llm_calls
+        cls.total_llm_calls_avoided += self.llm_calls_avoided
+
+    def find_incomplete_field(self):
+        for field, data in self.user_info.items():
+            if data["Error"]:
+                return field, True 
+            elif data["value"] is None:
+                return field, False  
+        return None, None
+
+    def is_complete(self):
+        return self.find_incomplete_field()[0] is None
+
+    def next_question(self):
+        """
+        Question for the next missing or invalid field, or None once every field is filled.
+        Lets a caller drive the form one reply at a time instead of blocking on input().
+        """
+        field, has_error = self.find_incomplete_field()
+        if field is None:
+            self._record_completion()
+            return None
+        return random.choice(self._get_question_for_field(field, error=has_error))
 
-            else:
-                self.user_info[str(tool.name).replace("_extractor","")]["value"]= tool_output
-                self.user_info[str(tool.name).replace("_extractor", "")]["Error"] = False
     def final_appointment_text(self):
         text = f"""Your appointment is booked with the following information:
                 Name: {self.user_info["name"]["value"]}
@@ -177,27 +459,11 @@ class UserInfoCollectorWithToolAndAgent:
         # print("-------------------")
         # print(self.user_info)
         # print("-------------------")
-        def find_incomplete_field():
-            for field, data in self.user_info.items():
-                if data["Error"]:
-                    return field, True 
-                elif data["value"] is None:
-                    return field, False  
-            return None, None
-
         while True:
-            field, has_error = find_incomplete_field()
-            if field is None:
+            question = self.next_question()
+            if question is None:
                 break  
-            
-            if has_error:
-                error_questions = self._get_question_for_field(field, error=True)
-                question = random.choice(error_questions)
-                print(f"\x1b[34mAI: \x1b[0m: {question}")
-            else:
-                none_questions = self._get_question_for_field(field, error=False)
-                question = random.choice(none_questions)
-                print(f"\x1b[34mAI: \x1b[0m: {question}")
+            print(f"\x1b[34mAI: \x1b[0m: {question}")
             
             # Assume user provides input and we handle it (pseudo-code)
             print("\x1b[34mHuman Response: \x1b[0m ",end="")
@@ -1,3 +1,12 @@
+import os
+import re
+import threading
+import time
+
+PROMPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PLACEHOLDER_PATTERN = re.compile(r"\{(\w+)\}")
+
+
 def set_var(prompt: str, vars: dict):
     """
     Replaces placeholders in a prompt string with values from a dictionary.
@@ -9,14 +18,113 @@ def set_var(prompt: str, vars: dict):
     Returns:
         str: The input string with placeholders replaced by corresponding values.
     """
-    for key, value in vars.items():
-        prompt = prompt.replace(f"{{{key}}}", value)
-    return prompt
+    return PLACEHOLDER_PATTERN.sub(lambda match: str(vars.get(match.group(1), match.group(0))), prompt)
+
+
+class CompiledTemplate:
+    """
+    A prompt template parsed once into literal parts and placeholder names,
+    so rendering is a single join instead of one replace pass per variable.
+    Placeholders without a value are kept as they are, like set_var.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.name = os.path.splitext(os.path.basename(path))[0]
+        self.load()
+
+    def load(self):
+        mtime = os.stat(self.path).st_mtime_ns
+        with open(self.path, "r") as file:
+            text = file.read()
+        pieces = PLACEHOLDER_PATTERN.split(text)
+        # split() alternates literal text and placeholder names; both are swapped in with one
+        # assignment, so a render running during a reload sees the old or the new template, never a mix
+        self.parts = (pieces[0::2], pieces[1::2])
+        self.text = text
+        self.mtime = mtime
+
+    def render(self, vars: dict):
+        literals, placeholders = self.parts
+        parts = [literals[0]]
+        for name, literal in zip(placeholders, literals[1:]):
+            value = vars.get(name)
+            parts.append(f"{{{name}}}" if value is None else str(value))
+            parts.append(literal)
+        return "".join(parts)
+
+
+class PromptRegistry:
+    """
+    Every .tmpl file of a folder, compiled once.
+
+    A template is re-read only when its file's mtime changes, and mtimes are
+    checked at most once per check_interval seconds per template, so the
+    chat path does no file I/O between edits.
+    """
+
+    def __init__(self, folder=PROMPT_DIR, check_interval=2.0):
+        self.folder = folder
+        self.check_interval = check_interval
+        self._templates = {}
+        self._checked = {}
+        self._lock = threading.Lock()
+        for file_name in sorted(os.listdir(folder)):
+            if file_name.endswith(".tmpl"):
+                template = CompiledTemplate(os.path.join(folder, file_name))
+                self._templates[template.name] = template
+                self._checked[template.name] = time.monotonic()
+
+    def names(self):
+        return sorted(self._templates)
+
+    def get(self, name):
+        """
+        Args:
+            name (str): Template file name without .tmpl, e.g. "classify_query".
+        Returns:
+            CompiledTemplate: The template, reloaded first if the file changed.
+        """
+        template = self._templates.get(name)
+        if template is None:
+            path = os.path.join(self.folder, f"{name}.tmpl")
+            with self._lock:
+                template = self._templates.get(name) or CompiledTemplate(path)
+                self._templates[name] = template
+                self._checked[name] = time.monotonic()
+            return template
+        now = time.monotonic()
+        if now - self._checked[name] >= self.check_interval:
+            self._checked[name] = now
+            if os.stat(template.path).st_mtime_ns != template.mtime:
+                with self._lock:
+                    template.load()
+        return template
+
+    def render(self, name, vars):
+        return self.get(name).render(vars)
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    """
+    The process-wide PromptRegistry of the prompt/ folder, created on first use.
+    """
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = PromptRegistry()
+    return _registry
 
 
 def get_prompt(path, vars):
     """
     Reads a prompt from a file and replaces placeholders with values from a dictionary.
+    Templates of the prompt/ folder come from the compiled registry.
     Args:
         path (str): The path to the file containing the prompt.
         vars (dict): A dictionary containing key-value pairs to replace placeholders.
@@ -24,6 +132,8 @@ def get_prompt(path, vars):
         str: The prompt string with placeholders replaced by corresponding values.
     """
     try:
+        if os.path.dirname(os.path.abspath(path)) == PROMPT_DIR and path.endswith(".tmpl"):
+            return get_registry().render(os.path.splitext(os.path.basename(path))[0], vars)
         with open(path, "r") as file:
             prompt = file.read()
             prompt = set_var(prompt, vars)
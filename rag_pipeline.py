@@ -0,0 +1,363 @@
+import os
+import asyncio
+import logging
+import concurrent.futures
+from operator import itemgetter
+from FileParser.fileparser import FileParserFactory
+from RAG_System.vector_store_maker import VectorStoreMakingFactory
+from RAG_System.index_cache import VectorStoreCache, file_hash, embedding_model_name
+from RAG_System.corpus_ingest import ingest_corpus, format_ingest_report
+from RAG_System.index_manager import IndexManager
+from RAG_System.keyword_index import CompactBM25Retriever
+from RAG_System.rerank_cache import ScoredEnsembleRetriever, CachedRerankCompressor
+from RAG_System.chunk_dedup import deduplicate_chunks, format_dedup_report
+from RAG_System.dense_index import vectorstore_from_documents, set_search_params
+
+from langchain_community.vectorstores import FAISS
+try:
+    from langchain.retrievers import ContextualCompressionRetriever
+    from langchain.retrievers.document_compressors import CohereRerank
+except ImportError:
+    # langchain 1.x moved the legacy retrievers to langchain-classic
+    from langchain_classic.retrievers import ContextualCompressionRetriever
+    from langchain_classic.retrievers.document_compressors import CohereRerank
+
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.runnables import RunnableLambda, RunnablePassthrough, RunnableSequence
+
+from prompt.prompt import get_registry
+from source.chain import get_chain, get_llm_client
+from source.intent_classifier import IntentClassifier, LabelLogger, local_first_chain
+from source.streaming import StreamMetrics, astream_markdown, stream_metrics
+from source.tracing import span
+
+from conversationa_form import UserInfoCollectorWithToolAndAgent
+
+# pipeline builders and chat turn handlers; config.py is only read when a default
+# API key is needed, so benchmarks and tests import this module without one
+
+# set LLM_TYPE=fake to run every chain offline against the deterministic stub model
+LLM_TYPE=os.environ.get("LLM_TYPE","gemini")
+# build reports go to logging, not stdout: the server builds indexes too; the terminal chat shows them
+logger=logging.getLogger(__name__)
+
+index_cache=VectorStoreCache()
+
+def vector_store_creator_from_file(file_name,embeddings,splitting_type: str = "recursive",use_cache: bool = True,dedup: bool = True,index_mode: str = "flat",index_params: dict = None,csv_options: dict = None):
+    # index_mode: flat, hnsw, ivf_flat, ivf_pq or ivf_sq8; index_params: nlist, nprobe, ef_search, ... (see RAG_System/dense_index.py)
+    # csv_options: chunksize, dtype, usecols, row_template, rows_per_document (see CSVParser and CSVRowGroupChunker)
+    index_params=index_params or {}
+    file_location=file_name
+    file_extension = os.path.splitext(file_location)[1][1:]
+
+    if use_cache:
+        content_hash=file_hash(file_location)
+        splitter_signature=VectorStoreMakingFactory(splitting_type=splitting_type,document=None,file_extension=file_extension,csv_options=csv_options).splitter_signature()
+        splitter_signature["dedup"]=dedup
+        if csv_options:
+            # dtype changes how values render, so every CSV option is part of the key
+            splitter_signature["csv_options"]=csv_options
+        splitter_signature["index"]={"mode":index_mode,**index_params}
+        cache_key=index_cache.make_key(content_hash,splitter_signature,embedding_model_name(embeddings))
+        cached=index_cache.load(cache_key,embeddings)
+        if cached is not None:
+            set_search_params(cached[1].index,nprobe=index_params.get("nprobe"),ef_search=index_params.get("ef_search"))
+            return cached
+
+    # pages / records / text blocks are chunked as the parser yields them
+    file_parser=FileParserFactory(file_type=file_extension,file_name=file_location,csv_options=csv_options)
+    content=file_parser.iter_parse()
+
+    vector_store_maker=VectorStoreMakingFactory(splitting_type=splitting_type,document=content,file_extension=file_extension,csv_options=csv_options)
+    vector_store_docs=list(vector_store_maker.iter_splittext())
+    if dedup:
+        # repeated headers/sections are embedded and indexed once, with pointers to every copy
+        vector_store_docs,deduplicator=deduplicate_chunks(vector_store_docs)
+   
+    if index_mode=="flat":
+        vectorstore = FAISS.from_documents(vector_store_docs, embeddings)
+    else:
+        vectorstore = vectorstore_from_documents(vector_store_docs, embeddings, mode=index_mode, **index_params)
+    if dedup:
+        logger.info(format_dedup_report(deduplicator.report(embedding_dim=vectorstore.index.d)))
+
+    if use_cache:
+        index_cache.save(cache_key,vector_store_docs,vectorstore,source=file_location,content_hash=content_hash)
+    
+    return vector_store_docs,vectorstore
+
+def vector_store_creator_from_folder(folder,embeddings,splitting_type: str = "recursive",max_workers=None,dedup: bool = True,index_mode: str = "flat",index_params: dict = None,csv_options: dict = None):
+    vector_store_docs,vectorstore,keyword_retriever,report=ingest_corpus(
+        folder,embeddings,splitting_type=splitting_type,max_workers=max_workers,dedup=dedup,index_mode=index_mode,index_params=index_params,csv_options=csv_options)
+    for line in format_ingest_report(report):
+        logger.info(line)
+    return vector_store_docs,vectorstore,keyword_retriever
+
+def index_manager_from_folder(folder,embeddings,splitting_type: str = "recursive",index_dir=None):
+    if index_dir is not None and os.path.isdir(index_dir):
+        index_manager=IndexManager.load(index_dir,embeddings,splitting_type=splitting_type)
+        changes=index_manager.sync_folder(folder)
+        logger.info("index sync: %s",{change: len(files) for change, files in changes.items()})
+    else:
+        # IndexManager tracks chunks per file, so a chunk shared by two files must stay indexed once per file
+        vector_store_docs,vectorstore,keyword_retriever=vector_store_creator_from_folder(folder,embeddings,splitting_type=splitting_type,dedup=False)
+        index_manager=IndexManager.from_chunks(embeddings,vectorstore,vector_store_docs,keyword_retriever=keyword_retriever,splitting_type=splitting_type)
+    if index_dir is not None:
+        index_manager.save(index_dir)
+    return index_manager
+
+def retriever_maker_for_rag_and_compressor(vectorstore,vector_store_docs,embeddings=None,keyword_retriever=None,rerank_skip_margin=None,reranker=None):
+    if embeddings is not None:
+        # route query embeddings through the same cache used to build the index
+        vectorstore.embedding_function=embeddings
+    retriever_vectordb = vectorstore.as_retriever(search_kwargs={"k": 5})
+    if keyword_retriever is None:
+        keyword_retriever = CompactBM25Retriever.from_documents(vector_store_docs,k=5)
+    ensemble_retriever = ScoredEnsembleRetriever(retrievers=[retriever_vectordb,keyword_retriever],
+                                       weights=[0.7, 0.3])
+    if reranker is None:
+        from config import COHERE_RERANK_API_KEY
+        reranker = CohereRerank(cohere_api_key=COHERE_RERANK_API_KEY)
+    # compression_retriever.base_compressor.stats() exposes the hit/miss/skip counters
+    compressor = CachedRerankCompressor(base_compressor=reranker,top_n=reranker.top_n,skip_margin=rerank_skip_margin)
+    compression_retriever = ContextualCompressionRetriever(
+        base_compressor=compressor, base_retriever=ensemble_retriever)
+    return compression_retriever
+
+def answer_chain_maker(api_key,model_name,provider=LLM_TYPE):
+    template = """
+    <|system|>>
+    You are an AI Assistant that follows instructions extremely well.
+    Please be truthful and give direct answers. Please tell 'I don't know' if user query is not in CONTEXT
+
+    CONTEXT: {context}
+
+    <|user|>
+    {query}
+
+    <|assistant|>
+    """
+    prompt = ChatPromptTemplate.from_template(template)
+    output_parser = StrOutputParser()
+    # streaming client: ainvoke still returns the whole answer, astream yields tokens as they arrive
+    llm = get_llm_client(provider, api_key, model_name, temperature=0, streaming=True)
+
+    # takes {"context": retrieved documents, "query": user query}
+    answer_chain = prompt | llm | output_parser
+    return answer_chain
+
+def qa_chain_maker(api_key,model_name,compression_retriever):
+    qa_chain = (
+        {"context": compression_retriever, "query": RunnablePassthrough()}
+        | answer_chain_maker(api_key=api_key,model_name=model_name)
+    )
+    return qa_chain
+
+INTENT_MODEL_PATH=os.path.join(os.path.dirname(os.path.abspath(__file__)),"source","intent_model.npz")
+# opt-in: the log holds the raw user messages (names, emails, phone numbers from bookings),
+# so it is only written when INTENT_LABEL_LOG names a file, e.g. source/intent_labels.jsonl
+INTENT_LABEL_LOG=os.environ.get("INTENT_LABEL_LOG")
+
+def get_classification_llm_chain(model,used_api_key,intent_model_path=INTENT_MODEL_PATH,label_log_path=None):
+    prompt = get_registry().render("classify_query", {"input": "{input}"})
+    chain_i =get_chain(LLM_TYPE=LLM_TYPE,api_key=used_api_key,temperature=0.1, model=model, prompt=prompt)
+    chain=chain_i|StrOutputParser()
+    # the local classifier answers confident cases; the LLM labels the rest and, with
+    # label_log_path, those labels are logged to retrain it (python source/intent_classifier.py train)
+    intent_classifier=IntentClassifier.load(intent_model_path) if os.path.exists(intent_model_path) else None
+    label_logger=LabelLogger(label_log_path) if label_log_path else None
+    return local_first_chain(intent_classifier,chain,label_logger=label_logger)
+
+
+def has_appointment_trigger(input_text):
+        appointment_triggers = ['call me', 'book me', 'schedule for','schedule me']
+        return any(trigger in input_text.lower() for trigger in appointment_triggers)
+
+
+def classify_user_query(input_text, chain):
+        if has_appointment_trigger(input_text):
+            return "Appointment"       
+        with span("classifier"):
+            response = chain.invoke({"input": input_text})
+        return response
+
+
+async def aclassify_user_query(input_text, chain):
+        if has_appointment_trigger(input_text):
+            return "Appointment"
+        with span("classifier"):
+            response = await chain.ainvoke({"input": input_text})
+        return response
+
+
+async def _cancel(*tasks):
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def _aretrieve(compression_retriever,user_query):
+    with span("retrieval") as retrieval_span:
+        context=await compression_retriever.ainvoke(user_query)
+        retrieval_span.add("documents",len(context))
+        return context
+
+
+async def _aclassify_and_retrieve(user_query,classification_chain,compression_retriever,semantic_cache=None):
+    """
+    Classify a query and, for a normal question, fetch its context.
+    Returns:
+        tuple: (classification, cached answer or None, context or None, query vector or None)
+    """
+    if has_appointment_trigger(user_query):
+        return "Appointment",None,None,None
+
+    # classification runs first, even for cache hits: a booking request can read like a
+    # cached question, and the local-first classifier rarely needs the LLM
+    classification_task=asyncio.create_task(aclassify_user_query(user_query,classification_chain))
+    query_vector=None
+    try:
+        if semantic_cache is not None:
+            with span("semantic_cache") as cache_span:
+                cached_answer,query_vector=await asyncio.to_thread(semantic_cache.get,user_query)
+                cache_span.add("cache_hits" if cached_answer is not None else "cache_misses")
+            if cached_answer is not None:
+                # only Normal answers are cached, so a hit skips retrieval, rerank and the answer chain
+                if str(await classification_task).lower().strip() == "appointment":
+                    return "Appointment",None,None,None
+                return "Normal",cached_answer,None,query_vector
+    except BaseException:
+        await _cancel(classification_task)
+        raise
+
+    # most traffic is Normal: start retrieval + rerank speculatively while the
+    # query is classified, and drop it if the query turns out to be Appointment
+    retrieval_task=asyncio.create_task(_aretrieve(compression_retriever,user_query))
+    try:
+        classification=await classification_task
+    except BaseException:
+        await _cancel(retrieval_task)
+        raise
+    if str(classification).lower().strip() == "appointment":
+        await _cancel(retrieval_task)
+        return "Appointment",None,None,None
+    return "Normal",None,await retrieval_task,query_vector
+
+
+async def aroute_user_input(user_query,classification_chain,compression_retriever,answer_chain,semantic_cache=None):
+    """
+    Classify a query and, if it is a normal question, answer it.
+    Returns:
+        tuple: (classification, answer); answer is None for Appointment queries.
+    """
+    classification,cached_answer,context,query_vector=await _aclassify_and_retrieve(
+        user_query,classification_chain,compression_retriever,semantic_cache=semantic_cache)
+    if classification == "Appointment" or cached_answer is not None:
+        return classification,cached_answer
+
+    with span("qa_chain") as qa_span:
+        result=await answer_chain.ainvoke({"context": context, "query": user_query})
+        qa_span.add("output_chars",len(result))
+    if semantic_cache is not None:
+        semantic_cache.put(user_query,result,query_vector)
+    return "Normal",result
+
+
+async def astream_user_input(user_query,classification_chain,compression_retriever,answer_chain,semantic_cache=None,metrics_recorder=stream_metrics):
+    """
+    Streaming variant of aroute_user_input.
+    Yields:
+        tuple: ("classification", label) first, then ("token", markdown-safe text) pieces of the answer,
+        and finally ("metrics", dict) with the time to first token and tokens/sec of the request.
+    """
+    metrics=StreamMetrics()
+    classification,cached_answer,context,query_vector=await _aclassify_and_retrieve(
+        user_query,classification_chain,compression_retriever,semantic_cache=semantic_cache)
+    yield "classification",classification
+    if classification == "Appointment":
+        return
+    if cached_answer is not None:
+        metrics.token()
+        yield "token",cached_answer
+    else:
+        pieces=[]
+        with span("qa_chain",streaming=True) as qa_span:
+            async for piece in astream_markdown(answer_chain,{"context": context, "query": user_query},metrics=metrics):
+                pieces.append(piece)
+                yield "token",piece
+            answer="".join(pieces)
+            # characters, as in aroute_user_input: the answer is not tokenized there
+            qa_span.add("output_chars",len(answer))
+        if semantic_cache is not None:
+            semantic_cache.put(user_query,answer,query_vector)
+    metrics.finish()
+    if metrics_recorder is not None:
+        metrics_recorder.record(metrics)
+    yield "metrics",metrics.as_dict()
+
+
+async def ahandle_user_input(user_query,classification_chain,compression_retriever,answer_chain,semantic_cache=None,on_token=None):
+    """
+    Answer a query, or run the appointment form for Appointment queries.
+    Args:
+        on_token (callable): When given, the answer is streamed and every markdown-safe piece is passed to it.
+    """
+    if on_token is None:
+        classification,result=await aroute_user_input(user_query,classification_chain,compression_retriever,answer_chain,semantic_cache=semantic_cache)
+    else:
+        classification,pieces=None,[]
+        async for kind,value in astream_user_input(user_query,classification_chain,compression_retriever,answer_chain,semantic_cache=semantic_cache):
+            if kind == "classification":
+                classification=value
+            elif kind == "token":
+                pieces.append(value)
+                on_token(value)
+        result="".join(pieces)
+    if classification != "Appointment":
+        return result
+
+    from config import GEMINI_API_KEY,MODEL_NAME
+    user_info_with_tool_agent=UserInfoCollectorWithToolAndAgent(api_key=GEMINI_API_KEY,model=MODEL_NAME,provider=LLM_TYPE)
+    await asyncio.to_thread(user_info_with_tool_agent.collect_user_information,user_query)
+    return user_info_with_tool_agent.user_info
+
+
+def run_sync(coroutine):
+    """
+    Run a coroutine to completion from synchronous code. asyncio.run() refuses to
+    start inside a running event loop (e.g. a notebook), so there it runs on a
+    worker thread with a loop of its own.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coroutine)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run,coroutine).result()
+
+
+def split_qa_chain(qa_chain):
+    """
+    Split a qa_chain_maker() chain into its compression retriever and answer chain.
+    Returns:
+        tuple: (compression_retriever, answer_chain), (None, None) for chains of another shape.
+    """
+    steps=getattr(qa_chain,"steps",None)
+    context=getattr(steps[0],"steps__",{}).get("context") if steps else None
+    if context is None or len(steps) < 2:
+        return None,None
+    return context,steps[1] if len(steps) == 2 else RunnableSequence(*steps[1:])
+
+
+def handle_user_input(user_query,classification_chain,qa_chain,semantic_cache=None,on_token=None):
+    """
+    Answer a query with a qa_chain_maker() chain, or run the appointment form for Appointment queries.
+    Runs ahandle_user_input, so retrieval still starts while the query is classified.
+    """
+    compression_retriever,answer_chain=split_qa_chain(qa_chain)
+    if compression_retriever is None:
+        # any other chain taking the query: run it once the query is classified
+        compression_retriever=RunnableLambda(lambda query: [])
+        answer_chain=RunnableLambda(itemgetter("query"))|qa_chain
+    return run_sync(ahandle_user_input(user_query,classification_chain,compression_retriever,answer_chain,semantic_cache=semantic_cache,on_token=on_token))
@@ -0,0 +1,242 @@
+import argparse
+import asyncio
+import json
+import time
+from contextlib import asynccontextmanager
+
+from aiohttp import WSMsgType, web
+
+from config import GEMINI_API_KEY, MODEL_NAME
+from conversationa_form import NameExtractionBatcher, UserInfoCollectorWithToolAndAgent
+from rag_pipeline import LLM_TYPE, aroute_user_input, astream_user_input
+from source.chat_session import get_or_create_session, init_db
+from source.streaming import stream_metrics
+from source.tracing import tracer
+
+
+class Overloaded(Exception):
+    pass
+
+
+class SessionState:
+    """
+    In-process state of one chat session: the appointment form in progress,
+    if any, and a lock that keeps the messages of a session in order.
+    """
+
+    def __init__(self, session_id, session_name):
+        self.session_id = session_id
+        self.session_name = session_name
+        self.form = None
+        self.lock = asyncio.Lock()
+        self.last_active = time.monotonic()
+
+
+class ChatServer:
+    """
+    Serves many concurrent chat sessions over HTTP and WebSocket with one
+    shared set of retrievers and chains.
+
+    Sessions are keyed on the ChatSession table. The appointment form is a
+    per-session state machine: each reply advances it by one step instead of
+    blocking on input(). LLM work is limited to max_concurrent_llm requests
+    at a time; once max_waiting requests are queued behind that limit new
+    ones are rejected with 503 so load sheds instead of piling up.
+    """
+
+    def __init__(self, classification_chain, compression_retriever, answer_chain, semantic_cache=None,
+                 form_factory=None, max_concurrent_llm=32, max_waiting=256, session_ttl=1800):
+        self.classification_chain = classification_chain
+        self.compression_retriever = compression_retriever
+        self.answer_chain = answer_chain
+        self.semantic_cache = semantic_cache
+        # spaCy name lookups of all sessions' forms are batched into shared nlp.pipe passes
+        self.name_batcher = NameExtractionBatcher()
+        self.form_factory = form_factory or (lambda: UserInfoCollectorWithToolAndAgent(
+            api_key=GEMINI_API_KEY, model=MODEL_NAME, provider=LLM_TYPE, name_batcher=self.name_batcher))
+        self.max_waiting = max_waiting
+        self.session_ttl = session_ttl
+        self.sessions = {}
+        self._session_ids = {}
+        self._llm_semaphore = asyncio.Semaphore(max_concurrent_llm)
+        self._waiting = 0
+
+    @asynccontextmanager
+    async def llm_slot(self):
+        if self._waiting >= self.max_waiting:
+            raise Overloaded()
+        self._waiting += 1
+        try:
+            await self._llm_semaphore.acquire()
+        finally:
+            self._waiting -= 1
+        try:
+            yield
+        finally:
+            self._llm_semaphore.release()
+
+    async def get_session(self, session_name):
+        session_id = self._session_ids.get(session_name)
+        if session_id is None:
+            chat_session = await asyncio.to_thread(get_or_create_session, session_name)
+            session_id = self._session_ids.setdefault(session_name, chat_session.id)
+        state = self.sessions.get(session_id)
+        if state is None:
+            state = self.sessions.setdefault(session_id, SessionState(session_id, session_name))
+        # mark it used before the caller waits for its lock, so expire_sessions keeps it
+        state.last_active = time.monotonic()
+        return state
+
+    async def handle_message(self, session_name, message, on_token=None):
+        """
+        Process one user message of a session.
+        Args:
+            on_token (coroutine function): When given, answers are streamed and each
+                markdown-safe piece is awaited with it before the final reply is returned;
+                form questions and confirmations are passed to it whole.
+        Returns:
+            dict: The reply and its type: answer, form, booked or form_cancelled.
+        """
+        state = await self.get_session(session_name)
+        async with state.lock:
+            state.last_active = time.monotonic()
+            if state.form is not None:
+                return await self._send_form_reply(await self._continue_form(state, message), on_token)
+
+            async with self.llm_slot():
+                if on_token is None:
+                    classification, answer = await aroute_user_input(
+                        message, self.classification_chain, self.compression_retriever, self.answer_chain,
+                        semantic_cache=self.semantic_cache)
+                else:
+                    classification, answer = await self._stream_answer(message, on_token)
+            if classification != "Appointment":
+                return {"type": "answer", "reply": answer}
+            state.form = self.form_factory()
+            return await self._send_form_reply({"type": "form", "reply": state.form.next_question()}, on_token)
+
+    async def _send_form_reply(self, result, on_token):
+        # form questions are fixed text, not model output: streamed clients get each as one token frame
+        if on_token is not None:
+            await on_token(result["reply"])
+        return result
+
+    async def _stream_answer(self, message, on_token):
+        classification, pieces = None, []
+        async for kind, value in astream_user_input(message, self.classification_chain, self.compression_retriever,
+                                                    self.answer_chain, semantic_cache=self.semantic_cache):
+            if kind == "classification":
+                classification = value
+            elif kind == "token":
+                pieces.append(value)
+                await on_token(value)
+        return classification, "".join(pieces)
+
+    async def _continue_form(self, state, message):
+        if message.strip().lower() in ("exit", "cancel"):
+            state.form = None
+            return {"type": "form_cancelled", "reply": "Appointment booking cancelled."}
+        async with self.llm_slot():
+            await state.form.aprocess_user_input(message)
+        question = state.form.next_question()
+        if question is not None:
+            return {"type": "form", "reply": question}
+        form, state.form = state.form, None
+        return {"type": "booked", "reply": form.final_appointment_text(), "user_info": form.user_info}
+
+    async def expire_sessions(self, interval=60):
+        while True:
+            await asyncio.sleep(interval)
+            cutoff = time.monotonic() - self.session_ttl
+            for session_id, state in list(self.sessions.items()):
+                # last_active is refreshed by get_session, so a session a request just got is never evicted
+                if state.last_active < cutoff and not state.lock.locked():
+                    del self.sessions[session_id]
+                    self._session_ids.pop(state.session_name, None)
+
+    async def post_chat(self, request):
+        try:
+            payload = await request.json()
+        except json.JSONDecodeError:
+            return web.json_response({"error": "request body must be JSON"}, status=400)
+        if not isinstance(payload, dict):
+            return web.json_response({"error": "request body must be a JSON object"}, status=400)
+        session_name, message = payload.get("session"), str(payload.get("message", "")).strip()
+        if not session_name or not message:
+            return web.json_response({"error": "session and message are required"}, status=400)
+        try:
+            return web.json_response(await self.handle_message(session_name, message))
+        except Overloaded:
+            return web.json_response({"error": "server busy"}, status=503, headers={"Retry-After": "1"})
+
+    async def websocket(self, request):
+        session_name = request.query.get("session")
+        if not session_name:
+            raise web.HTTPBadRequest(text="session query parameter is required")
+        ws = web.WebSocketResponse(heartbeat=30)
+        await ws.prepare(request)
+
+        async def send_token(text):
+            await ws.send_json({"type": "token", "text": text})
+        async for msg in ws:
+            if msg.type != WSMsgType.TEXT:
+                continue
+            message = msg.data.strip()
+            if not message:
+                continue
+            try:
+                await ws.send_json(await self.handle_message(session_name, message, on_token=send_token))
+            except Overloaded:
+                await ws.send_json({"error": "server busy"})
+        return ws
+
+    async def health(self, request):
+        return web.json_response({"sessions": len(self.sessions), "waiting": self._waiting,
+                                  "streaming": stream_metrics.summary(),
+                                  "form_extraction": UserInfoCollectorWithToolAndAgent.extraction_report()})
+
+    async def metrics(self, request):
+        return web.Response(text=tracer.prometheus_text(), content_type="text/plain", charset="utf-8")
+
+    def make_app(self):
+        app = web.Application()
+        app.add_routes([
+            web.post("/chat", self.post_chat),
+            web.get("/ws", self.websocket),
+            web.get("/health", self.health),
+            web.get("/metrics", self.metrics),
+        ])
+
+        async def start_expiry(app):
+            app["session_expiry"] = asyncio.create_task(self.expire_sessions())
+            yield
+            app["session_expiry"].cancel()
+
+        async def create_tables(app):
+            await asyncio.to_thread(init_db)
+
+        app.on_startup.append(create_tables)
+        app.cleanup_ctx.append(start_expiry)
+        return app
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Multi-session RAG chat server.")
+    arg_parser.add_argument("--file", required=True, help="document to answer questions from")
+    arg_parser.add_argument("--host", default="0.0.0.0")
+    arg_parser.add_argument("--port", type=int, default=8080)
+    arg_parser.add_argument("--max-concurrent-llm", type=int, default=32)
+    arg_parser.add_argument("--max-waiting", type=int, default=256)
+    args = arg_parser.parse_args()
+
+    # loads the embedding model and the API settings, so it is only imported when serving
+    from rag_and_conversational_form import build_pipeline
+    classification_chain, compression_retriever, answer_chain, semantic_cache = build_pipeline(args.file)
+
+    async def make_app():
+        # the semaphore and session locks must be created inside the serving loop
+        server = ChatServer(classification_chain, compression_retriever, answer_chain, semantic_cache,
+                            max_concurrent_llm=args.max_concurrent_llm, max_waiting=args.max_waiting)
+        return server.make_app()
+
+    web.run_app(make_app(), host=args.host, port=args.port)
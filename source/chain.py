@@ -1,20 +1,80 @@
+import asyncio
+import re
+import threading
+import time
+import weakref
+from abc import ABC, abstractmethod
+from typing import Callable
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
 from langchain_core.prompts.prompt import PromptTemplate
-from langchain_openai import ChatOpenAI, AzureChatOpenAI
-from langchain_google_genai import ChatGoogleGenerativeAI
 
-from config import AZURE_DEPLOYMENT, API_VERSION
-from abc import ABC, abstractmethod
+HTTP_MAX_CONNECTIONS = 64
+HTTP_MAX_KEEPALIVE = 32
+
+_http_clients = {}
+_http_lock = threading.Lock()
+
+
+def _loop_bound_async_client(limits):
+    import httpx
+
+    class LoopBoundAsyncClient(httpx.AsyncClient):
+        """
+        AsyncClient that sends every request through a pool owned by the running
+        event loop. Pooled connections are tied to the loop that opened them, so
+        a single shared pool breaks once asyncio.run() closes that loop.
+        """
+
+        def __init__(self, **kwargs):
+            super().__init__(**kwargs)
+            self._options = kwargs
+            self._loop_clients = weakref.WeakKeyDictionary()
+
+        def _loop_client(self):
+            loop = asyncio.get_running_loop()
+            client = self._loop_clients.get(loop)
+            if client is None or client.is_closed:
+                client = self._loop_clients[loop] = httpx.AsyncClient(**self._options)
+            return client
+
+        async def send(self, request, **kwargs):
+            return await self._loop_client().send(request, **kwargs)
+
+        async def aclose(self):
+            await self._loop_client().aclose()
+
+    return LoopBoundAsyncClient(limits=limits, timeout=60.0)
+
+
+def get_http_clients():
+    """
+    The process-wide httpx clients (sync, async) shared by every OpenAI-compatible
+    chat model, so requests reuse a bounded pool of keep-alive connections.
+    The async client keeps one pool per event loop.
+    """
+    with _http_lock:
+        if not _http_clients:
+            import httpx
+            limits = httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS,
+                                  max_keepalive_connections=HTTP_MAX_KEEPALIVE)
+            _http_clients["sync"] = httpx.Client(limits=limits, timeout=60.0)
+            _http_clients["async"] = _loop_bound_async_client(limits)
+        return _http_clients["sync"], _http_clients["async"]
+
 
 class LLM(ABC):
     @abstractmethod
     def get_llm(self, **kwargs):
         NotImplemented
-    
+
 
 class OpenAI(LLM):
     def __init__(self,api_key):
         self.api_key = api_key
-    
+
     def get_llm(self,**kwargs):
         """
         Get the LLM for the current session.
@@ -23,10 +83,13 @@ class OpenAI(LLM):
         Returns:
             LLMChain: A LLMChain object.
         """
-        temperature = kwargs.get("temperature") if kwargs.get("temperature") else ValueError("Temperature is required")
+        from langchain_openai import ChatOpenAI
+        temperature = kwargs.get("temperature") if kwargs.get("temperature") is not None else ValueError("Temperature is required")
         model = kwargs.get("model") if kwargs.get("model") else ValueError("Model is required")
         streaming = kwargs.get("streaming") if kwargs.get("streaming") else False
-        return ChatOpenAI(api_key=self.api_key,temperature=temperature, model=model, streaming=streaming)
+        http_client, http_async_client = get_http_clients()
+        return ChatOpenAI(api_key=self.api_key,temperature=temperature, model=model, streaming=streaming,
+                          http_client=http_client, http_async_client=http_async_client)
 
 class AzureOpenAI(LLM):
     def __init__(self,api_key):
@@ -40,13 +103,20 @@ class AzureOpenAI(LLM):
         Returns:
             LLMChain: A LLMChain object.
         """
-        temperature = kwargs.get("temperature") if kwargs.get("temperature") else ValueError("Temperature is required")
+        from langchain_openai import AzureChatOpenAI
+        from config import AZURE_DEPLOYMENT, API_VERSION
+        temperature = kwargs.get("temperature") if kwargs.get("temperature") is not None else ValueError("Temperature is required")
         model = kwargs.get("model") if kwargs.get("model") else ValueError("Model is required")
+        streaming = kwargs.get("streaming") if kwargs.get("streaming") else False
+        http_client, http_async_client = get_http_clients()
         return AzureChatOpenAI(api_key=self.api_key,
             azure_deployment=AZURE_DEPLOYMENT,
             api_version=API_VERSION,
             temperature=temperature,
-            model=model
+            model=model,
+            streaming=streaming,
+            http_client=http_client,
+            http_async_client=http_async_client
         )
 
 class GeminiOpenAI(LLM):
@@ -61,23 +131,150 @@ class GeminiOpenAI(LLM):
         Returns:
             LLMChain: A LLMChain object.
         """
-        temperature = kwargs.get("temperature") if kwargs.get("temperature") else ValueError("Temperature is required")
+        from langchain_google_genai import ChatGoogleGenerativeAI
+        temperature = kwargs.get("temperature") if kwargs.get("temperature") is not None else ValueError("Temperature is required")
         model = kwargs.get("model") if kwargs.get("model") else ValueError("Model is required")
         streaming = kwargs.get("streaming") if kwargs.get("streaming") else False
+        # takes no httpx client: the Google SDK manages its own connections, outside get_http_clients()
         return ChatGoogleGenerativeAI(api_key=self.api_key,temperature=temperature, model=model, streaming=streaming)
 
 
+APPOINTMENT_WORDS = re.compile(r"\b(appointment|book|booking|schedule|call me|meeting|reserve)\b", re.IGNORECASE)
+
+
+def fake_response(prompt_text):
+    """
+    Deterministic reply of the fake provider: a Normal/Appointment label for
+    the classification prompt, otherwise an answer derived from the last user turn.
+    """
+    last_turn = re.split(r"Human:|<\|user\|>", prompt_text)[-1]
+    last_turn = re.split(r"\bAI:|<\|assistant\|>", last_turn)[0].strip()
+    if "Normal" in prompt_text and "Appointment" in prompt_text:
+        return "Appointment" if APPOINTMENT_WORDS.search(last_turn) else "Normal"
+    words = last_turn.split()
+    return f"Here is what I found about **{' '.join(words[:12])}**: the documents cover it in detail."
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Offline chat model for tests and benchmarks: replies come from
+    response_fn (fake_response by default) and are streamed word by word,
+    with optional first-token and per-token delays to mimic a remote model.
+    bind_tools() returns the model itself, so tool-calling paths run and
+    simply get no tool calls.
+    """
+
+    model: str = "fake"
+    temperature: float = 0.0
+    streaming: bool = False
+    response_fn: Callable[[str], str] = fake_response
+    first_token_delay: float = 0.0
+    token_delay: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake"
+
+    def _reply(self, messages):
+        return self.response_fn("\n".join(str(message.content) for message in messages))
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        reply = self._reply(messages)
+        time.sleep(self.first_token_delay + self.token_delay * len(reply.split()))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=reply))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.first_token_delay)
+        for index, word in enumerate(self._reply(messages).split(" ")):
+            if index and self.token_delay:
+                time.sleep(self.token_delay)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=word if index == 0 else f" {word}"))
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+
+class FakeLLM(LLM):
+    def __init__(self,api_key=None):
+        self.api_key = api_key
+
+    def get_llm(self,**kwargs):
+        """
+        Get the deterministic offline LLM.
+        Returns:
+            FakeChatModel: A FakeChatModel object.
+        """
+        return FakeChatModel(model=kwargs.get("model") or "fake", temperature=kwargs.get("temperature") or 0.0,
+                             streaming=bool(kwargs.get("streaming")))
+
+
+PROVIDERS = {
+    "azure": AzureOpenAI,
+    "openai": OpenAI,
+    "gemini": GeminiOpenAI,
+    "fake": FakeLLM,
+}
+
+
+class ClientRegistry:
+    """
+    Process-wide cache of chat model clients keyed by (provider, model,
+    temperature, streaming) and the API key. A client is built on first use
+    and then shared by every chain, session and thread.
+    """
+
+    def __init__(self):
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def get(self, provider, api_key, model, temperature=0.0, streaming=False):
+        key = (provider, model, float(temperature), bool(streaming), api_key)
+        client = self._clients.get(key)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(key)
+                if client is None:
+                    if provider not in PROVIDERS:
+                        raise ValueError(f"Unknown LLM provider: {provider}")
+                    client = PROVIDERS[provider](api_key=api_key).get_llm(
+                        temperature=temperature, model=model, streaming=streaming)
+                    self._clients[key] = client
+        return client
+
+    def clear(self):
+        with self._lock:
+            self._clients.clear()
+
+    def __len__(self):
+        return len(self._clients)
+
+
+client_registry = ClientRegistry()
+
+
+def get_llm_client(provider, api_key, model, temperature=0.0, streaming=False):
+    """
+    Get the shared chat model client of a provider.
+    Args:
+        provider (str): azure, openai, gemini or fake.
+        api_key (str): The provider API key.
+        model (str): The model name.
+    Returns:
+        BaseChatModel: The cached client.
+    """
+    return client_registry.get(provider, api_key, model, temperature=temperature, streaming=streaming)
+
+
 class LLMFactory():
     def __init__(self, type,api_key):
         self.type = type
-        self.llms = {
-            "azure": AzureOpenAI(api_key=api_key),
-            "openai": OpenAI(api_key=api_key),
-            "gemini": GeminiOpenAI(api_key=api_key)
-        }
+        self.api_key = api_key
 
     def get_llm(self, temperature, model, streaming):
-        return self.llms[self.type].get_llm(temperature=temperature, model=model, streaming=streaming)
+        return get_llm_client(self.type, self.api_key, model, temperature=temperature, streaming=streaming)
 
 
 def get_chain(LLM_TYPE,api_key,temperature, model, prompt):
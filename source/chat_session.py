@@ -1,4 +1,7 @@
+import threading
+
 from sqlalchemy import Column, Float, Integer, String, create_engine
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
@@ -7,6 +10,8 @@ from config import DATABASE_URL
 engine = create_engine(DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
+_tables_ready = False
+_tables_lock = threading.Lock()
 
 
 class ChatSession(Base):
@@ -19,4 +24,42 @@ class ChatSession(Base):
     hack_prompt = Column(String, default="")
 
 
-Base.metadata.create_all(bind=engine)
+def init_db():
+    """
+    Create the session tables if they do not exist yet. Runs once per process:
+    the server calls it at startup and get_or_create_session on first use.
+    """
+    global _tables_ready
+    if _tables_ready:
+        return
+    with _tables_lock:
+        if not _tables_ready:
+            Base.metadata.create_all(bind=engine)
+            _tables_ready = True
+
+
+def get_or_create_session(session_name: str) -> ChatSession:
+    """
+    Get the chat session with the given name, creating it on first use.
+    Args:
+        session_name (str): The unique name of the session.
+    Returns:
+        ChatSession: The stored session row.
+    """
+    init_db()
+    db = SessionLocal()
+    try:
+        chat_session = db.query(ChatSession).filter(ChatSession.session_name == session_name).first()
+        if chat_session is None:
+            chat_session = ChatSession(session_name=session_name)
+            db.add(chat_session)
+            try:
+                db.commit()
+            except IntegrityError:
+                # another worker created it concurrently
+                db.rollback()
+                return db.query(ChatSession).filter(ChatSession.session_name == session_name).one()
+            db.refresh(chat_session)
+        return chat_session
+    finally:
+        db.close()
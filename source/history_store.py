@@ -0,0 +1,260 @@
+import atexit
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from langchain_core.chat_history import BaseChatMessageHistory
+from langchain_core.messages import message_to_dict, messages_from_dict
+from sqlalchemy import (JSON, Column, Integer, MetaData, Table, Text, create_engine, delete, insert, inspect, select,
+                        update)
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+class PooledHistoryStore:
+    """
+    Chat history backend shared by every session of a process.
+
+    All sessions go through one SQLAlchemy engine, so one connection pool.
+    New messages land in a bounded write-behind buffer that a background
+    thread batch-inserts every flush_interval seconds or as soon as
+    flush_size messages are pending; when max_buffer messages are pending
+    the writer flushes inline, which bounds memory. The latest messages of
+    up to max_sessions sessions are kept in an LRU cache so reads of
+    recent turns skip the database. After a failed write the writer backs
+off from flush_interval up to max_retry_interval seconds.
+
+    A new table has the layout of SQLChatMessageHistory (id, session_id,
+    message as JSON text). An existing table is reflected, so a message
+    column of JSON type (the JSONB column PostgresChatMessageHistory
+    creates) is written and read as JSON rather than text.
+    """
+
+    def __init__(self, connection_string, table_name="message_store", flush_interval=0.5, flush_size=64,
+                 max_buffer=4096, max_sessions=1024, max_cached_messages=200, pool_size=5, max_overflow=10,
+                 max_retry_interval=30.0):
+        engine_kwargs = {"pool_pre_ping": True}
+        if not connection_string.startswith("sqlite"):
+            engine_kwargs.update(pool_size=pool_size, max_overflow=max_overflow)
+        self.engine = create_engine(connection_string, **engine_kwargs)
+        if inspect(self.engine).has_table(table_name):
+            self.table = Table(table_name, MetaData(), autoload_with=self.engine)
+        else:
+            self.table = Table(
+                table_name,
+                MetaData(),
+                Column("id", Integer, primary_key=True, autoincrement=True),
+                Column("session_id", Text, index=True),
+                Column("message", Text),
+            )
+        self._json_messages = isinstance(self.table.c.message.type, JSON)
+        self.summary_table = Table(
+            f"{table_name}_summary",
+            self.table.metadata,
+            Column("session_id", Text, primary_key=True),
+            Column("summary", Text),
+            Column("covered", Integer),
+        )
+        self.table.metadata.create_all(self.engine)
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self.max_buffer = max_buffer
+        self.max_sessions = max_sessions
+        self.max_cached_messages = max_cached_messages
+        self.max_retry_interval = max_retry_interval
+        self._buffer = []
+        self._cache = OrderedDict()
+        # session id -> one [changed] flag per database read in progress
+        self._loading = {}
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._closed = False
+        self._writer = threading.Thread(target=self._write_loop, name="history-writer", daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+
+    def _cache_put(self, session_id, messages, complete):
+        self._cache[session_id] = (messages[-self.max_cached_messages:],
+                                   complete and len(messages) <= self.max_cached_messages)
+        self._cache.move_to_end(session_id)
+        while len(self._cache) > self.max_sessions:
+            self._cache.popitem(last=False)
+
+    def _mark_changed(self, session_id):
+        for read in self._loading.get(session_id, ()):
+            read[0] = True
+
+    def _encode(self, message):
+        record = message_to_dict(message)
+        return record if self._json_messages else json.dumps(record)
+
+    def add_messages(self, session_id, messages):
+        rows = [{"session_id": session_id, "message": self._encode(message)} for message in messages]
+        with self._lock:
+            self._mark_changed(session_id)
+            cached = self._cache.get(session_id)
+            if cached is not None:
+                self._cache_put(session_id, cached[0] + list(messages), cached[1])
+            self._buffer.extend(rows)
+            pending = len(self._buffer)
+            if pending >= self.flush_size:
+                self._wakeup.notify()
+        if pending >= self.max_buffer:
+            self.flush()
+
+    def get_messages(self, session_id, last=None):
+        """
+        Messages of a session, oldest first.
+        Args:
+            session_id (str): The session.
+            last (int): Only return the last messages; served from the cache when it holds enough.
+        """
+        with self._lock:
+            cached = self._cache.get(session_id)
+            if cached is not None and (cached[1] or (last is not None and len(cached[0]) >= last)):
+                self._cache.move_to_end(session_id)
+                return list(cached[0][-last:] if last else cached[0])
+            read = [False]
+            self._loading.setdefault(session_id, []).append(read)
+        try:
+            self.flush()
+            with self.engine.connect() as connection:
+                rows = connection.execute(
+                    select(self.table.c.message).where(self.table.c.session_id == session_id).order_by(self.table.c.id)
+                ).scalars().all()
+        finally:
+            with self._lock:
+                reads = self._loading[session_id]
+                reads.remove(read)
+                if not reads:
+                    del self._loading[session_id]
+        messages = messages_from_dict([json.loads(row) if isinstance(row, (str, bytes)) else row for row in rows])
+        with self._lock:
+            # messages added while reading may be missing from rows, so only cache a result nothing raced with
+            if not read[0]:
+                self._cache_put(session_id, messages, True)
+        return messages[-last:] if last else messages
+
+    def clear(self, session_id):
+        with self._lock:
+            self._buffer = [row for row in self._buffer if row["session_id"] != session_id]
+            self._mark_changed(session_id)
+            self._cache_put(session_id, [], True)
+        with self._write_lock, self.engine.begin() as connection:
+            connection.execute(delete(self.table).where(self.table.c.session_id == session_id))
+            connection.execute(delete(self.summary_table).where(self.summary_table.c.session_id == session_id))
+
+    def get_summary(self, session_id):
+        """
+        Returns:
+            tuple: (rolling summary, number of messages it covers) of a session, ("", 0) if none.
+        """
+        with self.engine.connect() as connection:
+            row = connection.execute(
+                select(self.summary_table.c.summary, self.summary_table.c.covered)
+                .where(self.summary_table.c.session_id == session_id)
+            ).first()
+        return (row[0], row[1]) if row else ("", 0)
+
+    def set_summary(self, session_id, summary, covered):
+        with self.engine.begin() as connection:
+            updated = connection.execute(
+                update(self.summary_table).where(self.summary_table.c.session_id == session_id)
+                .values(summary=summary, covered=covered)
+            ).rowcount
+            if not updated:
+                connection.execute(insert(self.summary_table).values(session_id=session_id, summary=summary,
+                                                                      covered=covered))
+
+    def flush(self):
+        """
+        Write every buffered message now.
+        """
+        with self._write_lock:
+            with self._lock:
+                rows, self._buffer = self._buffer, []
+            if not rows:
+                return
+            try:
+                with self.engine.begin() as connection:
+                    connection.execute(insert(self.table), rows)
+            except Exception:
+                with self._lock:
+                    self._buffer[:0] = rows
+                raise
+
+    def _write_loop(self):
+        retry_interval = self.flush_interval
+        while True:
+            with self._lock:
+                if not self._buffer and not self._closed:
+                    self._wakeup.wait(self.flush_interval)
+                closed = self._closed
+            try:
+                self.flush()
+                retry_interval = self.flush_interval
+            except Exception:
+                # keep the writer alive; the rows are retried after a growing pause
+                if not closed:
+                    self._wait_closed(retry_interval)
+                retry_interval = min(max(retry_interval, 0.01) * 2, self.max_retry_interval)
+            if closed:
+                return
+
+    def _wait_closed(self, seconds):
+        deadline = time.monotonic() + seconds
+        with self._lock:
+            while not self._closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return
+                self._wakeup.wait(remaining)
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._wakeup.notify()
+        self._writer.join(timeout=5)
+        self.flush()
+
+
+def get_history_store(connection_string, **kwargs):
+    """
+    The process-wide PooledHistoryStore of a database, created on first use.
+    """
+    with _stores_lock:
+        store = _stores.get(connection_string)
+        if store is None:
+            store = _stores[connection_string] = PooledHistoryStore(connection_string, **kwargs)
+        return store
+
+
+class PooledChatMessageHistory(BaseChatMessageHistory):
+    """
+    Chat history of one session on top of the shared PooledHistoryStore.
+    """
+
+    def __init__(self, store, session_id):
+        self.store = store
+        self.session_id = session_id
+
+    @property
+    def messages(self):
+        return self.store.get_messages(self.session_id)
+
+    def recent_messages(self, last):
+        return self.store.get_messages(self.session_id, last=last)
+
+    def add_messages(self, messages):
+        self.store.add_messages(self.session_id, messages)
+
+    def add_message(self, message):
+        self.store.add_messages(self.session_id, [message])
+
+    def clear(self):
+        self.store.clear(self.session_id)
@@ -0,0 +1,189 @@
+import threading
+from collections import deque
+from functools import lru_cache
+
+import tiktoken
+from langchain_core.messages import AIMessage, HumanMessage
+
+from prompt.prompt import get_registry
+
+ROLE_PREFIXES = {"human": "Human", "ai": "AI", "system": "System"}
+
+
+@lru_cache(maxsize=None)
+def get_encoding(model=None):
+    """
+    tiktoken encoding of a model, loaded once per model.
+    Falls back to cl100k_base for models tiktoken does not know (e.g. Gemini).
+    """
+    if model:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            pass
+    return tiktoken.get_encoding("cl100k_base")
+
+
+def format_message(message):
+    return f"{ROLE_PREFIXES.get(message.type, message.type)}: {message.content}"
+
+
+def extractive_summarizer(summary, new_lines):
+    """
+    Summarizer that needs no LLM: keeps the evicted lines verbatim; the
+    window trims the oldest tokens once the summary budget is exceeded.
+    """
+    return f"{summary}\n{new_lines}".strip()
+
+
+def llm_summarizer(llm):
+    """
+    Summarizer that folds evicted lines into the running summary with an LLM.
+    Args:
+        llm (BaseChatModel): The model used to update the summary.
+    Returns:
+        callable: (summary, new_lines) -> new summary
+    """
+    def summarize(summary, new_lines):
+        prompt = get_registry().render("summarize_history", {"summary": summary or "(empty)", "new_lines": new_lines})
+        result = llm.invoke(prompt)
+        return getattr(result, "content", result).strip()
+    return summarize
+
+
+class _SessionWindow:
+    def __init__(self, summary, covered):
+        self.summary = summary
+        self.summary_tokens = 0
+        self.covered = covered
+        self.messages = deque()
+        self.tokens = 0
+        self.lock = threading.Lock()
+
+
+class HistoryWindow:
+    """
+    Token budgeted {history} for chatprompt.tmpl on top of LangChainMemory.
+
+    Per session it keeps the newest messages that fit in budget_tokens,
+    with their token counts (tiktoken, encoding cached per model), so the
+    running total is updated per added message and never recounted. Messages
+    pushed out of the window are folded into a rolling summary, one batch
+    at a time, instead of summarizing the whole conversation again; the
+    summary is capped at summary_budget_tokens. When the memory is backed by
+    the pooled history store the summary and the number of messages it
+    covers are stored with the session, so a restart picks up where it left.
+
+    The rendered history is therefore at most budget_tokens +
+    summary_budget_tokens long, however long the session runs.
+    """
+
+    def __init__(self, memory_factory, budget_tokens=1500, summary_budget_tokens=300, summarizer=None,
+                 model=None):
+        """
+        Args:
+            memory_factory (callable): session_id -> LangChainMemory.
+            budget_tokens (int): Token budget of the verbatim turns.
+            summary_budget_tokens (int): Token budget of the rolling summary.
+            summarizer (callable): (summary, new_lines) -> summary, extractive_summarizer by default.
+            model (str): Model name used to pick the tiktoken encoding.
+        """
+        self.memory_factory = memory_factory
+        self.budget_tokens = budget_tokens
+        self.summary_budget_tokens = summary_budget_tokens
+        self.summarizer = summarizer or extractive_summarizer
+        self.encoding = get_encoding(model)
+        self.last_prompt_tokens = {}
+        self._windows = {}
+        self._lock = threading.Lock()
+
+    def count_tokens(self, text):
+        return len(self.encoding.encode(text, disallowed_special=()))
+
+    def _history(self, session_id):
+        return self.memory_factory(session_id).get_history()
+
+    def _window(self, session_id):
+        with self._lock:
+            window = self._windows.get(session_id)
+        if window is not None:
+            return window
+        history = self._history(session_id)
+        store = getattr(history, "store", None)
+        summary, covered = store.get_summary(session_id) if store is not None else ("", 0)
+        window = _SessionWindow(summary, covered)
+        window.summary_tokens = self.count_tokens(summary) if summary else 0
+        for message in history.messages[covered:]:
+            self._append(window, message)
+        self._evict(session_id, window, store)
+        with self._lock:
+            return self._windows.setdefault(session_id, window)
+
+    def _append(self, window, message):
+        line = format_message(message)
+        tokens = self.count_tokens(line) + 1
+        window.messages.append((line, tokens))
+        window.tokens += tokens
+
+    def _trim_summary(self, summary):
+        tokens = self.encoding.encode(summary, disallowed_special=())
+        if len(tokens) <= self.summary_budget_tokens:
+            return summary, len(tokens)
+        kept = tokens[-self.summary_budget_tokens:]
+        return self.encoding.decode(kept), len(kept)
+
+    def _evict(self, session_id, window, store):
+        evicted = []
+        while window.tokens > self.budget_tokens and len(window.messages) > 1:
+            line, tokens = window.messages.popleft()
+            window.tokens -= tokens
+            evicted.append(line)
+        if not evicted:
+            return
+        window.summary, window.summary_tokens = self._trim_summary(
+            self.summarizer(window.summary, "\n".join(evicted)))
+        window.covered += len(evicted)
+        if store is not None:
+            store.set_summary(session_id, window.summary, window.covered)
+
+    def add_messages(self, session_id, messages):
+        """
+        Append messages to the session history and slide the window.
+        """
+        window = self._window(session_id)
+        history = self._history(session_id)
+        history.add_messages(messages)
+        with window.lock:
+            for message in messages:
+                self._append(window, message)
+            self._evict(session_id, window, getattr(history, "store", None))
+
+    def add_turn(self, session_id, user_input, answer):
+        self.add_messages(session_id, [HumanMessage(content=user_input), AIMessage(content=answer)])
+
+    def render(self, session_id):
+        """
+        Returns:
+            str: The {history} text: the rolling summary, then the newest turns verbatim.
+        """
+        window = self._window(session_id)
+        with window.lock:
+            lines = [line for line, _ in window.messages]
+            if window.summary:
+                lines.insert(0, f"Summary of the earlier conversation: {window.summary}")
+            tokens = window.tokens + window.summary_tokens
+        self.last_prompt_tokens[session_id] = tokens
+        return "\n".join(lines)
+
+    def prompt_inputs(self, session_id, user_input, hackprompt=""):
+        """
+        Returns:
+            dict: The variables of chatprompt.tmpl.
+        """
+        return {"history": self.render(session_id), "input": user_input, "hackprompt": hackprompt}
+
+    def clear(self, session_id):
+        self.memory_factory(session_id).clear_history()
+        with self._lock:
+            self._windows.pop(session_id, None)
+        self.last_prompt_tokens.pop(session_id, None)
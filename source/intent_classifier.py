@@ -0,0 +1,285 @@
+import argparse
+import json
+import re
+import threading
+import time
+import zlib
+
+import numpy as np
+from langchain_core.runnables import RunnableLambda
+
+LABELS = ("Normal", "Appointment")
+TOKEN_PATTERN = re.compile(r"[a-z0-9@.']+")
+
+
+def canonical_label(label):
+    """
+    Map a raw classifier or LLM output to one of LABELS, or None.
+    """
+    text = str(label).strip().lower()
+    for name in LABELS:
+        if text.startswith(name.lower()):
+            return name
+    return None
+
+
+class HashedNgramVectorizer:
+    """
+    Maps a text to sparse hashed features: word unigrams and bigrams plus
+    character n-grams, each hashed with crc32 into n_features buckets and
+    signed by a second hash bit so collisions tend to cancel out.
+    """
+
+    def __init__(self, n_features=1 << 18, char_ngrams=(3, 5)):
+        self.n_features = n_features
+        self.char_ngrams = char_ngrams
+
+    def _ngrams(self, text):
+        words = TOKEN_PATTERN.findall(text.lower())
+        grams = [f"w:{word}" for word in words]
+        grams += [f"b:{first} {second}" for first, second in zip(words, words[1:])]
+        padded = f" {' '.join(words)} "
+        low, high = self.char_ngrams
+        for n in range(low, high + 1):
+            grams += [f"c:{padded[i:i + n]}" for i in range(len(padded) - n + 1)]
+        return grams
+
+    def transform(self, text):
+        """
+        Returns:
+            tuple: (indices, values) of the L2 normalized feature vector.
+        """
+        features = {}
+        for gram in self._ngrams(text):
+            hashed = zlib.crc32(gram.encode("utf-8"))
+            index = hashed % self.n_features
+            features[index] = features.get(index, 0.0) + (1.0 if hashed & 0x80000000 else -1.0)
+        indices = np.fromiter(features.keys(), dtype=np.int64, count=len(features))
+        values = np.fromiter(features.values(), dtype=np.float32, count=len(features))
+        norm = np.linalg.norm(values)
+        return indices, (values / norm if norm else values)
+
+
+class IntentClassifier:
+    """
+    Logistic regression over hashed n-gram features for the Normal /
+    Appointment decision, in pure NumPy.
+
+    classify() answers locally only when the predicted probability of the
+    winning label is at least confidence_threshold and returns None
+    otherwise, so the caller can fall back to the LLM classification chain.
+    """
+
+    def __init__(self, n_features=1 << 18, confidence_threshold=0.9):
+        self.vectorizer = HashedNgramVectorizer(n_features=n_features)
+        self.weights = np.zeros(n_features, dtype=np.float32)
+        self.bias = 0.0
+        self.confidence_threshold = confidence_threshold
+        self.local_decisions = 0
+        self.fallbacks = 0
+        self._lock = threading.Lock()
+
+    def fit(self, texts, labels, epochs=30, learning_rate=2.0, l2=1e-5, batch_size=64, seed=0):
+        """
+        Train on labelled texts with mini-batch gradient descent.
+        Args:
+            texts (list): Training texts.
+            labels (list): Normal/Appointment label of every text.
+        Returns:
+            IntentClassifier: self
+        """
+        samples = [self.vectorizer.transform(text) for text in texts]
+        targets = np.array([1.0 if canonical_label(label) == "Appointment" else 0.0 for label in labels],
+                           dtype=np.float32)
+        rng = np.random.default_rng(seed)
+        for _ in range(epochs):
+            order = rng.permutation(len(samples))
+            for start in range(0, len(order), batch_size):
+                batch = order[start:start + batch_size]
+                indices = [samples[i][0] for i in batch]
+                values = [samples[i][1] for i in batch]
+                logits = np.array([self.weights[idx] @ val for idx, val in zip(indices, values)]) + self.bias
+                errors = 1.0 / (1.0 + np.exp(-logits)) - targets[batch]
+                gradient = np.zeros_like(self.weights)
+                np.add.at(gradient, np.concatenate(indices),
+                          np.concatenate([error * val for error, val in zip(errors, values)]))
+                self.weights -= learning_rate * (gradient / len(batch) + l2 * self.weights)
+                self.bias -= learning_rate * float(errors.mean())
+        return self
+
+    def predict_proba(self, text):
+        """
+        Returns:
+            float: Probability that the text asks for an appointment.
+        """
+        indices, values = self.vectorizer.transform(text)
+        logit = float(self.weights[indices] @ values) + self.bias
+        return 1.0 / (1.0 + np.exp(-logit))
+
+    def predict(self, text):
+        """
+        Returns:
+            tuple: (label, confidence)
+        """
+        probability = self.predict_proba(text)
+        if probability >= 0.5:
+            return "Appointment", probability
+        return "Normal", 1.0 - probability
+
+    def classify(self, text):
+        label, confidence = self.predict(text)
+        with self._lock:
+            if confidence >= self.confidence_threshold:
+                self.local_decisions += 1
+                return label
+            self.fallbacks += 1
+        return None
+
+    def stats(self):
+        decisions = self.local_decisions + self.fallbacks
+        return {
+            "local_decisions": self.local_decisions,
+            "llm_fallbacks": self.fallbacks,
+            "local_rate": self.local_decisions / decisions if decisions else 0.0,
+        }
+
+    def save(self, path):
+        np.savez_compressed(path, weights=self.weights, bias=np.float32(self.bias),
+                            confidence_threshold=np.float32(self.confidence_threshold))
+
+    @classmethod
+    def load(cls, path, confidence_threshold=None):
+        data = np.load(path)
+        classifier = cls(n_features=len(data["weights"]),
+                         confidence_threshold=float(data["confidence_threshold"]))
+        classifier.weights = data["weights"].astype(np.float32)
+        classifier.bias = float(data["bias"])
+        if confidence_threshold is not None:
+            classifier.confidence_threshold = confidence_threshold
+        return classifier
+
+
+class LabelLogger:
+    """
+    Appends the labels produced by the LLM chain to a JSONL file, which is
+    the training data of the local classifier.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def log(self, text, label):
+        label = canonical_label(label)
+        if label is None:
+            return
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as file:
+                file.write(json.dumps({"text": text, "label": label}) + "\n")
+
+
+def load_labeled(path):
+    """
+    Read a JSONL file of {"text": ..., "label": ...} records.
+    Returns:
+        tuple: (texts, labels)
+    """
+    texts, labels = [], []
+    with open(path, "r", encoding="utf-8") as file:
+        for line in file:
+            if line.strip():
+                record = json.loads(line)
+                texts.append(record["text"])
+                labels.append(canonical_label(record["label"]))
+    return texts, labels
+
+
+def local_first_chain(classifier, llm_chain, label_logger=None):
+    """
+    Classification runnable that asks the local classifier first and only
+    calls the LLM chain when the classifier is not confident.
+    Args:
+        classifier (IntentClassifier): The local classifier, or None to always use the LLM.
+        llm_chain (Runnable): The classify_query.tmpl chain.
+        label_logger (LabelLogger): Where the LLM labels are logged for training.
+    Returns:
+        Runnable: Invoked with {"input": text}, returns the label.
+    """
+    # imported here so `python source/intent_classifier.py train|report` runs without the repo root on sys.path
+    from source.tracing import current_span
+
+    def classify(inputs):
+        label = classifier.classify(inputs["input"]) if classifier is not None else None
+        if label is not None:
+            current_span().add("local_decisions")
+            return label
+        current_span().add("llm_fallbacks")
+        label = llm_chain.invoke(inputs)
+        if label_logger is not None:
+            label_logger.log(inputs["input"], label)
+        return label
+
+    async def aclassify(inputs):
+        label = classifier.classify(inputs["input"]) if classifier is not None else None
+        if label is not None:
+            current_span().add("local_decisions")
+            return label
+        current_span().add("llm_fallbacks")
+        label = await llm_chain.ainvoke(inputs)
+        if label_logger is not None:
+            label_logger.log(inputs["input"], label)
+        return label
+
+    return RunnableLambda(classify, afunc=aclassify)
+
+
+def evaluate(classifier, texts, labels):
+    """
+    Offline accuracy and latency report of the classifier on labelled data.
+    Returns:
+        dict: Overall accuracy, coverage and accuracy of the confident predictions, latencies in ms.
+    """
+    latencies, correct, confident, confident_correct = [], 0, 0, 0
+    for text, label in zip(texts, labels):
+        start = time.perf_counter()
+        predicted, confidence = classifier.predict(text)
+        latencies.append((time.perf_counter() - start) * 1000)
+        correct += predicted == label
+        if confidence >= classifier.confidence_threshold:
+            confident += 1
+            confident_correct += predicted == label
+    latencies = np.array(latencies) if latencies else np.zeros(1)
+    return {
+        "samples": len(texts),
+        "accuracy": correct / len(texts) if texts else 0.0,
+        "coverage": confident / len(texts) if texts else 0.0,
+        "confident_accuracy": confident_correct / confident if confident else 0.0,
+        "latency_ms_mean": float(latencies.mean()),
+        "latency_ms_p95": float(np.percentile(latencies, 95)),
+        "latency_ms_p99": float(np.percentile(latencies, 99)),
+    }
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Train or evaluate the local intent classifier.")
+    commands = arg_parser.add_subparsers(dest="command", required=True)
+    train_parser = commands.add_parser("train", help="train on a labelled JSONL file")
+    train_parser.add_argument("labels")
+    train_parser.add_argument("model")
+    train_parser.add_argument("--threshold", type=float, default=0.9)
+    train_parser.add_argument("--epochs", type=int, default=30)
+    report_parser = commands.add_parser("report", help="accuracy/latency report on a labelled JSONL file")
+    report_parser.add_argument("model")
+    report_parser.add_argument("labels")
+    report_parser.add_argument("--threshold", type=float, default=None)
+    args = arg_parser.parse_args()
+
+    if args.command == "train":
+        texts, labels = load_labeled(args.labels)
+        model = IntentClassifier(confidence_threshold=args.threshold).fit(texts, labels, epochs=args.epochs)
+        model.save(args.model)
+        print(json.dumps(evaluate(model, texts, labels), indent=2))
+    else:
+        model = IntentClassifier.load(args.model, confidence_threshold=args.threshold)
+        texts, labels = load_labeled(args.labels)
+        print(json.dumps(evaluate(model, texts, labels), indent=2))
@@ -1,13 +1,14 @@
-from langchain.memory import PostgresChatMessageHistory
-from langchain_community.chat_message_histories import SQLChatMessageHistory
+from langchain_community.chat_message_histories import PostgresChatMessageHistory, SQLChatMessageHistory
 from config import DB_TYPE
+from source.history_store import PooledChatMessageHistory, get_history_store
 
 
 class LangChainMemory:
-    def __init__(self, connection_string: str, session_id: str):
+    def __init__(self, connection_string: str, session_id: str, pooled: bool = False):
         self.connection_string = connection_string
         self.session_id = session_id
         self.db_type = DB_TYPE
+        self.pooled = pooled
 
     def postges_history(self):
         """
@@ -35,6 +36,17 @@ class LangChainMemory:
         )
         return history
 
+    def pooled_history(self):
+        """
+        Get the chat history for the current session from the process-wide
+        pooled, write-behind history store of the database.
+        Args:
+            None
+        Returns:
+            PooledChatMessageHistory: A PooledChatMessageHistory object.
+        """
+        return PooledChatMessageHistory(get_history_store(self.connection_string), self.session_id)
+
     def get_history(self):
         """
         Get the chat history for the current session.
@@ -43,7 +55,9 @@ class LangChainMemory:
         Returns:
             ChatMessageHistory: A ChatMessageHistory object.
         """
-        if self.db_type == "postgres":
+        if self.pooled:
+            history = self.pooled_history()
+        elif self.db_type == "postgres":
             history = self.postges_history()
         elif self.db_type == "sqlite":
             history = self.sqlite_history()
@@ -57,7 +71,9 @@ class LangChainMemory:
         Returns:
             None
         """
-        if self.db_type == "postgres":
+        if self.pooled:
+            history = self.pooled_history()
+        elif self.db_type == "postgres":
             history = self.postges_history()
         elif self.db_type == "sqlite":
             history = self.sqlite_history()
@@ -0,0 +1,123 @@
+import hashlib
+import threading
+import time
+
+import numpy as np
+
+
+def corpus_version(documents):
+    """
+    Version string of an indexed corpus, derived from its chunks.
+    Args:
+        documents (list): The chunk documents behind the retriever.
+    Returns:
+        str: A hash that changes whenever the chunks change.
+    """
+    digest = hashlib.sha1()
+    for doc in documents:
+        digest.update(str(doc.metadata.get("source", "")).encode("utf-8"))
+        digest.update(doc.page_content.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class SemanticAnswerCache:
+    """
+    Caches answers by the meaning of the question.
+
+    Questions are embedded and kept, normalized, in a fixed size NumPy
+    matrix; a lookup is one matrix-vector product and returns the stored
+    answer of the most similar question when the cosine similarity is at
+    least threshold. The cache is tied to a corpus version (a string or a
+    callable returning one) and empties itself when the version changes.
+    When full, the least recently used answer is replaced.
+    """
+
+    def __init__(self, embeddings, threshold=0.92, max_entries=512, corpus_version=None):
+        self.embeddings = embeddings
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.corpus_version = corpus_version
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._version = self._current_version()
+        self._vectors = None
+        self._answers = [None] * max_entries
+        self._queries = [None] * max_entries
+        self._last_used = np.zeros(max_entries, dtype=np.float64)
+        self._size = 0
+
+    def _current_version(self):
+        return self.corpus_version() if callable(self.corpus_version) else self.corpus_version
+
+    def _check_version(self):
+        version = self._current_version()
+        if version != self._version:
+            self._version = version
+            self._clear()
+
+    def _clear(self):
+        self._answers = [None] * self.max_entries
+        self._queries = [None] * self.max_entries
+        self._last_used[:] = 0
+        self._size = 0
+
+    def clear(self):
+        with self._lock:
+            self._clear()
+
+    def _embed(self, query):
+        vector = np.asarray(self.embeddings.embed_query(query), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def get(self, query):
+        """
+        Look up the answer of a similar earlier question.
+        Args:
+            query (str): The user question.
+        Returns:
+            tuple: (answer or None, query vector); pass the vector back to put() on a miss.
+        """
+        vector = self._embed(query)
+        with self._lock:
+            self._check_version()
+            if self._size:
+                similarities = self._vectors[:self._size] @ vector
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    self.hits += 1
+                    self._last_used[best] = time.monotonic()
+                    return self._answers[best], vector
+            self.misses += 1
+        return None, vector
+
+    def put(self, query, answer, vector=None):
+        """
+        Store the answer of a question, replacing the least recently used one when full.
+        """
+        if vector is None:
+            vector = self._embed(query)
+        with self._lock:
+            self._check_version()
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_entries, len(vector)), dtype=np.float32)
+            if self._size < self.max_entries:
+                slot = self._size
+                self._size += 1
+            else:
+                slot = int(np.argmin(self._last_used))
+            self._vectors[slot] = vector
+            self._answers[slot] = answer
+            self._queries[slot] = query
+            self._last_used[slot] = time.monotonic()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": self._size,
+        }
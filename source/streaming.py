@@ -0,0 +1,168 @@
+import re
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+FENCE_PATTERN = re.compile(r"^\s*(```|~~~)", re.MULTILINE)
+OPEN_LINK_PATTERN = re.compile(r"\[[^\]]*$|\[[^\]]*\]\([^)]*$")
+
+
+class MarkdownStreamBuffer:
+    """
+    Turns a stream of LLM tokens into pieces of markdown that are safe to
+    show as they come.
+
+    Text is released up to the last whitespace, so a word or a ** / `
+    marker is never split. An emphasis, inline code or link that opened in
+    the pending text is held back until it closes, and inside a code fence
+    only complete lines are released. Nothing is held back longer than
+    max_holdback characters, so an unbalanced marker cannot stall the stream.
+    """
+
+    def __init__(self, max_holdback=200):
+        self.max_holdback = max_holdback
+        self.pending = ""
+        self.in_fence = False
+
+    def _open_marker(self, text):
+        """
+        Index of the earliest emphasis, inline code or link that is still open in text, or None.
+        """
+        earliest = None
+        for marker in ("**", "__", "`"):
+            if text.count(marker) % 2:
+                index = text.rfind(marker)
+                earliest = index if earliest is None else min(earliest, index)
+        link = OPEN_LINK_PATTERN.search(text)
+        if link is not None:
+            earliest = link.start() if earliest is None else min(earliest, link.start())
+        return earliest
+
+    def _split(self, final):
+        text = self.pending
+        if final:
+            return text, ""
+        if self.in_fence or FENCE_PATTERN.search(text):
+            # code: release whole lines only
+            cut = text.rfind("\n") + 1
+        else:
+            cut = max(text.rfind(" "), text.rfind("\n")) + 1
+            marker = self._open_marker(text[:cut])
+            if marker is not None:
+                cut = marker
+        if len(text) - cut > self.max_holdback:
+            cut = len(text)
+        return text[:cut], text[cut:]
+
+    def feed(self, token):
+        """
+        Args:
+            token (str): The next piece of the LLM output.
+        Returns:
+            str: Text that can be shown now, possibly empty.
+        """
+        self.pending += token
+        ready, self.pending = self._split(final=False)
+        self.in_fence ^= len(FENCE_PATTERN.findall(ready)) % 2 == 1
+        return ready
+
+    def flush(self):
+        ready, self.pending = self._split(final=True)
+        return ready
+
+
+class StreamMetrics:
+    """
+    Timing of one streamed answer: time to first token from the start of the
+    request, and generation speed in tokens (stream chunks) per second.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.first_token_at = None
+        self.finished_at = None
+        self.tokens = 0
+
+    def token(self):
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+        self.tokens += 1
+
+    def finish(self):
+        self.finished_at = time.perf_counter()
+        return self
+
+    @property
+    def ttft(self):
+        return None if self.first_token_at is None else self.first_token_at - self.started
+
+    @property
+    def tokens_per_second(self):
+        if self.first_token_at is None or self.finished_at is None:
+            return None
+        elapsed = self.finished_at - self.first_token_at
+        return self.tokens / elapsed if elapsed > 0 else None
+
+    def as_dict(self):
+        return {
+            "ttft_seconds": self.ttft,
+            "tokens": self.tokens,
+            "tokens_per_second": self.tokens_per_second,
+            "total_seconds": None if self.finished_at is None else self.finished_at - self.started,
+        }
+
+
+class StreamMetricsRecorder:
+    """
+    Keeps the metrics of the last max_entries streamed answers and reports percentiles.
+    """
+
+    def __init__(self, max_entries=1000):
+        self._entries = deque(maxlen=max_entries)
+        self._lock = threading.Lock()
+
+    def record(self, metrics):
+        with self._lock:
+            self._entries.append(metrics.as_dict())
+
+    def summary(self):
+        with self._lock:
+            entries = list(self._entries)
+        ttfts = np.array([entry["ttft_seconds"] for entry in entries if entry["ttft_seconds"] is not None])
+        speeds = np.array([entry["tokens_per_second"] for entry in entries if entry["tokens_per_second"]])
+        report = {"requests": len(entries)}
+        if len(ttfts):
+            report.update(ttft_p50=float(np.percentile(ttfts, 50)), ttft_p95=float(np.percentile(ttfts, 95)))
+        if len(speeds):
+            report["tokens_per_second_mean"] = float(speeds.mean())
+        return report
+
+
+stream_metrics = StreamMetricsRecorder()
+
+
+async def astream_markdown(runnable, inputs, metrics=None, max_holdback=200):
+    """
+    Stream a chain's output as markdown-safe pieces.
+    Args:
+        runnable (Runnable): A chain whose astream() yields strings or message chunks.
+        inputs: The chain input.
+        metrics (StreamMetrics): Updated per token when given.
+    Yields:
+        str: Pieces of the answer, in order.
+    """
+    buffer = MarkdownStreamBuffer(max_holdback=max_holdback)
+    async for chunk in runnable.astream(inputs):
+        token = getattr(chunk, "content", chunk)
+        if not token:
+            continue
+        if metrics is not None:
+            metrics.token()
+        ready = buffer.feed(token)
+        if ready:
+            yield ready
+    rest = buffer.flush()
+    if rest:
+        yield rest
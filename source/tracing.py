@@ -0,0 +1,312 @@
+import functools
+import inspect
+import itertools
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+# latency histogram buckets in seconds
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_current_span = ContextVar("current_span", default=None)
+_span_ids = itertools.count(1)
+
+
+class _NoopSpan:
+    """
+    Returned by Tracer.span() while tracing is disabled: every call is a no-op.
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, key, value):
+        pass
+
+    def add(self, key, amount=1):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Span:
+    """
+    One timed stage. Numeric counters added with add() (tokens, cache hits,
+    documents) are summed per span name in the exported metrics; set() stores
+    plain attributes that only appear in the JSONL records.
+    """
+
+    __slots__ = ("tracer", "name", "span_id", "parent_id", "attributes", "counters", "start", "duration", "error",
+                 "streaming", "_token")
+
+    def __init__(self, tracer, name, attributes):
+        self.tracer = tracer
+        self.name = name
+        self.span_id = next(_span_ids)
+        self.parent_id = None
+        self.attributes = attributes
+        self.counters = {}
+        self.start = 0.0
+        self.duration = 0.0
+        self.error = None
+        self.streaming = False
+        self._token = None
+
+    def __enter__(self):
+        parent = _current_span.get()
+        self.parent_id = parent.span_id if parent is not None else None
+        self._token = _current_span.set(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.duration = time.perf_counter() - self.start
+        try:
+            _current_span.reset(self._token)
+        except ValueError:
+            # exited from another context, e.g. an async generator closed elsewhere
+            pass
+        if exc_type is not None:
+            self.error = exc_type.__name__
+        self.tracer._finish(self)
+        return False
+
+    def set(self, key, value):
+        self.attributes[key] = value
+
+    def add(self, key, amount=1):
+        self.counters[key] = self.counters.get(key, 0) + amount
+
+    def as_dict(self):
+        return {
+            "name": self.name,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "timestamp": time.time() - self.duration,
+            "duration_ms": self.duration * 1000,
+            "error": self.error,
+            **({"attributes": self.attributes} if self.attributes else {}),
+            **({"counters": self.counters} if self.counters else {}),
+        }
+
+
+class _SpanStats:
+    __slots__ = ("count", "errors", "total", "buckets", "counters")
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.buckets = [0] * (len(BUCKETS) + 1)
+        self.counters = {}
+
+
+class Tracer:
+    """
+    Lightweight per-stage spans and metrics for the pipeline.
+
+    While disabled, span() returns a shared no-op object and traced()
+    functions only check one attribute, so instrumentation can stay in place.
+    When enabled, every finished span updates a latency histogram and
+    counter totals per span name (see prometheus_text()) and, if a JSONL
+    path is set, is appended to that file as one record.
+    Enable with TRACING=1 and set the file with TRACING_JSONL=path, or call enable().
+    """
+
+    def __init__(self, enabled=False, jsonl_path=None):
+        self.enabled = enabled
+        self.jsonl_path = jsonl_path
+        self._stats = {}
+        self._lock = threading.Lock()
+        self._file = None
+
+    def enable(self, jsonl_path=None):
+        with self._lock:
+            if jsonl_path is not None:
+                self._close_file()
+                self.jsonl_path = jsonl_path
+            self.enabled = True
+
+    def disable(self):
+        with self._lock:
+            self.enabled = False
+            self._close_file()
+
+    def _close_file(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+    def span(self, name, **attributes):
+        """
+        Context manager timing one stage.
+        Args:
+            name (str): Stage name, e.g. "retriever.bm25".
+            attributes: Plain attributes stored with the span.
+        Returns:
+            Span: Use span.add("tokens", n) / span.set(key, value) inside the block.
+        """
+        if not self.enabled:
+            return NOOP_SPAN
+        return Span(self, name, attributes)
+
+    def _finish(self, span):
+        with self._lock:
+            stats = self._stats.get(span.name)
+            if stats is None:
+                stats = self._stats[span.name] = _SpanStats()
+            stats.count += 1
+            stats.errors += span.error is not None
+            stats.total += span.duration
+            stats.buckets[bisect_left(BUCKETS, span.duration)] += 1
+            for key, amount in span.counters.items():
+                stats.counters[key] = stats.counters.get(key, 0) + amount
+            if self.jsonl_path:
+                if self._file is None:
+                    self._file = open(self.jsonl_path, "a", encoding="utf-8")
+                self._file.write(json.dumps(span.as_dict(), default=str) + "\n")
+                self._file.flush()
+
+    def summary(self):
+        """
+        Returns:
+            dict: count, errors, mean_ms and counter totals per span name.
+        """
+        with self._lock:
+            return {
+                name: {"count": stats.count, "errors": stats.errors,
+                       "mean_ms": stats.total / stats.count * 1000 if stats.count else 0.0, **stats.counters}
+                for name, stats in sorted(self._stats.items())
+            }
+
+    def prometheus_text(self):
+        """
+        Returns:
+            str: The span metrics in the Prometheus text exposition format.
+        """
+        lines = [
+            "# HELP pipeline_span_duration_seconds Duration of pipeline stages.",
+            "# TYPE pipeline_span_duration_seconds histogram",
+        ]
+        error_lines, counter_lines = [], []
+        with self._lock:
+            for name, stats in sorted(self._stats.items()):
+                cumulative = 0
+                for bound, bucket in zip(BUCKETS, stats.buckets):
+                    cumulative += bucket
+                    lines.append(f'pipeline_span_duration_seconds_bucket{{span="{name}",le="{bound}"}} {cumulative}')
+                lines.append(f'pipeline_span_duration_seconds_bucket{{span="{name}",le="+Inf"}} {stats.count}')
+                lines.append(f'pipeline_span_duration_seconds_sum{{span="{name}"}} {stats.total}')
+                lines.append(f'pipeline_span_duration_seconds_count{{span="{name}"}} {stats.count}')
+                error_lines.append(f'pipeline_span_errors_total{{span="{name}"}} {stats.errors}')
+                for key, amount in sorted(stats.counters.items()):
+                    counter_lines.append(f'pipeline_span_counter_total{{span="{name}",counter="{key}"}} {amount}')
+        lines += [
+            "# HELP pipeline_span_errors_total Pipeline stages that raised.",
+            "# TYPE pipeline_span_errors_total counter",
+        ]
+        lines += error_lines
+        lines += [
+            "# HELP pipeline_span_counter_total Tokens, cache hits and other counts recorded by pipeline stages.",
+            "# TYPE pipeline_span_counter_total counter",
+        ]
+        lines += counter_lines
+        return "\n".join(lines) + "\n"
+
+
+tracer = Tracer(enabled=os.environ.get("TRACING", "").lower() in ("1", "true", "yes"),
+                jsonl_path=os.environ.get("TRACING_JSONL") or None)
+
+
+def span(name, **attributes):
+    return tracer.span(name, **attributes)
+
+
+def current_span():
+    """
+    The innermost active span, or the no-op span, so callers can add counters without checking.
+    """
+    return _current_span.get() or NOOP_SPAN
+
+
+def traced_iter(name, iterable, counter="items", **attributes):
+    """
+    Yield from an iterable under one span that only times the production of
+    its items: the consumer's work between items is left out, and so is the
+    time of traced_iter() stages pulled from inside (a parser read by a
+    splitter), so every stage of a stream reports its own time.
+    Args:
+        name (str): Span name.
+        iterable (iterable): The stream.
+        counter (str): Counter incremented per item.
+        attributes: Plain attributes stored with the span.
+    """
+    iterator = iter(iterable)
+    if not tracer.enabled:
+        yield from iterator
+        return
+    stage = Span(tracer, name, attributes)
+    stage.streaming = True
+    parent = _current_span.get()
+    stage.parent_id = parent.span_id if parent is not None else None
+    try:
+        while True:
+            outer = _current_span.get()
+            token = _current_span.set(stage)
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                elapsed = time.perf_counter() - start
+                _current_span.reset(token)
+                stage.duration += elapsed
+                if outer is not None and outer.streaming:
+                    outer.duration -= elapsed
+            stage.add(counter)
+            yield item
+    except Exception as exc:
+        stage.error = type(exc).__name__
+        raise
+    finally:
+        tracer._finish(stage)
+
+
+def traced(name=None):
+    """
+    Decorator putting every call of a function (sync or async) in a span.
+    Args:
+        name (str): Span name, the function's qualified name by default.
+    """
+    def decorator(function):
+        span_name = name or function.__qualname__
+
+        if inspect.iscoroutinefunction(function):
+            @functools.wraps(function)
+            async def async_wrapper(*args, **kwargs):
+                if not tracer.enabled:
+                    return await function(*args, **kwargs)
+                with Span(tracer, span_name, {}):
+                    return await function(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not tracer.enabled:
+                return function(*args, **kwargs)
+            with Span(tracer, span_name, {}):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
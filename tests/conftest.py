@@ -0,0 +1,39 @@
+import importlib.util
+import os
+import sys
+import tempfile
+import types
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# RAG_System/ and source/ are imported from the repository root, as the scripts do,
+# and the deterministic stand-ins of benchmarks/stubs.py are shared with the tests
+sys.path.insert(0, ROOT)
+sys.path.insert(1, os.path.join(ROOT, "benchmarks"))
+
+if importlib.util.find_spec("config") is None:
+    # config.py holds the deployment keys and is not committed: without one the
+    # tests run with offline settings and a throwaway SQLite database
+    config = types.ModuleType("config")
+    config.DATABASE_URL = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "chat.db")
+    config.DB_TYPE = "sqlite"
+    config.GEMINI_API_KEY = None
+    config.MODEL_NAME = "fake"
+    sys.modules["config"] = config
+
+
+@pytest.fixture(scope="session")
+def byte_encoding():
+    """
+    A tiktoken encoding with one token per byte: the real BPE ranks are downloaded
+    on first use, which the offline tests cannot do.
+    """
+    import tiktoken
+
+    return tiktoken.Encoding(
+        name="test_bytes",
+        pat_str=r"""'s|'t|'re|'ve|'m|'ll|'d| ?\p{L}+| ?\p{N}+| ?[^\s\p{L}\p{N}]+|\s+(?!\S)|\s+""",
+        mergeable_ranks={bytes([i]): i for i in range(256)},
+        special_tokens={"<|endoftext|>": 256},
+    )
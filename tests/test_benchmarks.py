@@ -0,0 +1,60 @@
+import json
+import os
+import subprocess
+import sys
+
+import numpy as np
+from langchain_core.documents import Document
+
+from stubs import HashingEmbeddings, KeywordOverlapReranker, generate_queries, write_text_corpus
+
+BENCHMARKS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks")
+
+
+def test_hashing_embeddings_are_deterministic_and_normalized():
+    embeddings = HashingEmbeddings(dim=64)
+    first = embeddings.embed_documents(["The pool opens at nine", ""])
+    assert first == HashingEmbeddings(dim=64).embed_documents(["The pool opens at nine", ""])
+    assert abs(np.linalg.norm(first[0]) - 1.0) < 1e-6
+    assert first[1] == [0.0] * 64
+    assert embeddings.embed_query("the pool opens at nine") == first[0]
+
+
+def test_shared_words_give_similar_vectors():
+    embeddings = HashingEmbeddings()
+    pool, pool_again, parking = (np.array(embeddings.embed_query(text)) for text in
+                                 ["When does the pool open", "pool open hours", "Where can I park my car"])
+    assert pool @ pool_again > pool @ parking
+
+
+def test_keyword_overlap_reranker():
+    docs = [Document(page_content="Parking is in the garage."),
+            Document(page_content="The pool opens at nine.", metadata={"source": "a.txt"}),
+            Document(page_content="The spa opens at ten.")]
+    ranked = KeywordOverlapReranker(top_n=2).compress_documents(docs, "When does the pool open at nine?")
+    assert [doc.page_content for doc in ranked] == ["The pool opens at nine.", "The spa opens at ten."]
+    assert ranked[0].metadata == {"source": "a.txt", "relevance_score": 4 / 7}
+
+
+def test_generated_corpus_and_queries(tmp_path):
+    path = write_text_corpus(str(tmp_path / "corpus.txt"), 5000)
+    text = open(path).read()
+    assert 5000 <= len(text) < 7000
+    assert text == open(write_text_corpus(str(tmp_path / "again.txt"), 5000)).read()
+    assert generate_queries(3) == generate_queries(3)
+
+
+def test_pipeline_benchmark_runs_offline(tmp_path):
+    output = str(tmp_path / "baseline.json")
+    command = [sys.executable, os.path.join(BENCHMARKS, "bench_pipeline.py"), "--sizes", "20000",
+               "--queries", "5", "--turns", "2", "--bookings", "2", "--output", output]
+    env = {**os.environ, "LLM_TYPE": "fake"}
+    subprocess.run(command, cwd=str(tmp_path), env=env, check=True, capture_output=True, timeout=300)
+    with open(output) as file:
+        results = json.load(file)
+    size = results["sizes"][0]
+    assert size["chunks"] > 0 and size["retrieval"]["n"] == 5 and size["turn"]["n"] == 2
+    assert results["form"]["completed"] == results["form"]["completed_bookings"] == 2
+    compared = subprocess.run(command[:-2] + ["--compare", output], cwd=str(tmp_path), env=env, check=True,
+                              capture_output=True, text=True, timeout=300)
+    assert "form llm_calls_per_booking" in compared.stdout
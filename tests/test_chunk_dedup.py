@@ -0,0 +1,72 @@
+import logging
+
+from langchain_core.documents import Document
+
+from RAG_System.chunk_dedup import ChunkDeduplicator, deduplicate_chunks, format_dedup_report
+from rag_pipeline import vector_store_creator_from_file
+from stubs import HashingEmbeddings
+
+POLICY = ("Guests can cancel a booking free of charge up to forty eight hours before arrival, after that "
+          "the first night is charged to the card used for the reservation and the rest is refunded")
+
+
+def chunk(text, source, chunk_id):
+    return Document(page_content=text, metadata={"source": source, "chunk_id": chunk_id})
+
+
+def test_exact_duplicates_are_folded_into_the_first_chunk():
+    chunks = [chunk(POLICY, "a.txt", "a-0"),
+              chunk("  " + POLICY.upper() + "\n", "b.txt", "b-0"),
+              chunk("Breakfast is served from seven to ten in the lobby restaurant.", "b.txt", "b-1")]
+    kept, deduplicator = deduplicate_chunks(chunks)
+    assert [doc.metadata["chunk_id"] for doc in kept] == ["a-0", "b-1"]
+    assert kept[0].metadata["sources"] == [{"source": "a.txt", "chunk_id": "a-0"},
+                                           {"source": "b.txt", "chunk_id": "b-0"}]
+    assert "sources" not in kept[1].metadata
+    report = deduplicator.report(embedding_dim=384, embed_batch_size=2)
+    assert report["exact_duplicates"] == 1
+    assert report["near_duplicates"] == 0
+    assert report["embedding_calls_saved"] == 1
+    assert report["embedding_requests_saved"] == 1
+    assert report["index_bytes_saved"] == 384 * 4 + report["text_bytes_saved"]
+
+
+def test_near_duplicates_are_dropped():
+    near = POLICY.replace("the rest is refunded", "the rest is refunded in full")
+    kept, deduplicator = deduplicate_chunks([chunk(POLICY, "a.txt", "a-0"), chunk(near, "b.txt", "b-0")],
+                                            threshold=0.7)
+    assert [doc.metadata["chunk_id"] for doc in kept] == ["a-0"]
+    assert deduplicator.near_duplicates == 1
+    assert list(deduplicator.merged_sources()) == ["a-0"]
+
+
+def test_distinct_chunks_are_kept():
+    other = ("Parking is available in the garage below the hotel for ten dollars a night, "
+             "please ask the front desk for a parking card when you check in")
+    kept, deduplicator = deduplicate_chunks([chunk(POLICY, "a.txt", "a-0"), chunk(other, "a.txt", "a-1")])
+    assert len(kept) == 2
+    assert deduplicator.report()["kept_chunks"] == 2
+
+
+def test_add_deduplicates_across_calls():
+    deduplicator = ChunkDeduplicator()
+    assert len(deduplicator.add([chunk(POLICY, "a.txt", "a-0")])) == 1
+    assert deduplicator.add([chunk(POLICY, "b.txt", "b-0")]) == []
+    assert deduplicator.kept[0].metadata["sources"] == [{"source": "a.txt", "chunk_id": "a-0"},
+                                                        {"source": "b.txt", "chunk_id": "b-0"}]
+
+
+def test_format_dedup_report():
+    report = {"input_chunks": 3, "kept_chunks": 2, "exact_duplicates": 1, "near_duplicates": 0,
+              "embedding_calls_saved": 1, "index_bytes_saved": 2_500_000}
+    assert format_dedup_report(report) == ("dedup: 3 chunks -> 2 (1 exact, 0 near duplicates), "
+                                           "1 embedding calls saved, 2.50 MB index saved")
+
+
+def test_index_build_logs_the_report_instead_of_printing(tmp_path, caplog, capsys):
+    path = tmp_path / "faq.txt"
+    path.write_text("\n\n".join([POLICY, "Breakfast is served from seven to ten.", POLICY]))
+    with caplog.at_level(logging.INFO, logger="rag_pipeline"):
+        vector_store_creator_from_file(str(path), HashingEmbeddings(dim=64), use_cache=False)
+    assert capsys.readouterr().out == ""
+    assert any(record.getMessage().startswith("dedup: ") for record in caplog.records)
@@ -0,0 +1,59 @@
+import pytest
+
+from conversationa_form import UserInfoCollectorWithToolAndAgent
+
+
+def make_form():
+    return UserInfoCollectorWithToolAndAgent(api_key=None, model="fake", provider="fake")
+
+
+def no_person(text):
+    return None
+
+
+@pytest.fixture
+def extractor():
+    return make_form().local_extractor
+
+
+@pytest.fixture(autouse=True)
+def fresh_counters(monkeypatch):
+    for counter in ("completed_bookings", "total_llm_calls", "total_llm_calls_avoided"):
+        monkeypatch.setattr(UserInfoCollectorWithToolAndAgent, counter, 0)
+
+
+def test_name_after_a_cue(extractor):
+    assert extractor.extract("Hi, my name is John Smith and my email is", find_person=no_person) == {"name": "John Smith"}
+    assert extractor.extract("this is urgent", find_person=no_person) == {}
+    assert extractor.extract("this is Jane", expecting="name", find_person=no_person) == {"name": "Jane"}
+
+
+@pytest.mark.parametrize("reply", ["Maybe later", "Not sure", "no idea", "hello there"])
+def test_common_replies_are_not_names(extractor, reply):
+    assert extractor.extract(reply, expecting="name", find_person=no_person) == {}
+
+
+def test_bare_name_needs_a_person_entity(extractor):
+    assert extractor.extract("John Smith", expecting="name", find_person=lambda text: "John Smith") == {"name": "John Smith"}
+    assert extractor.extract("Sure", expecting="name", find_person=lambda text: "Sure") == {}
+    # the name is only looked for without a cue when it was just asked for
+    assert extractor.extract("John Smith", expecting="email", find_person=lambda text: "John Smith") == {}
+
+
+def test_email_and_date(extractor):
+    found = extractor.extract("jane@example.com tomorrow", expecting="email", find_person=no_person)
+    assert found["email"] == "jane@example.com"
+    assert "Invalid" not in found["date"]
+    assert extractor.extract("jane@", expecting="email", find_person=no_person) == {"email": "Invalid Entry: Invalid email format"}
+
+
+def test_extraction_report_counts_llm_calls_per_booking():
+    form = make_form()
+    for reply in ["My name is John Smith", "Maybe later", "john.smith@example.com", "tomorrow"]:
+        assert form.next_question() is not None
+        form.process_user_input(reply)
+    assert form.next_question() is None
+    assert form.user_info["name"]["value"] == "John Smith"
+    # "Maybe later" resolves nothing locally, so it costs the one LLM call
+    assert UserInfoCollectorWithToolAndAgent.extraction_report() == {
+        "completed_bookings": 1, "llm_calls_per_booking": 1.0, "llm_calls_avoided_per_booking": 3.0}
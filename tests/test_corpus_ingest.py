@@ -0,0 +1,103 @@
+import os
+import time
+
+import pytest
+from langchain_core.documents import Document
+
+from FileParser.fileparser import TextFileParser
+from RAG_System.corpus_ingest import CorpusIngestor, assign_chunk_ids, find_corpus_files, ingest_corpus
+from RAG_System.vector_store_maker import CharacterTextSplitting
+from source.tracing import tracer
+from stubs import HashingEmbeddings
+
+POOL = "The rooftop pool opens at nine in the morning and closes at ten in the evening for all guests."
+BREAKFAST = "Breakfast is served from seven to ten in the lobby restaurant, with vegan options on request."
+PARKING = "Parking is available in the garage below the hotel for ten dollars a night per car."
+
+
+def write_corpus(folder):
+    os.makedirs(folder / "policies")
+    (folder / "pool.txt").write_text(POOL)
+    (folder / "policies" / "breakfast.txt").write_text(BREAKFAST)
+    (folder / "policies" / "copy_of_pool.txt").write_text(POOL)
+    (folder / "parking.json").write_text('{"parking": "%s"}' % PARKING)
+    (folder / "broken.json").write_text('{"unterminated": ')
+    (folder / "notes.md").write_text("not a supported type")
+
+
+def test_find_corpus_files(tmp_path):
+    write_corpus(tmp_path)
+    found = sorted(os.path.relpath(path, tmp_path) for path in find_corpus_files(str(tmp_path)))
+    assert found == ["broken.json", "parking.json", os.path.join("policies", "breakfast.txt"),
+                     os.path.join("policies", "copy_of_pool.txt"), "pool.txt"]
+
+
+def test_chunk_ids_are_stable_per_source_and_content():
+    first = [Document(page_content="a"), Document(page_content="b")]
+    second = [Document(page_content="a"), Document(page_content="b")]
+    assert assign_chunk_ids(first, "notes.txt", "hash") == assign_chunk_ids(second, "notes.txt", "hash")
+    assert assign_chunk_ids(second, "notes.txt", "other")[0] != first[0].metadata["chunk_id"]
+    assert assign_chunk_ids([Document(page_content="c")], "notes.txt", "hash", start=2)[0].endswith("-2")
+
+
+def test_ingest_corpus_builds_one_merged_index(tmp_path):
+    write_corpus(tmp_path)
+    chunks, vectorstore, keyword_retriever, report = ingest_corpus(
+        str(tmp_path), HashingEmbeddings(dim=64), max_workers=2, embed_batch_size=2)
+    assert report["totals"]["files"] == 5
+    assert [os.path.basename(stats["file"]) for stats in report["failures"]] == ["broken.json"]
+    # the copy of pool.txt is folded into the first one instead of being embedded twice
+    assert report["dedup"]["exact_duplicates"] == 1
+    assert len(chunks) == vectorstore.index.ntotal == 3
+    assert len({chunk.metadata["chunk_id"] for chunk in chunks}) == 3
+    assert "pool" in vectorstore.similarity_search("rooftop pool hours", k=1)[0].page_content
+    assert "Breakfast" in keyword_retriever.invoke("vegan breakfast")[0].page_content
+    pool = next(chunk for chunk in chunks if "pool" in chunk.page_content)
+    assert len(vectorstore.docstore.search(pool.metadata["chunk_id"]).metadata["sources"]) == 2
+
+
+def test_ingest_corpus_without_dedup_keeps_every_chunk(tmp_path):
+    write_corpus(tmp_path)
+    chunks, vectorstore, _, report = ingest_corpus(str(tmp_path), HashingEmbeddings(dim=64), max_workers=1,
+                                                   dedup=False)
+    assert len(chunks) == vectorstore.index.ntotal == 4
+    assert "dedup" not in report
+
+
+@pytest.fixture
+def tracing():
+    tracer.reset()
+    tracer.enable()
+    yield tracer
+    tracer.disable()
+    tracer.reset()
+
+
+def test_streamed_file_has_parser_and_splitter_spans(tmp_path, tracing):
+    path = tmp_path / "rooms.csv"
+    path.write_text("room,floor\n" + "".join(f"{i},{i % 5}\n" for i in range(30)))
+    stats = CorpusIngestor(HashingEmbeddings(dim=64), embed_batch_size=4).ingest_stream(str(path))
+    summary = tracing.summary()
+    assert stats["error"] is None and stats["chunks"] > 0
+    assert summary["parser.parse"]["count"] == summary["splitter.split"]["count"] == 1
+    assert summary["splitter.split"]["chunks"] == stats["chunks"]
+    assert stats["parse_seconds"] >= 0 and stats["chunk_seconds"] >= 0
+
+
+def test_chunk_time_excludes_parsing_when_the_splitter_fails(tmp_path, monkeypatch):
+    def slow_blocks(self):
+        time.sleep(0.05)
+        yield Document(page_content=POOL)
+
+    def failing_chunking(self, documents):
+        next(iter(documents))
+        raise RuntimeError("splitter failed")
+
+    monkeypatch.setattr(TextFileParser, "iter_parse", slow_blocks)
+    monkeypatch.setattr(CharacterTextSplitting, "iter_chunking", failing_chunking)
+    path = tmp_path / "pool.txt"
+    path.write_text(POOL)
+    stats = CorpusIngestor(HashingEmbeddings(dim=64), splitting_type="character").ingest_stream(str(path))
+    assert stats["error"] == "RuntimeError: splitter failed"
+    # the failed pull still counts the parse time it contained, so subtracting it cannot go negative
+    assert stats["parse_seconds"] >= 0.05 and 0 <= stats["chunk_seconds"] < 0.05
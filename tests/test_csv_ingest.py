@@ -0,0 +1,82 @@
+import pandas as pd
+import pytest
+
+from FileParser.fileparser import CSVParser, FileParserFactory
+from RAG_System.corpus_ingest import CorpusIngestor
+from RAG_System.index_cache import VectorStoreCache
+from RAG_System.vector_store_maker import CSVRowGroupChunker, VectorStoreMakingFactory, render_rows
+import rag_pipeline
+from rag_pipeline import vector_store_creator_from_file
+from stubs import HashingEmbeddings
+
+CSV = "name,age,visits,zip,note\nAnn,31.5,3,01234,NA\nBob,,,98765,\nCy,40,7,00501,late check-out\n"
+
+
+@pytest.fixture
+def csv_path(tmp_path):
+    path = tmp_path / "guests.csv"
+    path.write_text(CSV)
+    return str(path)
+
+
+def chunk(path, csv_options=None):
+    content = FileParserFactory(file_type="csv", file_name=path, csv_options=csv_options).iter_parse()
+    return list(VectorStoreMakingFactory(document=content, file_extension="csv",
+                                         csv_options=csv_options).iter_splittext())
+
+
+def test_numeric_columns_can_be_formatted(csv_path):
+    documents = chunk(csv_path, {"row_template": "{name} is {age:.1f} ({visits} visits)"})
+    assert documents[0].page_content.split("\n") == ["Ann is 31.5 (3 visits)", "Bob is  ( visits)",
+                                                     "Cy is 40.0 (7 visits)"]
+
+
+def test_default_rendering_keeps_text_and_blanks_missing_values(csv_path):
+    rows = chunk(csv_path)[0].page_content.split("\n")
+    # an int column with a gap stays int, only empty cells are missing and "NA" stays text
+    assert rows[0] == "name: Ann, age: 31.5, visits: 3, zip: 1234, note: NA"
+    assert rows[1] == "name: Bob, age: , visits: , zip: 98765, note: "
+    assert chunk(csv_path, {"dtype": {"zip": str}})[0].page_content.split("\n")[2] == \
+        "name: Cy, age: 40.0, visits: 7, zip: 00501, note: late check-out"
+
+
+def test_rows_are_grouped_across_read_chunks(csv_path):
+    documents = chunk(csv_path, {"chunksize": 2, "rows_per_document": 2, "usecols": ["name"]})
+    assert [doc.page_content for doc in documents] == ["name: Ann\nname: Bob", "name: Cy"]
+    assert [(doc.metadata["first_row"], doc.metadata["last_row"]) for doc in documents] == [(0, 1), (2, 2)]
+    assert documents[0].metadata["source"] == csv_path
+
+
+def test_options_do_not_change_the_class_defaults(csv_path):
+    parser = CSVParser(csv_path, {"chunksize": 2, "row_template": "{name}"})
+    chunker = CSVRowGroupChunker(None, {"row_template": "{name}", "dtype": str})
+    assert parser.params == {**CSVParser.params, "chunksize": 2}
+    assert chunker.params == {**CSVRowGroupChunker.params, "row_template": "{name}"}
+    assert CSVParser.params["chunksize"] == 50000 and CSVRowGroupChunker.params["row_template"] is None
+
+
+def test_render_rows_with_conversion():
+    frame = pd.DataFrame({"name": ["Ann", None], "score": [0.25, 1.0]})
+    assert render_rows(frame, "{name!r}: {score:.0%}") == ["'Ann': 25%", ": 100%"]
+
+
+def test_ingest_stream_uses_the_csv_options(csv_path):
+    ingestor = CorpusIngestor(HashingEmbeddings(dim=64), dedup=False,
+                              csv_options={"row_template": "{name} {age:.1f}", "rows_per_document": 1})
+    stats = ingestor.ingest_stream(csv_path)
+    assert stats["error"] is None
+    assert [chunk.page_content for chunk in ingestor.chunks] == ["Ann 31.5", "Bob ", "Cy 40.0"]
+
+
+def test_csv_options_are_part_of_the_cache_key(csv_path, tmp_path, monkeypatch):
+    monkeypatch.setattr(rag_pipeline, "index_cache", VectorStoreCache(cache_dir=str(tmp_path / "cache")))
+    embeddings = HashingEmbeddings(dim=64)
+    plain, _ = vector_store_creator_from_file(csv_path, embeddings, dedup=False)
+    typed, _ = vector_store_creator_from_file(csv_path, embeddings, dedup=False,
+                                              csv_options={"dtype": {"zip": str}, "row_template": "{zip}"})
+    assert "zip: 1234" in plain[0].page_content
+    assert typed[0].page_content == "01234\n98765\n00501"
+    cached, _ = vector_store_creator_from_file(csv_path, embeddings, dedup=False,
+                                               csv_options={"dtype": {"zip": str}, "row_template": "{zip}"})
+    assert cached[0].page_content == typed[0].page_content
+    assert len(rag_pipeline.index_cache.entries()) == 2
@@ -0,0 +1,84 @@
+import faiss
+import numpy as np
+import pytest
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+
+from RAG_System.dense_index import (INDEX_MODES, build_index, convert_vectorstore, default_pq_m, index_memory_bytes,
+                                    resolve_params, set_search_params, training_sample, vectorstore_from_documents)
+from stubs import HashingEmbeddings, generate_sentences
+
+
+def clustered_vectors(count=4000, dim=32, clusters=20, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim)) * 4
+    return (centers[rng.integers(clusters, size=count)] + rng.normal(size=(count, dim))).astype(np.float32)
+
+
+def recall_at_k(index, vectors, queries, k=10):
+    exact = faiss.IndexFlatL2(vectors.shape[1])
+    exact.add(vectors)
+    _, truth = exact.search(queries, k)
+    _, found = index.search(queries, k)
+    return np.mean([len(set(a) & set(b)) / k for a, b in zip(truth, found)])
+
+
+@pytest.mark.parametrize("mode", INDEX_MODES)
+def test_every_mode_finds_the_nearest_neighbours(mode):
+    vectors = clustered_vectors()
+    # 16 sub-quantizers of 2 dims each, so PQ codes keep most of the distance information
+    index = build_index(vectors, mode=mode, nprobe=32, pq_m=16)
+    assert index.ntotal == len(vectors)
+    assert recall_at_k(index, vectors, vectors[:50]) >= (0.6 if mode == "ivf_pq" else 0.9)
+
+
+def test_compressed_modes_use_less_memory():
+    vectors = clustered_vectors()
+    flat = index_memory_bytes(build_index(vectors, mode="flat"))
+    assert index_memory_bytes(build_index(vectors, mode="ivf_sq8")) < flat / 2
+    assert index_memory_bytes(build_index(vectors, mode="ivf_pq")) < flat / 4
+
+
+def test_resolve_params():
+    params = resolve_params("ivf_pq", 10000, 768, nprobe=4, ef_search=None)
+    assert params["nprobe"] == 4 and params["ef_search"] == 64
+    assert params["nlist"] == 256 and params["pq_m"] == 96 and params["pq_bits"] == 8
+    assert resolve_params("ivf_pq", 100, 30)["pq_bits"] == 1
+    assert default_pq_m(30) == 3
+    with pytest.raises(ValueError):
+        resolve_params("ivf", 100, 8)
+    with pytest.raises(ValueError):
+        resolve_params("flat", 100, 8, probes=3)
+
+
+def test_training_sample_is_bounded_and_deterministic():
+    vectors = clustered_vectors(count=5000)
+    params = resolve_params("ivf_flat", len(vectors), vectors.shape[1], nlist=10)
+    sample = training_sample(vectors, "ivf_flat", params)
+    assert len(sample) == 640
+    assert np.array_equal(sample, training_sample(vectors, "ivf_flat", params))
+    assert len(training_sample(vectors[:100], "ivf_flat", params)) == 100
+
+
+def test_search_params_can_be_changed_after_build():
+    vectors = clustered_vectors(count=2000)
+    ivf = build_index(vectors, mode="ivf_flat", nprobe=2)
+    set_search_params(ivf, nprobe=7)
+    assert faiss.extract_index_ivf(ivf).nprobe == 7
+    hnsw = build_index(vectors, mode="hnsw")
+    set_search_params(hnsw, nprobe=7, ef_search=99)
+    assert hnsw.hnsw.efSearch == 99
+
+
+def test_vectorstore_modes_return_the_same_top_hit():
+    embeddings = HashingEmbeddings(dim=64)
+    documents = [Document(page_content=text, metadata={"chunk_id": f"c{i}"})
+                 for i, text in enumerate(generate_sentences(300))]
+    flat = FAISS.from_documents(documents, embeddings, ids=[doc.metadata["chunk_id"] for doc in documents])
+    hnsw = vectorstore_from_documents(documents, embeddings, mode="hnsw")
+    assert hnsw.index_to_docstore_id[5] == "c5"
+    query = documents[42].page_content
+    assert hnsw.similarity_search(query, k=1)[0].metadata["chunk_id"] == "c42"
+    converted = convert_vectorstore(flat, "ivf_flat", nlist=4, nprobe=4)
+    assert converted.similarity_search(query, k=1)[0].metadata["chunk_id"] == "c42"
+    assert convert_vectorstore(converted, "flat") is converted
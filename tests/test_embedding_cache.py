@@ -0,0 +1,79 @@
+import threading
+import time
+
+from RAG_System.embedding_cache import CachedEmbeddings, SQLiteVectorStore
+from stubs import HashingEmbeddings
+
+
+class CountingEmbeddings(HashingEmbeddings):
+    """
+    HashingEmbeddings that records every upstream batch.
+    """
+
+    def __init__(self, dim=8):
+        super().__init__(dim=dim)
+        self.batches = []
+        self.queries = []
+        self._lock = threading.Lock()
+
+    def embed_documents(self, texts):
+        with self._lock:
+            self.batches.append(list(texts))
+        return super().embed_documents(texts)
+
+    def embed_query(self, text):
+        self.queries.append(text)
+        return super().embed_query(text)
+
+
+def make(tmp_path, **kwargs):
+    upstream = CountingEmbeddings()
+    return upstream, CachedEmbeddings(upstream, store=SQLiteVectorStore(str(tmp_path / "vectors.sqlite")), **kwargs)
+
+
+def test_duplicates_are_embedded_once(tmp_path):
+    upstream, embeddings = make(tmp_path)
+    vectors = embeddings.embed_documents(["pool", "breakfast", "pool"])
+    assert upstream.batches == [["pool", "breakfast"]]
+    assert vectors[0] == vectors[2]
+    assert vectors[0] == upstream.embed_documents(["pool"])[0]
+
+
+def test_only_misses_go_upstream_in_batches(tmp_path):
+    upstream, embeddings = make(tmp_path, batch_size=2, max_concurrency=2)
+    embeddings.embed_documents(["a", "b"])
+    upstream.batches.clear()
+    embeddings.embed_documents(["a", "b", "c", "d", "e"])
+    assert sorted(map(tuple, upstream.batches)) == [("c", "d"), ("e",)]
+    assert (embeddings.hits, embeddings.misses) == (2, 5)
+
+
+def test_vectors_persist_across_instances(tmp_path):
+    _, embeddings = make(tmp_path)
+    expected = embeddings.embed_documents(["the pool opens at nine"])
+    embeddings.store.close()
+    upstream, embeddings = make(tmp_path)
+    assert embeddings.embed_documents(["the pool opens at nine"]) == expected
+    assert upstream.batches == []
+
+
+def test_queries_have_their_own_namespace(tmp_path):
+    upstream, embeddings = make(tmp_path)
+    embeddings.embed_documents(["pool"])
+    embeddings.embed_query("pool")
+    embeddings.embed_query("pool")
+    assert upstream.queries == ["pool"]
+
+
+def test_least_recently_used_vectors_are_evicted(tmp_path):
+    # four float32 values per vector: 16 bytes, so the store holds two
+    store = SQLiteVectorStore(str(tmp_path / "vectors.sqlite"), max_bytes=32)
+    store.put_many({"a": [1.0] * 4})
+    time.sleep(0.01)
+    store.put_many({"b": [2.0] * 4})
+    time.sleep(0.01)
+    assert list(store.get_many(["a"])) == ["a"]
+    time.sleep(0.01)
+    store.put_many({"c": [3.0] * 4})
+    assert sorted(store.get_many(["a", "b", "c"])) == ["a", "c"]
+    store.close()
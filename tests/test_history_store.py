@@ -0,0 +1,156 @@
+import threading
+import time
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage, message_to_dict
+from sqlalchemy import JSON, Column, Integer, MetaData, Table, Text, create_engine, func, insert, select
+
+from source.history_store import PooledHistoryStore
+
+
+@pytest.fixture
+def make_store(tmp_path):
+    stores = []
+
+    def make(**kwargs):
+        store = PooledHistoryStore(f"sqlite:///{tmp_path / 'history.db'}", **kwargs)
+        stores.append(store)
+        return store
+
+    yield make
+    for store in stores:
+        store.close()
+
+
+def stored_rows(store):
+    with store.engine.connect() as connection:
+        return connection.execute(select(func.count()).select_from(store.table)).scalar()
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def turn(i):
+    return [HumanMessage(content=f"question {i}"), AIMessage(content=f"answer {i}")]
+
+
+def test_messages_are_written_behind(make_store):
+    store = make_store(flush_interval=60, flush_size=100)
+    store.add_messages("s1", turn(0))
+    assert stored_rows(store) == 0
+    assert [message.content for message in store.get_messages("s1")] == ["question 0", "answer 0"]
+    assert stored_rows(store) == 2
+
+
+def test_writer_flushes_on_size_and_interval(make_store):
+    store = make_store(flush_interval=60, flush_size=4)
+    store.add_messages("s1", turn(0))
+    store.add_messages("s1", turn(1))
+    assert wait_for(lambda: stored_rows(store) == 4)
+    store = make_store(flush_interval=0.05, flush_size=100)
+    store.add_messages("s2", turn(0))
+    assert wait_for(lambda: stored_rows(store) == 6)
+
+
+def test_max_buffer_flushes_inline(make_store):
+    store = make_store(flush_interval=60, flush_size=100, max_buffer=2)
+    store.add_messages("s1", turn(0))
+    assert stored_rows(store) == 2
+
+
+def test_reads_are_served_from_the_cache(make_store, monkeypatch):
+    store = make_store(flush_interval=60)
+    store.add_messages("s1", turn(0))
+    store.get_messages("s1")
+    store.add_messages("s1", turn(1))
+    connects = []
+    connect = store.engine.connect
+    monkeypatch.setattr(store.engine, "connect", lambda: connects.append(1) or connect())
+    assert [message.content for message in store.get_messages("s1", last=2)] == ["question 1", "answer 1"]
+    assert len(store.get_messages("s1")) == 4
+    assert connects == []
+
+
+def test_failed_writes_back_off(make_store, monkeypatch):
+    store = make_store(flush_interval=0.01, max_retry_interval=0.2)
+    attempts = []
+    begin = store.engine.begin
+
+    def failing_begin():
+        attempts.append(time.monotonic())
+        raise RuntimeError("database is down")
+
+    monkeypatch.setattr(store.engine, "begin", failing_begin)
+    store.add_messages("s1", turn(0))
+    time.sleep(0.6)
+    # without the backoff the writer would retry every 10 ms
+    assert 2 <= len(attempts) <= 20
+    assert len(store._buffer) == 2
+    monkeypatch.setattr(store.engine, "begin", begin)
+    assert wait_for(lambda: stored_rows(store) == 2)
+
+
+def test_messages_added_during_a_read_are_not_lost(make_store, monkeypatch):
+    store = make_store(flush_interval=60)
+    store.add_messages("s1", turn(0))
+    store.flush()
+    reading, added = threading.Event(), threading.Event()
+    connect = store.engine.connect
+
+    def slow_connect():
+        connection = connect()
+        reading.set()
+        added.wait(5)
+        return connection
+
+    monkeypatch.setattr(store.engine, "connect", slow_connect)
+    reader = threading.Thread(target=store.get_messages, args=("s1",))
+    reader.start()
+    assert reading.wait(5)
+    store.add_messages("s1", turn(1))
+    added.set()
+    reader.join(5)
+    monkeypatch.setattr(store.engine, "connect", connect)
+    assert [message.content for message in store.get_messages("s1")][-2:] == ["question 1", "answer 1"]
+
+
+def test_clear_drops_buffered_and_stored_messages(make_store):
+    store = make_store(flush_interval=60)
+    store.add_messages("s1", turn(0))
+    store.flush()
+    store.add_messages("s1", turn(1))
+    store.add_messages("s2", turn(0))
+    store.set_summary("s1", "asked twice", 2)
+    store.clear("s1")
+    assert store.get_messages("s1") == []
+    assert store.get_summary("s1") == ("", 0)
+    assert len(store.get_messages("s2")) == 2
+    assert stored_rows(store) == 2
+
+
+def test_existing_json_message_column_is_reflected(make_store, tmp_path):
+    # the layout PostgresChatMessageHistory creates, with JSON in place of JSONB
+    engine = create_engine(f"sqlite:///{tmp_path / 'history.db'}")
+    table = Table("message_store", MetaData(), Column("id", Integer, primary_key=True),
+                  Column("session_id", Text), Column("message", JSON))
+    table.metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(insert(table).values(session_id="s", message=message_to_dict(HumanMessage(content="hi"))))
+    engine.dispose()
+
+    store = make_store(flush_interval=60)
+    # rows of a JSON column come back as dicts, not as text to json.loads
+    assert isinstance(store.table.c.message.type, JSON)
+    store.add_messages("s", [AIMessage(content="hello")])
+    store.flush()
+    store._cache.clear()
+    assert [message.content for message in store.get_messages("s")] == ["hi", "hello"]
+    with store.engine.connect() as connection:
+        assert connection.execute(select(table.c.message).where(table.c.id == 2)).scalar()["data"]["content"] == "hello"
+
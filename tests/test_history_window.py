@@ -0,0 +1,108 @@
+import pytest
+from langchain_core.chat_history import InMemoryChatMessageHistory
+
+from source import history_window
+from source.history_store import PooledChatMessageHistory, PooledHistoryStore
+from source.history_window import HistoryWindow
+
+
+class InMemoryMemory:
+    """
+    The part of LangChainMemory HistoryWindow uses, over one history per session.
+    """
+
+    def __init__(self, histories, session_id):
+        self.histories = histories
+        self.session_id = session_id
+
+    def get_history(self):
+        return self.histories.setdefault(self.session_id, InMemoryChatMessageHistory())
+
+    def clear_history(self):
+        self.get_history().clear()
+
+
+class PooledMemory:
+    def __init__(self, store, session_id):
+        self.store = store
+        self.session_id = session_id
+
+    def get_history(self):
+        return PooledChatMessageHistory(self.store, self.session_id)
+
+    def clear_history(self):
+        self.get_history().clear()
+
+
+@pytest.fixture(autouse=True)
+def offline_encoding(monkeypatch, byte_encoding):
+    monkeypatch.setattr(history_window, "get_encoding", lambda model=None: byte_encoding)
+
+
+def make_window(histories=None, **kwargs):
+    histories = {} if histories is None else histories
+    return HistoryWindow(lambda session_id: InMemoryMemory(histories, session_id), **kwargs)
+
+
+def test_short_history_is_rendered_verbatim():
+    window = make_window()
+    window.add_turn("s", "When does the pool open?", "At nine.")
+    assert window.render("s") == "Human: When does the pool open?\nAI: At nine."
+    assert window.prompt_inputs("s", "And the spa?")["input"] == "And the spa?"
+
+
+def test_old_turns_are_summarized_within_the_budgets():
+    summaries = []
+
+    def summarizer(summary, new_lines):
+        summaries.append(new_lines)
+        return f"{summary} [{len(new_lines.splitlines())} lines]".strip()
+
+    window = make_window(budget_tokens=120, summary_budget_tokens=40, summarizer=summarizer)
+    for i in range(20):
+        window.add_turn("s", f"question number {i}", f"answer number {i}")
+    rendered = window.render("s")
+    assert rendered.startswith("Summary of the earlier conversation: ")
+    assert rendered.endswith("AI: answer number 19")
+    assert window.last_prompt_tokens["s"] <= 120 + 40
+    # only the lines evicted by each add are summarized, never the whole conversation again
+    assert sum(len(lines.splitlines()) for lines in summaries) == window._windows["s"].covered
+    assert all(len(lines.splitlines()) <= 2 for lines in summaries)
+
+
+def test_running_total_matches_a_recount():
+    window = make_window(budget_tokens=100)
+    for i in range(10):
+        window.add_turn("s", f"question {i}", "a longer answer " * (i % 3 + 1))
+    session = window._windows["s"]
+    assert session.tokens == sum(window.count_tokens(line) + 1 for line, _ in session.messages)
+    assert session.tokens <= 100
+
+
+def test_window_is_rebuilt_from_an_existing_history():
+    histories = {}
+    make_window(histories).add_turn("s", "When does the pool open?", "At nine.")
+    assert make_window(histories).render("s") == "Human: When does the pool open?\nAI: At nine."
+
+
+def test_summary_survives_a_restart_with_the_pooled_store(tmp_path):
+    store = PooledHistoryStore(f"sqlite:///{tmp_path / 'history.db'}", flush_interval=60)
+    try:
+        window = HistoryWindow(lambda session_id: PooledMemory(store, session_id), budget_tokens=60)
+        for i in range(6):
+            window.add_turn("s", f"question {i}", f"answer {i}")
+        rendered = window.render("s")
+        summary, covered = store.get_summary("s")
+        assert covered > 0 and summary
+        restarted = HistoryWindow(lambda session_id: PooledMemory(store, session_id), budget_tokens=60)
+        assert restarted.render("s") == rendered
+    finally:
+        store.close()
+
+
+def test_clear_forgets_the_session():
+    window = make_window()
+    window.add_turn("s", "hi", "hello")
+    window.clear("s")
+    assert window.render("s") == ""
+
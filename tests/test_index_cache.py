@@ -0,0 +1,88 @@
+import os
+
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+
+from RAG_System.index_cache import VectorStoreCache, embedding_model_name, file_hash
+from stubs import HashingEmbeddings
+
+SIGNATURE = {"type": "recursive", "chunk_size": 1000, "chunk_overlap": 200}
+
+
+def build(texts):
+    chunks = [Document(page_content=text, metadata={"chunk_id": f"chunk-{i}"}) for i, text in enumerate(texts)]
+    return chunks, FAISS.from_documents(chunks, HashingEmbeddings(dim=32), ids=[f"chunk-{i}" for i in range(len(texts))])
+
+
+def test_file_hash_follows_the_content(tmp_path):
+    path = tmp_path / "notes.txt"
+    path.write_text("first version")
+    first = file_hash(str(path), block_size=4)
+    assert file_hash(str(path)) == first
+    path.write_text("second version")
+    assert file_hash(str(path)) != first
+
+
+def test_key_changes_with_file_splitter_and_model():
+    cache = VectorStoreCache()
+    key = cache.make_key("hash", SIGNATURE, "model")
+    assert cache.make_key("hash", dict(reversed(list(SIGNATURE.items()))), "model") == key
+    assert cache.make_key("other", SIGNATURE, "model") != key
+    assert cache.make_key("hash", {**SIGNATURE, "chunk_size": 500}, "model") != key
+    assert cache.make_key("hash", SIGNATURE, "other-model") != key
+    assert embedding_model_name(HashingEmbeddings()) == "stub-hashing"
+
+
+def test_miss_then_hit(tmp_path):
+    cache = VectorStoreCache(cache_dir=str(tmp_path))
+    key = cache.make_key("hash", SIGNATURE, "stub-hashing")
+    assert cache.load(key, HashingEmbeddings(dim=32)) is None
+    chunks, vectorstore = build(["the pool opens at nine", "breakfast is served from seven"])
+    cache.save(key, chunks, vectorstore)
+    cached_chunks, cached_store = cache.load(key, HashingEmbeddings(dim=32))
+    assert [chunk.page_content for chunk in cached_chunks] == [chunk.page_content for chunk in chunks]
+    assert cached_store.similarity_search("pool", k=1)[0].page_content == "the pool opens at nine"
+    # the chunks are the index's own documents, so they are stored once
+    assert cache.entries()[key]["chunks_in_index"]
+
+
+def test_unmapped_load_returns_updatable_lists(tmp_path):
+    cache = VectorStoreCache(cache_dir=str(tmp_path), mmap=False)
+    key = cache.make_key("hash", SIGNATURE, "stub-hashing")
+    chunks, vectorstore = build(["the pool opens at nine", "breakfast is served from seven"])
+    cache.save(key, chunks[:1], vectorstore)
+    cached_chunks, cached_store = cache.load(key, HashingEmbeddings(dim=32))
+    assert isinstance(cached_chunks, list) and len(cached_chunks) == 1
+    cached_store.delete(["chunk-1"])
+    assert cached_store.index.ntotal == 1
+
+
+def test_new_file_version_evicts_the_old_one(tmp_path):
+    cache = VectorStoreCache(cache_dir=str(tmp_path))
+    source = str(tmp_path / "notes.txt")
+    old_key = cache.make_key("old", SIGNATURE, "stub-hashing")
+    new_key = cache.make_key("new", SIGNATURE, "stub-hashing")
+    cache.save(old_key, *build(["old text"]), source=source, content_hash="old")
+    cache.save(new_key, *build(["new text"]), source=source, content_hash="new")
+    assert list(cache.entries()) == [new_key]
+
+
+def test_least_recently_used_entries_are_dropped(tmp_path):
+    cache = VectorStoreCache(cache_dir=str(tmp_path), max_entries=2)
+    keys = [cache.make_key(str(i), SIGNATURE, "stub-hashing") for i in range(3)]
+    cache.save(keys[0], *build(["zero"]))
+    cache.save(keys[1], *build(["one"]))
+    meta = cache.entries()[keys[1]]
+    meta["last_used"] -= 60
+    cache._write_meta(keys[1], meta)
+    cache.save(keys[2], *build(["two"]))
+    assert sorted(cache.entries()) == sorted([keys[0], keys[2]])
+
+
+def test_unreadable_entry_is_evicted(tmp_path):
+    cache = VectorStoreCache(cache_dir=str(tmp_path))
+    key = cache.make_key("hash", SIGNATURE, "stub-hashing")
+    cache.save(key, *build(["some text"]))
+    os.remove(os.path.join(str(tmp_path), key, VectorStoreCache.INDEX_DIR, "index.faiss"))
+    assert cache.load(key, HashingEmbeddings(dim=32)) is None
+    assert cache.entries() == {}
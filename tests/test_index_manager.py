@@ -0,0 +1,103 @@
+import pytest
+from langchain_core.documents import Document
+
+from RAG_System.corpus_ingest import ingest_corpus
+from RAG_System.index_manager import IndexManager
+from RAG_System.keyword_index import IncrementalBM25Retriever
+from stubs import HashingEmbeddings
+
+POOL = "The rooftop pool opens at nine in the morning."
+BREAKFAST = "Breakfast is served from seven in the lobby restaurant."
+PARKING = "Parking in the garage costs ten dollars a night."
+
+
+def names(retriever):
+    return sorted(doc.page_content for doc in retriever.documents())
+
+
+def test_incremental_bm25_add_replace_delete():
+    retriever = IncrementalBM25Retriever.from_documents(
+        [Document(page_content=POOL), Document(page_content=BREAKFAST)], ids=["pool", "breakfast"])
+    assert retriever.invoke("pool")[0].page_content == POOL
+    retriever.add_documents([Document(page_content=PARKING)], ids=["pool"])
+    assert names(retriever) == sorted([BREAKFAST, PARKING])
+    assert retriever.invoke("pool") == []
+    retriever.delete(["breakfast", "missing"])
+    assert names(retriever) == [PARKING]
+    assert retriever.total_length == sum(retriever.doc_lengths.values())
+    assert set(retriever.postings) == set(retriever.preprocess_func(PARKING))
+
+
+def test_incremental_bm25_generated_ids_do_not_replace_live_chunks():
+    retriever = IncrementalBM25Retriever.from_documents(
+        [Document(page_content=text) for text in (POOL, BREAKFAST, PARKING)])
+    retriever.delete(["0"])
+    new_ids = retriever.add_documents([Document(page_content="Late checkout is at one.")])
+    assert new_ids[0] not in {"1", "2"}
+    assert len(retriever.documents()) == 3
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    folder = tmp_path / "corpus"
+    folder.mkdir()
+    (folder / "pool.txt").write_text(POOL)
+    (folder / "breakfast.txt").write_text(BREAKFAST)
+    return folder
+
+
+def test_upsert_and_delete_touch_only_that_file(corpus):
+    manager = IndexManager(HashingEmbeddings(dim=64))
+    assert manager.sync_folder(str(corpus))["added"] == sorted(str(path) for path in corpus.iterdir())
+    version = manager.corpus_version()
+    assert manager.upsert_file(str(corpus / "pool.txt")) == "unchanged"
+    assert manager.corpus_version() == version
+
+    (corpus / "pool.txt").write_text(PARKING)
+    assert manager.upsert_file(str(corpus / "pool.txt")) == "replaced"
+    assert manager.corpus_version() != version
+    assert names(manager) == sorted([BREAKFAST, PARKING])
+    assert manager.vectorstore.index.ntotal == 2
+    assert manager.keyword_retriever.invoke("pool") == []
+
+    (corpus / "breakfast.txt").unlink()
+    assert manager.sync_folder(str(corpus))["deleted"] == [str(corpus / "breakfast.txt")]
+    assert names(manager) == [PARKING]
+    assert manager.vectorstore.similarity_search("parking", k=5)[0].page_content == PARKING
+    assert manager.delete_file(str(corpus / "breakfast.txt")) is False
+
+
+def test_failed_files_are_reported(corpus):
+    (corpus / "broken.json").write_text('{"unterminated": ')
+    manager = IndexManager(HashingEmbeddings(dim=64))
+    changes = manager.sync_folder(str(corpus))
+    assert changes["failed"] == [str(corpus / "broken.json")]
+    assert len(changes["added"]) == 2
+
+
+def test_save_and_load_keep_updating(corpus, tmp_path):
+    manager = IndexManager(HashingEmbeddings(dim=64))
+    manager.sync_folder(str(corpus))
+    manager.save(str(tmp_path / "index"))
+    loaded = IndexManager.load(str(tmp_path / "index"), HashingEmbeddings(dim=64))
+    assert loaded.corpus_version() == manager.corpus_version()
+    (corpus / "parking.txt").write_text(PARKING)
+    assert loaded.sync_folder(str(corpus))["added"] == [str(corpus / "parking.txt")]
+    assert names(loaded) == sorted([POOL, BREAKFAST, PARKING])
+    assert loaded.vectorstore.index.ntotal == 3
+
+
+def test_from_chunks_adopts_an_ingested_corpus(corpus):
+    chunks, vectorstore, _, _ = ingest_corpus(str(corpus), HashingEmbeddings(dim=64), max_workers=1, dedup=False)
+    manager = IndexManager.from_chunks(HashingEmbeddings(dim=64), vectorstore, chunks)
+    assert manager.upsert_file(str(corpus / "pool.txt")) == "unchanged"
+    assert manager.delete_file(str(corpus / "pool.txt"))
+    assert names(manager) == [BREAKFAST]
+    assert manager.vectorstore.index.ntotal == 1
+
+
+def test_from_chunks_rejects_deduplicated_chunks(corpus):
+    (corpus / "copy.txt").write_text(POOL)
+    chunks, vectorstore, _, _ = ingest_corpus(str(corpus), HashingEmbeddings(dim=64), max_workers=1)
+    with pytest.raises(ValueError):
+        IndexManager.from_chunks(HashingEmbeddings(dim=64), vectorstore, chunks)
@@ -0,0 +1,94 @@
+import asyncio
+import json
+
+from langchain_core.runnables import RunnableLambda
+
+import rag_pipeline
+from source.intent_classifier import IntentClassifier, LabelLogger, canonical_label, load_labeled, local_first_chain
+
+TEXTS = [
+    "Can you book me an appointment for tomorrow?",
+    "I want to schedule a meeting with the doctor",
+    "Please call me to set up a booking",
+    "Reserve a slot for next Monday",
+    "What are the opening hours of the pool?",
+    "How much does the spa cost?",
+    "Is breakfast included in the price?",
+    "Where can I park my car?",
+] * 4
+LABELS = (["Appointment"] * 4 + ["Normal"] * 4) * 4
+
+
+def trained(threshold=0.9):
+    return IntentClassifier(n_features=1 << 12, confidence_threshold=threshold).fit(TEXTS, LABELS, epochs=40)
+
+
+class CountingChain:
+    def __init__(self, label):
+        self.label = label
+        self.calls = 0
+
+    def runnable(self):
+        def answer(inputs):
+            self.calls += 1
+            return self.label
+        return RunnableLambda(answer)
+
+
+def test_canonical_label():
+    assert canonical_label(" appointment.") == "Appointment"
+    assert canonical_label("Normal query") == "Normal"
+    assert canonical_label("maybe") is None
+
+
+def test_fit_predicts_training_labels():
+    classifier = trained()
+    assert classifier.predict("Can you book me an appointment for tomorrow?")[0] == "Appointment"
+    assert classifier.predict("How much does the spa cost?")[0] == "Normal"
+
+
+def test_confident_decision_skips_the_llm():
+    llm = CountingChain("Normal")
+    chain = local_first_chain(trained(threshold=0.5), llm.runnable())
+    assert chain.invoke({"input": "Please book me an appointment"}) == "Appointment"
+    assert llm.calls == 0
+
+
+def test_unsure_classifier_falls_back_to_the_llm():
+    llm = CountingChain("Appointment")
+    classifier = trained(threshold=1.01)
+    chain = local_first_chain(classifier, llm.runnable())
+    assert chain.invoke({"input": "Please book me an appointment"}) == "Appointment"
+    assert asyncio.run(chain.ainvoke({"input": "Where can I park?"})) == "Appointment"
+    assert llm.calls == 2
+    assert classifier.stats()["llm_fallbacks"] == 2
+
+
+def test_fallback_labels_are_logged_only_with_a_logger(tmp_path):
+    path = tmp_path / "labels.jsonl"
+    local_first_chain(None, CountingChain("Normal").runnable()).invoke({"input": "Where can I park?"})
+    assert not path.exists()
+    chain = local_first_chain(None, CountingChain("appointment").runnable(), label_logger=LabelLogger(str(path)))
+    chain.invoke({"input": "Call me tomorrow"})
+    assert [json.loads(line) for line in path.read_text().splitlines()] == [
+        {"text": "Call me tomorrow", "label": "Appointment"}]
+    assert load_labeled(str(path)) == (["Call me tomorrow"], ["Appointment"])
+
+
+def test_pipeline_chain_logs_nothing_by_default(monkeypatch):
+    created = []
+    monkeypatch.setattr(rag_pipeline, "LLM_TYPE", "fake")
+    monkeypatch.setattr(rag_pipeline, "LabelLogger", lambda path: created.append(path))
+    chain = rag_pipeline.get_classification_llm_chain("fake", None, intent_model_path="")
+    assert chain.invoke({"input": "Can you book me an appointment?"}) == "Appointment"
+    assert created == []
+
+
+def test_save_and_load_round_trip(tmp_path):
+    classifier = trained()
+    path = str(tmp_path / "model.npz")
+    classifier.save(path)
+    loaded = IntentClassifier.load(path, confidence_threshold=0.7)
+    assert loaded.confidence_threshold == 0.7
+    text = "I want to schedule a meeting"
+    assert abs(loaded.predict_proba(text) - classifier.predict_proba(text)) < 1e-5
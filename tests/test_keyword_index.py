@@ -0,0 +1,149 @@
+import random
+
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+
+from RAG_System.keyword_index import CompactBM25Retriever, IncrementalBM25Retriever
+
+TEXTS = {
+    "a": "the hotel has a rooftop pool",
+    "b": "breakfast is served from seven",
+    "c": "the pool opens at nine",
+    "d": "parking costs ten dollars a night",
+}
+WORDS = ["pool", "breakfast", "parking", "night", "room", "view", "spa", "bar", "gym", "lobby", "the", "a"]
+
+
+def docs(*names):
+    return [Document(page_content=TEXTS[name], metadata={"name": name}) for name in names]
+
+
+def names(retriever):
+    return sorted(doc.metadata["name"] for doc in retriever.documents())
+
+
+def hits(retriever, query):
+    return [doc.metadata["name"] for doc in retriever.invoke(query)]
+
+
+def compact_scores(retriever, query):
+    positions, scores, delta_scores = retriever.score(query)
+    merged = {retriever.chunk_ids[position]: float(score) for position, score in zip(positions, scores)}
+    merged.update(delta_scores)
+    return merged
+
+
+def random_corpus(count, seed=0):
+    rng = random.Random(seed)
+    return {str(i): Document(page_content=" ".join(rng.choices(WORDS, k=rng.randint(3, 12))))
+            for i in range(count)}
+
+
+def test_vectorized_scores_match_the_reference_bm25():
+    corpus = random_corpus(200)
+    compact = CompactBM25Retriever.from_documents(list(corpus.values()), ids=list(corpus), compact_ratio=10)
+    reference = IncrementalBM25Retriever.from_documents(list(corpus.values()), ids=list(corpus))
+    # updates land in the delta segment and the deletion mask
+    extra = random_corpus(20, seed=1)
+    for retriever in (compact, reference):
+        retriever.delete([str(i) for i in range(0, 200, 7)])
+        retriever.add_documents(list(extra.values()), ids=[f"new-{i}" for i in extra])
+    assert compact.delta.docs
+    for query in ("pool", "room with a view", "gym spa bar", "unknown words"):
+        expected = reference.score(query)
+        found = compact_scores(compact, query)
+        assert found.keys() == expected.keys()
+        assert np.allclose([found[doc_id] for doc_id in expected], list(expected.values()), rtol=1e-5)
+
+
+def test_add_and_delete():
+    retriever = CompactBM25Retriever.from_documents(docs("a", "b"), ids=["a", "b"])
+    assert retriever.add_documents(docs("c"), ids=["c"]) == ["c"]
+    assert sorted(hits(retriever, "pool")) == ["a", "c"]
+    retriever.delete(["a"])
+    assert hits(retriever, "pool") == ["c"]
+    assert names(retriever) == ["b", "c"]
+    retriever.delete(["missing"])
+    assert names(retriever) == ["b", "c"]
+
+
+def test_add_replaces_same_id():
+    retriever = CompactBM25Retriever.from_documents(docs("a", "b"), ids=["a", "b"])
+    retriever.add_documents(docs("d"), ids=["a"])
+    assert names(retriever) == ["b", "d"]
+    assert retriever.invoke("pool") == []
+
+
+def test_ids_default_to_chunk_id_metadata():
+    documents = [Document(page_content=TEXTS["a"], metadata={"name": "a", "chunk_id": "file-0"})]
+    retriever = CompactBM25Retriever.from_documents(documents)
+    assert retriever.chunk_ids == ["file-0"]
+    retriever.delete(["file-0"])
+    assert retriever.documents() == []
+
+
+def test_generated_ids_do_not_replace_live_chunks():
+    retriever = CompactBM25Retriever.from_documents(docs("a", "b", "c"))
+    retriever.delete(["0"])
+    new_ids = retriever.add_documents(docs("d"))
+    assert new_ids[0] not in {"1", "2"}
+    assert names(retriever) == ["b", "c", "d"]
+
+
+def test_compact_scores_match_a_fresh_index():
+    retriever = CompactBM25Retriever.from_documents(docs("a", "b", "c"), ids=["a", "b", "c"], compact_ratio=10)
+    retriever.delete(["b"])
+    retriever.add_documents(docs("d"), ids=["d"])
+    fresh = IncrementalBM25Retriever.from_documents(docs("a", "c", "d"), ids=["a", "c", "d"])
+    for query in ("pool", "the night", "breakfast"):
+        expected = hits(fresh, query)
+        assert hits(retriever, query) == expected
+        retriever.compact()
+        assert hits(retriever, query) == expected
+    assert names(retriever) == ["a", "c", "d"]
+    assert not retriever.delta.docs
+
+
+def test_delta_is_compacted_once_it_outgrows_the_ratio():
+    retriever = CompactBM25Retriever.from_documents(docs("a", "b", "c", "d"), ids=list("abcd"), compact_ratio=0.5)
+    retriever.add_documents(docs("a"), ids=["a2"])
+    assert list(retriever.delta.docs) == ["a2"]
+    retriever.add_documents(docs("c"), ids=["c2"])
+    retriever.add_documents(docs("d"), ids=["d2"])
+    assert not retriever.delta.docs
+    assert len(retriever.chunk_ids) == 7
+
+
+def test_top_k():
+    corpus = random_corpus(50)
+    retriever = CompactBM25Retriever.from_documents(list(corpus.values()), ids=list(corpus), k=3)
+    scores = compact_scores(retriever, "pool view")
+    best = sorted(scores, key=scores.get, reverse=True)[:3]
+    assert [doc.page_content for doc in retriever.invoke("pool view")] == [corpus[doc_id].page_content for doc_id in best]
+
+
+@pytest.mark.parametrize("mmap", [True, False])
+def test_save_and_load(tmp_path, mmap):
+    retriever = CompactBM25Retriever.from_documents(docs("a", "b", "c"), ids=["a", "b", "c"])
+    retriever.add_documents(docs("d"), ids=["d"])
+    retriever.save(str(tmp_path))
+    loaded = CompactBM25Retriever.load(str(tmp_path), mmap=mmap)
+    assert isinstance(loaded.postings_docs, np.memmap) == mmap
+    for query in ("pool", "the night", "breakfast"):
+        assert hits(loaded, query) == hits(retriever, query)
+    loaded.delete(["a"])
+    loaded.add_documents(docs("a"), ids=["a"])
+    assert names(loaded) == ["a", "b", "c", "d"]
+
+
+def test_save_and_load_keep_next_id(tmp_path):
+    retriever = CompactBM25Retriever.from_documents(docs("a", "b", "c"))
+    retriever.delete(["2"])
+    retriever.save(str(tmp_path))
+    loaded = CompactBM25Retriever.load(str(tmp_path))
+    assert loaded.next_id == retriever.next_id
+    assert names(loaded) == ["a", "b"]
+    loaded.add_documents(docs("d"))
+    assert names(loaded) == ["a", "b", "d"]
+    assert hits(loaded, "pool") == ["a"]
@@ -0,0 +1,81 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from source import chain
+from source.chain import ClientRegistry, FakeChatModel, LLMFactory, fake_response, get_http_clients
+
+
+class CountingProvider(chain.LLM):
+    built = 0
+
+    def __init__(self, api_key=None):
+        self.api_key = api_key
+
+    def get_llm(self, **kwargs):
+        type(self).built += 1
+        time.sleep(0.01)
+        return object()
+
+
+@pytest.fixture
+def counting(monkeypatch):
+    monkeypatch.setitem(chain.PROVIDERS, "counting", CountingProvider)
+    monkeypatch.setattr(CountingProvider, "built", 0)
+    return CountingProvider
+
+
+def test_clients_are_cached_per_key(counting):
+    registry = ClientRegistry()
+    client = registry.get("counting", "key", "model", temperature=0.1)
+    assert registry.get("counting", "key", "model", temperature=0.1) is client
+    assert registry.get("counting", "key", "model", temperature=0.5) is not client
+    assert registry.get("counting", "other key", "model", temperature=0.1) is not client
+    assert registry.get("counting", "key", "model", temperature=0.1, streaming=True) is not client
+    assert counting.built == len(registry) == 4
+    registry.clear()
+    assert len(registry) == 0
+
+
+def test_concurrent_first_use_builds_one_client(counting):
+    registry = ClientRegistry()
+    clients = []
+    threads = [threading.Thread(target=lambda: clients.append(registry.get("counting", None, "model")))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert counting.built == 1
+    assert all(client is clients[0] for client in clients)
+
+
+def test_unknown_provider():
+    with pytest.raises(ValueError):
+        ClientRegistry().get("nope", None, "model")
+
+
+def test_factory_shares_the_registry_clients():
+    first = LLMFactory("fake", None).get_llm(temperature=0.1, model="fake", streaming=True)
+    assert isinstance(first, FakeChatModel)
+    assert LLMFactory("fake", None).get_llm(temperature=0.1, model="fake", streaming=True) is first
+
+
+def test_http_pool_is_shared_and_kept_per_event_loop():
+    sync_client, async_client = get_http_clients()
+    assert get_http_clients() == (sync_client, async_client)
+
+    async def loop_client():
+        return async_client._loop_client()
+
+    first, second = asyncio.run(loop_client()), asyncio.run(loop_client())
+    assert first is not second
+
+
+def test_fake_response():
+    prompt = "Answer Normal or Appointment.\nHuman: can I book a table?"
+    assert fake_response(prompt) == "Appointment"
+    assert fake_response("Normal or Appointment? Human: when is breakfast?") == "Normal"
+    assert fake_response("Human: when is breakfast?").startswith("Here is what I found about **when is breakfast?**")
@@ -0,0 +1,90 @@
+import pickle
+
+import pytest
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+
+from RAG_System.mmap_store import (IndexPositions, MmapDocstore, MmapDocuments, ReadOnlyStoreError,
+                                   load_mmap_vectorstore, save_mmap_vectorstore, write_documents)
+from stubs import HashingEmbeddings, generate_sentences
+
+
+@pytest.fixture
+def embeddings():
+    return HashingEmbeddings(dim=64)
+
+
+@pytest.fixture
+def saved_store(tmp_path, embeddings):
+    documents = [Document(page_content=text, metadata={"chunk_id": f"c{i}", "page": i})
+                 for i, text in enumerate(generate_sentences(200))]
+    vectorstore = FAISS.from_documents(documents, embeddings, ids=[doc.metadata["chunk_id"] for doc in documents])
+    folder = str(tmp_path / "store")
+    save_mmap_vectorstore(vectorstore, folder)
+    return folder, vectorstore, documents
+
+
+@pytest.mark.parametrize("mmap", [True, False])
+def test_loaded_store_returns_the_same_hits(saved_store, embeddings, mmap):
+    folder, original, documents = saved_store
+    loaded = load_mmap_vectorstore(folder, embeddings, mmap=mmap)
+    assert isinstance(loaded.docstore, MmapDocstore if mmap else InMemoryDocstore)
+    assert loaded.index.ntotal == len(documents)
+    for query in (documents[7].page_content, documents[150].page_content, "pool opening hours"):
+        expected = original.similarity_search_with_score(query, k=5)
+        found = loaded.similarity_search_with_score(query, k=5)
+        assert [(doc.page_content, doc.metadata) for doc, _ in found] == \
+               [(doc.page_content, doc.metadata) for doc, _ in expected]
+        assert [score for _, score in found] == pytest.approx([score for _, score in expected])
+
+
+def test_mmap_store_is_read_only(saved_store, embeddings):
+    folder, _, _ = saved_store
+    loaded = load_mmap_vectorstore(folder, embeddings)
+    with pytest.raises(ReadOnlyStoreError):
+        loaded.docstore.add({"new": Document(page_content="new")})
+    with pytest.raises(ReadOnlyStoreError):
+        loaded.docstore.delete(["c1"])
+    updatable = load_mmap_vectorstore(folder, embeddings, mmap=False)
+    updatable.add_texts(["The rooftop bar opens at six."], ids=["new"])
+    assert updatable.docstore.search("new").page_content == "The rooftop bar opens at six."
+
+
+def test_docstore_lookups(saved_store, embeddings):
+    folder, _, documents = saved_store
+    docstore = load_mmap_vectorstore(folder, embeddings).docstore
+    assert docstore.search(3).page_content == documents[3].page_content
+    assert docstore.search("c42").metadata == {"chunk_id": "c42", "page": 42}
+    assert docstore.search("missing") == "ID missing not found."
+    assert docstore.search(len(documents)) == f"ID {len(documents)} not found."
+
+
+def test_mmap_documents(tmp_path):
+    documents = [Document(page_content="Café opens at nine", metadata={"tags": ["food"]}),
+                 Document(page_content="", metadata={}),
+                 Document(page_content="Parking is free", metadata={"chunk_id": "parking"})]
+    assert write_documents(str(tmp_path), documents) == 3
+    stored = MmapDocuments(str(tmp_path))
+    assert len(stored) == 3
+    assert stored[0].page_content == "Café opens at nine" and stored[0].metadata == {"tags": ["food"]}
+    assert stored[-1].id == "parking" and stored[1].id == "1"
+    assert [doc.page_content for doc in stored[1:]] == ["", "Parking is free"]
+    assert stored.position("parking") == 2 and stored.position("nope") is None
+    with pytest.raises(IndexError):
+        stored[3]
+    copy = pickle.loads(pickle.dumps(stored))
+    assert copy.folder == stored.folder and list(copy) == list(stored)
+
+
+def test_empty_documents(tmp_path):
+    assert write_documents(str(tmp_path), []) == 0
+    assert len(MmapDocuments(str(tmp_path))) == 0
+
+
+def test_index_positions():
+    positions = IndexPositions(3)
+    assert dict(positions) == {0: 0, 1: 1, 2: 2}
+    assert len(positions) == 3 and positions[2] == 2
+    with pytest.raises(KeyError):
+        positions[3]
@@ -0,0 +1,62 @@
+import asyncio
+
+import pytest
+
+import conversationa_form
+from conversationa_form import NameExtractionBatcher, UserInfoCollectorWithToolAndAgent
+
+
+@pytest.fixture
+def batches(monkeypatch):
+    calls = []
+
+    def extract_person_names(texts, batch_size=64):
+        calls.append(list(texts))
+        return [text.split(":")[1] if text.startswith("name:") else None for text in texts]
+
+    monkeypatch.setattr(conversationa_form, "extract_person_names", extract_person_names)
+    return calls
+
+
+def test_concurrent_requests_share_one_batch(batches):
+    async def main():
+        batcher = NameExtractionBatcher(max_batch=64, max_delay=0.2)
+        return await asyncio.gather(*(batcher.extract(text) for text in ["name:Ann", "no name", "name:Bob"]))
+
+    assert asyncio.run(main()) == ["Ann", None, "Bob"]
+    assert batches == [["name:Ann", "no name", "name:Bob"]]
+
+
+def test_full_batch_is_flushed_at_once(batches):
+    async def main():
+        batcher = NameExtractionBatcher(max_batch=2, max_delay=60)
+        return await asyncio.wait_for(
+            asyncio.gather(*(batcher.extract(f"name:{name}") for name in ["Ann", "Bob", "Cy", "Di"])), timeout=2)
+
+    assert asyncio.run(main()) == ["Ann", "Bob", "Cy", "Di"]
+    assert batches == [["name:Ann", "name:Bob"], ["name:Cy", "name:Di"]]
+
+
+def test_errors_reach_every_caller_of_the_batch(monkeypatch):
+    def broken(texts, batch_size=64):
+        raise OSError("model not installed")
+
+    monkeypatch.setattr(conversationa_form, "extract_person_names", broken)
+
+    async def main():
+        batcher = NameExtractionBatcher()
+        return await asyncio.gather(batcher.extract("a"), batcher.extract("b"), return_exceptions=True)
+
+    assert [str(error) for error in asyncio.run(main())] == ["model not installed"] * 2
+
+
+def test_forms_look_up_names_through_the_batcher(batches):
+    async def main():
+        batcher = NameExtractionBatcher(max_delay=0.2)
+        forms = [UserInfoCollectorWithToolAndAgent(api_key=None, model="fake", provider="fake", name_batcher=batcher)
+                 for _ in range(3)]
+        await asyncio.gather(*(form.aprocess_user_input(f"name:{name}") for form, name in zip(forms, ["Ann", "Bob", "Cy"])))
+        return [form.user_info["name"]["value"] for form in forms]
+
+    assert asyncio.run(main()) == ["Ann", "Bob", "Cy"]
+    assert len(batches) == 1
@@ -0,0 +1,63 @@
+import os
+import threading
+
+from prompt.prompt import PROMPT_DIR, CompiledTemplate, PromptRegistry, get_prompt, set_var
+
+
+def write(path, text, mtime_ns):
+    path.write_text(text)
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_render_matches_set_var(tmp_path):
+    text = "Context: {context}\nQuestion: {query}\nKeep {unknown} as is."
+    write(tmp_path / "qa.tmpl", text, 10 ** 18)
+    values = {"context": "The pool opens at nine.", "query": "When?"}
+    assert PromptRegistry(str(tmp_path)).render("qa", values) == set_var(text, values)
+
+
+def test_template_is_reloaded_when_its_mtime_changes(tmp_path):
+    path = tmp_path / "greet.tmpl"
+    write(path, "Hello {name}", 10 ** 18)
+    registry = PromptRegistry(str(tmp_path), check_interval=0)
+    assert registry.render("greet", {"name": "Ann"}) == "Hello Ann"
+    write(path, "Goodbye {name}!", 2 * 10 ** 18)
+    assert registry.render("greet", {"name": "Ann"}) == "Goodbye Ann!"
+
+
+def test_mtimes_are_checked_at_most_once_per_interval(tmp_path):
+    path = tmp_path / "greet.tmpl"
+    write(path, "Hello {name}", 10 ** 18)
+    registry = PromptRegistry(str(tmp_path), check_interval=3600)
+    write(path, "Goodbye {name}", 2 * 10 ** 18)
+    assert registry.render("greet", {"name": "Ann"}) == "Hello Ann"
+
+
+def test_render_during_reloads_never_mixes_versions(tmp_path):
+    paths = [str(tmp_path / "old.tmpl"), str(tmp_path / "new.tmpl")]
+    write(tmp_path / "old.tmpl", "A {x} B {y} C", 10 ** 18)
+    write(tmp_path / "new.tmpl", "{y}-{x}", 10 ** 18)
+    template = CompiledTemplate(paths[0])
+    rendered, stop = set(), threading.Event()
+
+    def reload():
+        # flip between two versions of the template as fast as possible
+        while not stop.is_set():
+            template.path = paths[template.path == paths[0]]
+            template.load()
+
+    reloader = threading.Thread(target=reload)
+    reloader.start()
+    try:
+        for _ in range(20000):
+            rendered.add(template.render({"x": "1", "y": "2"}))
+    finally:
+        stop.set()
+        reloader.join()
+    assert rendered <= {"A 1 B 2 C", "2-1"}
+
+
+def test_get_prompt_uses_the_registry_for_the_prompt_folder():
+    path = os.path.join(PROMPT_DIR, "classify_query.tmpl")
+    with open(path) as file:
+        assert get_prompt(path, {"input": "hi"}) == set_var(file.read(), {"input": "hi"})
@@ -0,0 +1,120 @@
+import asyncio
+import time
+
+from langchain_core.documents import BaseDocumentCompressor, Document
+from langchain_core.retrievers import BaseRetriever
+
+from RAG_System.rerank_cache import CachedRerankCompressor, ScoredEnsembleRetriever
+
+
+class CountingReranker(BaseDocumentCompressor):
+    """
+    Stands in for CohereRerank: reverses the candidates and counts its calls.
+    """
+
+    calls: int = 0
+
+    def compress_documents(self, documents, query, callbacks=None):
+        self.calls += 1
+        return [Document(page_content=doc.page_content, metadata={**doc.metadata, "relevance_score": 1.0 / rank})
+                for rank, doc in enumerate(reversed(list(documents)), start=1)][:2]
+
+
+class FixedRetriever(BaseRetriever):
+    texts: list
+
+    def _get_relevant_documents(self, query, *, run_manager):
+        return [Document(page_content=text) for text in self.texts]
+
+
+def candidates(*scores):
+    return [Document(page_content=f"chunk {i}", metadata={"chunk_id": f"c{i}", "fusion_score": score})
+            for i, score in enumerate(scores)]
+
+
+def make(**kwargs):
+    reranker = CountingReranker()
+    return reranker, CachedRerankCompressor(base_compressor=reranker, top_n=2, **kwargs)
+
+
+def test_repeated_query_is_served_from_the_cache():
+    reranker, compressor = make()
+    first = compressor.compress_documents(candidates(0.5, 0.4, 0.3), "Pool opening hours?")
+    second = compressor.compress_documents(candidates(0.5, 0.4, 0.3), "  pool OPENING hours ")
+    assert reranker.calls == 1
+    assert [(doc.page_content, doc.metadata["relevance_score"]) for doc in second] == \
+        [(doc.page_content, doc.metadata["relevance_score"]) for doc in first]
+    assert compressor.stats() == {"hits": 1, "misses": 1, "skips": 0, "entries": 1}
+
+
+def test_other_candidates_miss_the_cache():
+    reranker, compressor = make()
+    compressor.compress_documents(candidates(0.5, 0.4, 0.3), "pool hours")
+    compressor.compress_documents(candidates(0.5, 0.4), "pool hours")
+    compressor.compress_documents(candidates(0.5, 0.4, 0.3), "breakfast hours")
+    assert reranker.calls == 3
+
+
+def test_entries_expire_and_are_evicted():
+    reranker, compressor = make(ttl_seconds=0.01)
+    compressor.compress_documents(candidates(0.5, 0.4), "pool hours")
+    time.sleep(0.02)
+    compressor.compress_documents(candidates(0.5, 0.4), "pool hours")
+    assert reranker.calls == 2
+    reranker, compressor = make(max_entries=1)
+    compressor.compress_documents(candidates(0.5, 0.4), "pool hours")
+    compressor.compress_documents(candidates(0.5, 0.4), "breakfast hours")
+    compressor.compress_documents(candidates(0.5, 0.4), "pool hours")
+    assert reranker.calls == 3
+    assert compressor.stats()["entries"] == 1
+
+
+def test_clear_winner_skips_the_reranker():
+    reranker, compressor = make(skip_margin=0.5)
+    kept = compressor.compress_documents(candidates(0.9, 0.2, 0.1), "pool hours")
+    assert reranker.calls == 0
+    assert [doc.metadata["chunk_id"] for doc in kept] == ["c0", "c1"]
+    compressor.compress_documents(candidates(0.5, 0.4, 0.3), "pool hours")
+    assert reranker.calls == 1
+    assert compressor.stats()["skips"] == 1
+
+
+def test_async_path_shares_the_cache():
+    reranker, compressor = make()
+    compressor.compress_documents(candidates(0.5, 0.4, 0.3), "pool hours")
+    asyncio.run(compressor.acompress_documents(candidates(0.5, 0.4, 0.3), "pool hours"))
+    assert reranker.calls == 1
+    assert compressor.hits == 1
+
+
+def test_fusion_scores_are_kept_in_metadata():
+    ensemble = ScoredEnsembleRetriever(retrievers=[FixedRetriever(texts=["a", "b"]), FixedRetriever(texts=["b", "c"])],
+                                       weights=[0.7, 0.3])
+    fused = ensemble.invoke("query")
+    assert [doc.page_content for doc in fused] == ["b", "a", "c"]
+    assert fused[0].metadata["fusion_score"] == 0.7 / 62 + 0.3 / 61
+    assert [doc.page_content for doc in asyncio.run(ensemble.ainvoke("query"))] == ["b", "a", "c"]
+
+
+def test_skip_is_opt_in():
+    reranker, compressor = make()
+    compressor.compress_documents(candidates(0.9, 0.01), "pool hours")
+    assert reranker.calls == 1
+    assert compressor.skips == 0
+
+
+def test_pipeline_reranks_every_query_unless_asked_not_to():
+    from langchain_community.vectorstores import FAISS
+
+    from rag_pipeline import retriever_maker_for_rag_and_compressor
+    from stubs import HashingEmbeddings, KeywordOverlapReranker
+
+    chunks = [Document(page_content=text) for text in ("the pool opens at nine", "breakfast is at seven")]
+    vectorstore = FAISS.from_documents(chunks, HashingEmbeddings(dim=32))
+    retriever = retriever_maker_for_rag_and_compressor(vectorstore, chunks, reranker=KeywordOverlapReranker())
+    assert retriever.base_compressor.skip_margin is None
+    assert retriever.invoke("when does the pool open")[0].page_content == "the pool opens at nine"
+    assert retriever.base_compressor.stats()["misses"] == 1
+    retriever = retriever_maker_for_rag_and_compressor(vectorstore, chunks, reranker=KeywordOverlapReranker(),
+                                                       rerank_skip_margin=0.25)
+    assert retriever.base_compressor.skip_margin == 0.25
@@ -0,0 +1,74 @@
+import asyncio
+
+from langchain_core.documents import Document
+from langchain_core.runnables import RunnableLambda
+
+from rag_pipeline import aroute_user_input
+from source.semantic_cache import SemanticAnswerCache, corpus_version
+from stubs import HashingEmbeddings
+
+
+def make(**kwargs):
+    return SemanticAnswerCache(HashingEmbeddings(dim=64), **kwargs)
+
+
+def test_similar_question_hits_and_other_question_misses():
+    cache = make(threshold=0.8)
+    cache.put("When does the pool open?", "At nine.")
+    assert cache.get("when does the pool open")[0] == "At nine."
+    assert cache.get("Where can I park my car?")[0] is None
+    assert cache.stats() == {"hits": 1, "misses": 1, "hit_rate": 0.5, "entries": 1}
+
+
+def test_miss_vector_is_reused_by_put():
+    cache = make()
+    answer, vector = cache.get("When does the pool open?")
+    assert answer is None
+    cache.put("When does the pool open?", "At nine.", vector)
+    assert cache.get("When does the pool open?")[0] == "At nine."
+
+
+def test_new_corpus_version_empties_the_cache():
+    version = ["v1"]
+    cache = make(corpus_version=lambda: version[0])
+    cache.put("When does the pool open?", "At nine.")
+    assert cache.get("When does the pool open?")[0] == "At nine."
+    version[0] = "v2"
+    assert cache.get("When does the pool open?")[0] is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_corpus_version_follows_the_chunks():
+    chunks = [Document(page_content="pool at nine", metadata={"source": "a.txt"})]
+    assert corpus_version(chunks) == corpus_version([Document(page_content="pool at nine", metadata={"source": "a.txt"})])
+    assert corpus_version(chunks) != corpus_version([Document(page_content="pool at ten", metadata={"source": "a.txt"})])
+
+
+def test_least_recently_used_answer_is_replaced():
+    cache = make(max_entries=2)
+    cache.put("When does the pool open?", "At nine.")
+    cache.put("When is breakfast served?", "From seven.")
+    cache.get("When does the pool open?")
+    cache.put("Where can I park my car?", "In the garage.")
+    assert cache.get("When does the pool open?")[0] == "At nine."
+    assert cache.get("When is breakfast served?")[0] is None
+    assert cache.get("Where can I park my car?")[0] == "In the garage."
+
+
+def test_cached_answer_does_not_hide_a_booking_request():
+    cache = make(threshold=0.5)
+    answers = []
+    answer_chain = RunnableLambda(lambda inputs: answers.append(inputs["query"]) or "fresh answer")
+    retriever = RunnableLambda(lambda query: [])
+    classifier = RunnableLambda(lambda inputs: "Appointment" if "appointment" in inputs["input"] else "Normal")
+
+    def route(query):
+        return asyncio.run(aroute_user_input(query, classifier, retriever, answer_chain, semantic_cache=cache))
+
+    assert route("Can I get a spa appointment on Monday?") == ("Appointment", None)
+    assert route("Is the spa open on Monday?") == ("Normal", "fresh answer")
+    assert route("is the spa open on monday") == ("Normal", "fresh answer")
+    assert answers == ["Is the spa open on Monday?"]
+    # close enough to the cached question to hit, but classified as a booking
+    assert cache.get("Is the spa open on Monday for an appointment?")[0] == "fresh answer"
+    assert route("Is the spa open on Monday for an appointment?") == ("Appointment", None)
@@ -0,0 +1,96 @@
+import asyncio
+
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+from langchain_core.runnables import RunnableLambda
+from sqlalchemy import create_engine, inspect
+from sqlalchemy.orm import sessionmaker
+
+from server import ChatServer, Overloaded
+from source import chat_session
+
+
+@pytest.fixture(autouse=True)
+def session_db(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'chat.db'}")
+    monkeypatch.setattr(chat_session, "engine", engine)
+    monkeypatch.setattr(chat_session, "SessionLocal", sessionmaker(autocommit=False, autoflush=False, bind=engine))
+    monkeypatch.setattr(chat_session, "_tables_ready", False)
+    return engine
+
+
+def make_server(**kwargs):
+    classifier = RunnableLambda(lambda inputs: "Appointment" if "book" in inputs["input"] else "Normal")
+    retriever = RunnableLambda(lambda query: [])
+    answer_chain = RunnableLambda(lambda inputs: f"answer to {inputs['query']}")
+    return ChatServer(classifier, retriever, answer_chain, **kwargs)
+
+
+async def post(server, **kwargs):
+    async with TestClient(TestServer(server.make_app())) as client:
+        response = await client.post("/chat", **kwargs)
+        return response.status, await response.json()
+
+
+def test_sessions_are_created_on_first_use(session_db):
+    first = chat_session.get_or_create_session("alice")
+    assert chat_session.get_or_create_session("alice").id == first.id
+    assert chat_session.get_or_create_session("bob").id != first.id
+    assert (first.model, first.temperature, first.hack_prompt) == ("gpt-4o", 0.5, "")
+    columns = {column["name"] for column in inspect(session_db).get_columns(chat_session.ChatSession.__tablename__)}
+    assert {"model", "temperature", "hack_prompt"} <= columns
+
+
+def test_post_chat_answers():
+    status, body = asyncio.run(post(make_server(), json={"session": "alice", "message": "When is breakfast?"}))
+    assert (status, body) == (200, {"type": "answer", "reply": "answer to When is breakfast?"})
+
+
+@pytest.mark.parametrize("kwargs", [
+    {"data": "not json", "headers": {"Content-Type": "application/json"}},
+    {"json": ["alice", "hello"]},
+    {"json": {"session": "alice"}},
+])
+def test_post_chat_rejects_bad_requests(kwargs):
+    status, body = asyncio.run(post(make_server(), **kwargs))
+    assert status == 400
+    assert set(body) == {"error"}
+
+
+def test_requests_beyond_max_waiting_are_rejected():
+    async def main():
+        server = make_server(max_concurrent_llm=1, max_waiting=1)
+        async with server.llm_slot():
+            waiting = asyncio.create_task(server.handle_message("alice", "When is breakfast?"))
+            while server._waiting == 0:
+                await asyncio.sleep(0.01)
+            with pytest.raises(Overloaded):
+                await server.handle_message("bob", "Where is the pool?")
+        return await waiting
+
+    assert asyncio.run(main()) == {"type": "answer", "reply": "answer to When is breakfast?"}
+
+
+def test_post_chat_returns_503_when_overloaded():
+    async def main():
+        server = make_server(max_waiting=0)
+        async with TestClient(TestServer(server.make_app())) as client:
+            response = await client.post("/chat", json={"session": "alice", "message": "hi"})
+            return response.status, response.headers.get("Retry-After")
+
+    assert asyncio.run(main()) == (503, "1")
+
+
+def test_health_reports_sessions():
+    async def main():
+        server = make_server()
+        async with TestClient(TestServer(server.make_app())) as client:
+            await client.post("/chat", json={"session": "alice", "message": "hi"})
+            await client.post("/chat", json={"session": "alice", "message": "hello"})
+            response = await client.get("/health")
+            return await response.json()
+
+    body = asyncio.run(main())
+    assert body["sessions"] == 1
+    assert body["waiting"] == 0
+    assert set(body["form_extraction"]) == {"completed_bookings", "llm_calls_per_booking", "llm_calls_avoided_per_booking"}
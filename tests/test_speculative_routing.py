@@ -0,0 +1,102 @@
+import asyncio
+
+from langchain_core.documents import Document
+from langchain_core.runnables import RunnableLambda, RunnablePassthrough
+
+from rag_pipeline import aroute_user_input, handle_user_input, run_sync, split_qa_chain
+
+DOCS = [Document(page_content="The pool opens at nine.")]
+
+
+def sync_unused(*args):
+    raise AssertionError("the async path should be used")
+
+
+class SlowRetriever:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.started = asyncio.Event()
+        self.cancelled = False
+
+    def runnable(self):
+        async def retrieve(query):
+            self.started.set()
+            try:
+                await asyncio.sleep(self.delay)
+            except asyncio.CancelledError:
+                self.cancelled = True
+                raise
+            return DOCS
+        return RunnableLambda(sync_unused, afunc=retrieve)
+
+
+def classifier_waiting_for(retriever, label):
+    async def classify(inputs):
+        # only returns once retrieval is running, so the test hangs if the two are sequential
+        await asyncio.wait_for(retriever.started.wait(), timeout=2)
+        return label
+    return RunnableLambda(sync_unused, afunc=classify)
+
+
+def answer_from_context(inputs):
+    return f"{inputs['context'][0].page_content} ({inputs['query']})"
+
+
+def test_retrieval_runs_while_the_query_is_classified():
+    async def main():
+        retriever = SlowRetriever()
+        return await aroute_user_input("When does the pool open?", classifier_waiting_for(retriever, "Normal"),
+                                       retriever.runnable(), RunnableLambda(answer_from_context))
+
+    assert asyncio.run(main()) == ("Normal", "The pool opens at nine. (When does the pool open?)")
+
+
+def test_appointment_cancels_the_speculative_retrieval():
+    async def main():
+        retriever = SlowRetriever(delay=10)
+        answers = []
+        result = await aroute_user_input("I need a spa slot", classifier_waiting_for(retriever, "Appointment"),
+                                         retriever.runnable(), RunnableLambda(answers.append))
+        return result, retriever.cancelled, answers
+
+    assert asyncio.run(main()) == (("Appointment", None), True, [])
+
+
+def test_trigger_phrase_skips_classification_and_retrieval():
+    retriever = RunnableLambda(sync_unused)
+    classifier = RunnableLambda(sync_unused)
+    assert asyncio.run(aroute_user_input("Please call me tomorrow", classifier, retriever,
+                                         RunnableLambda(sync_unused))) == ("Appointment", None)
+
+
+def test_split_qa_chain():
+    retriever = RunnableLambda(lambda query: DOCS)
+    answer = RunnableLambda(answer_from_context)
+    qa_chain = {"context": retriever, "query": RunnablePassthrough()} | answer
+    assert split_qa_chain(qa_chain) == (retriever, answer)
+    assert split_qa_chain(answer) == (None, None)
+
+
+def test_handle_user_input_with_a_qa_chain():
+    qa_chain = {"context": RunnableLambda(lambda query: DOCS), "query": RunnablePassthrough()} | RunnableLambda(answer_from_context)
+    classifier = RunnableLambda(lambda inputs: "Normal")
+    assert handle_user_input("When?", classifier, qa_chain) == "The pool opens at nine. (When?)"
+    pieces = []
+    assert handle_user_input("When?", classifier, qa_chain, on_token=pieces.append) == "The pool opens at nine. (When?)"
+    assert "".join(pieces) == "The pool opens at nine. (When?)"
+
+
+def test_handle_user_input_with_another_chain():
+    chain = RunnableLambda(lambda query: f"echo {query}")
+    assert handle_user_input("hello", RunnableLambda(lambda inputs: "Normal"), chain) == "echo hello"
+
+
+def test_run_sync_inside_a_running_loop():
+    async def double(value):
+        return value * 2
+
+    async def main():
+        return run_sync(double(21))
+
+    assert run_sync(double(2)) == 4
+    assert asyncio.run(main()) == 42
@@ -0,0 +1,130 @@
+import asyncio
+import random
+
+from langchain_core.runnables import RunnableLambda
+
+from rag_pipeline import astream_user_input
+from source.chain import FakeChatModel
+from source.streaming import MarkdownStreamBuffer, StreamMetrics, StreamMetricsRecorder, astream_markdown
+
+ANSWER = ("The **opening hours** are listed in `hours.md`, see [the FAQ](https://example.com/faq).\n"
+          "```python\nprint('hello world')\n```\nDone.")
+
+
+def stream(text, pieces, max_holdback=200):
+    buffer = MarkdownStreamBuffer(max_holdback=max_holdback)
+    chunks = [buffer.feed(piece) for piece in pieces]
+    return [chunk for chunk in chunks if chunk], buffer.flush()
+
+
+def random_pieces(text, seed):
+    rng = random.Random(seed)
+    cuts = sorted(rng.sample(range(1, len(text)), 30))
+    return [text[start:end] for start, end in zip([0] + cuts, cuts + [len(text)])]
+
+
+def test_output_concatenates_to_input():
+    for seed in range(20):
+        chunks, rest = stream(ANSWER, random_pieces(ANSWER, seed))
+        assert "".join(chunks) + rest == ANSWER
+
+
+def test_words_are_never_split():
+    chunks, rest = stream("Hello world again", ["Hel", "lo wor", "ld ag", "ain"])
+    assert chunks == ["Hello ", "world "]
+    assert rest == "again"
+
+
+def test_emphasis_is_held_until_closed():
+    buffer = MarkdownStreamBuffer()
+    assert buffer.feed("this is **very ") == "this is "
+    assert buffer.feed("bold** text ") == "**very bold** text "
+
+
+def test_inline_code_and_links_are_held_until_closed():
+    buffer = MarkdownStreamBuffer()
+    assert buffer.feed("run `pip install ") == "run "
+    assert buffer.feed("faiss` now ") == "`pip install faiss` now "
+    assert buffer.feed("see [the ") == "see "
+    assert buffer.feed("FAQ](https://exa") == ""
+    assert buffer.feed("mple.com) ok ") == "[the FAQ](https://example.com) ok "
+
+
+def test_code_fence_releases_whole_lines():
+    buffer = MarkdownStreamBuffer()
+    assert buffer.feed("```python\nprint('a b') ") == "```python\n"
+    assert buffer.feed("\nx = 1") == "print('a b') \n"
+    assert buffer.in_fence
+    assert buffer.feed("\n```\n") == "x = 1\n```\n"
+    assert not buffer.in_fence
+
+
+def test_every_chunk_is_balanced_markdown():
+    for seed in range(20):
+        chunks, _ = stream(ANSWER, random_pieces(ANSWER, seed))
+        released = ""
+        for chunk in chunks:
+            released += chunk
+            if "```" not in released:
+                assert released.count("**") % 2 == 0
+                assert released.count("`") % 2 == 0
+
+
+def test_flush_releases_everything():
+    buffer = MarkdownStreamBuffer()
+    assert buffer.feed("an **unclosed") == "an "
+    assert buffer.flush() == "**unclosed"
+    assert buffer.pending == ""
+
+
+def test_max_holdback_bounds_the_wait():
+    buffer = MarkdownStreamBuffer(max_holdback=10)
+    assert buffer.feed("**") == ""
+    assert buffer.feed("never closed at all ") == "**never closed at all "
+
+
+async def collect(stream):
+    return [item async for item in stream]
+
+
+def test_astream_markdown_counts_model_tokens():
+    model = FakeChatModel(response_fn=lambda prompt: ANSWER)
+    metrics = StreamMetrics()
+    pieces = asyncio.run(collect(astream_markdown(model, "hi", metrics=metrics)))
+    assert "".join(pieces) == ANSWER
+    assert metrics.tokens == len(ANSWER.split(" "))
+    assert metrics.ttft is not None and metrics.tokens_per_second is None
+    metrics.finish()
+    assert metrics.as_dict()["tokens"] == metrics.tokens
+    assert metrics.as_dict()["total_seconds"] >= metrics.ttft
+
+
+def test_metrics_without_tokens():
+    metrics = StreamMetrics().finish()
+    assert metrics.as_dict()["ttft_seconds"] is None
+    assert metrics.tokens_per_second is None
+
+
+def test_recorder_summary_keeps_the_last_entries():
+    recorder = StreamMetricsRecorder(max_entries=3)
+    assert recorder.summary() == {"requests": 0}
+    for ttft in (9.0, 1.0, 2.0, 3.0):
+        metrics = StreamMetrics()
+        metrics.started, metrics.first_token_at, metrics.finished_at, metrics.tokens = 0.0, ttft, ttft + 1, 10
+        recorder.record(metrics)
+    summary = recorder.summary()
+    assert summary["requests"] == 3
+    assert summary["ttft_p50"] == 2.0
+    assert summary["tokens_per_second_mean"] == 10.0
+
+
+def test_astream_user_input_yields_classification_tokens_and_metrics():
+    recorder = StreamMetricsRecorder()
+    answer_chain = FakeChatModel(response_fn=lambda prompt: "The pool opens at **nine**.")
+    events = asyncio.run(collect(astream_user_input(
+        "When does the pool open?", RunnableLambda(lambda inputs: "Normal"), RunnableLambda(lambda query: []),
+        RunnableLambda(lambda inputs: inputs["query"]) | answer_chain, metrics_recorder=recorder)))
+    assert events[0] == ("classification", "Normal")
+    assert "".join(value for kind, value in events if kind == "token") == "The pool opens at **nine**."
+    assert events[-1][0] == "metrics" and events[-1][1]["tokens"] == 5
+    assert recorder.summary()["requests"] == 1
@@ -0,0 +1,69 @@
+import random
+
+import pytest
+import tiktoken
+from langchain_core.documents import Document
+
+from RAG_System import vector_store_maker
+from RAG_System.vector_store_maker import CharacterTextSplitting, TokenTextSplitting
+
+WORDS = ["pool", "opens", "at", "nine", "the", "spa", "breakfast", "is", "served", "from", "seven", "parking"]
+
+
+@pytest.fixture(autouse=True)
+def offline_encoding(monkeypatch, byte_encoding):
+    # both the reference splitter and the chunker ask tiktoken for cl100k_base
+    monkeypatch.setattr(tiktoken, "get_encoding", lambda name: byte_encoding)
+    monkeypatch.setattr(vector_store_maker, "get_encoder", lambda name="cl100k_base": byte_encoding)
+
+
+def random_text(rng, paragraphs):
+    return "\n\n".join(" ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 30)))
+                       for _ in range(paragraphs))
+
+
+def set_sizes(monkeypatch, chunk_size, chunk_overlap):
+    for splitter in (CharacterTextSplitting, TokenTextSplitting):
+        monkeypatch.setitem(splitter.params, "chunk_size", chunk_size)
+        monkeypatch.setitem(splitter.params, "chunk_overlap", chunk_overlap)
+
+
+@pytest.mark.parametrize("chunk_size,chunk_overlap", [(60, 0), (120, 40), (300, 100)])
+def test_chunks_match_the_tiktoken_character_splitter(monkeypatch, chunk_size, chunk_overlap):
+    set_sizes(monkeypatch, chunk_size, chunk_overlap)
+    rng = random.Random(chunk_size)
+    documents = [Document(page_content=random_text(rng, rng.randint(1, 40)), metadata={"page": i}) for i in range(20)]
+    expected = CharacterTextSplitting(documents).chunking()
+    chunks = TokenTextSplitting(documents).chunking()
+    assert len(chunks) > len(documents)
+    assert [chunk.page_content for chunk in chunks] == [chunk.page_content for chunk in expected]
+    assert [chunk.metadata for chunk in chunks] == [chunk.metadata for chunk in expected]
+
+
+def test_split_texts_respects_size_and_overlap(monkeypatch, byte_encoding):
+    set_sizes(monkeypatch, 50, 20)
+    text = "\n\n".join(f"paragraph {i:02d}" for i in range(30))
+    chunks = TokenTextSplitting([]).split_texts([text, "", "short"])
+    assert chunks[1:] == [[], ["short"]]
+    assert all(len(byte_encoding.encode(chunk)) <= 50 for chunk in chunks[0])
+    # consecutive chunks share their boundary paragraphs
+    assert all(previous.split("\n\n")[-1] in chunk for previous, chunk in zip(chunks[0], chunks[0][1:]))
+
+
+def test_metadata_is_copied_per_chunk(monkeypatch):
+    set_sizes(monkeypatch, 20, 0)
+    source = Document(page_content="first part here\n\nsecond part here", metadata={"tags": ["cv"]})
+    chunks = TokenTextSplitting([source]).chunking()
+    assert len(chunks) == 2
+    chunks[0].metadata["tags"].append("changed")
+    assert chunks[1].metadata == source.metadata == {"tags": ["cv"]}
+
+
+def test_iter_chunking_matches_chunking(monkeypatch):
+    set_sizes(monkeypatch, 80, 20)
+    rng = random.Random(3)
+    documents = [Document(page_content=random_text(rng, 10)) for _ in range(5)]
+    monkeypatch.setattr(vector_store_maker, "batched_documents",
+                        lambda docs, max_chars=4 << 20: ([doc] for doc in docs))
+    splitter = TokenTextSplitting(documents)
+    assert list(splitter.iter_chunking(documents)) == splitter.chunking()
@@ -0,0 +1,146 @@
+import asyncio
+import json
+import time
+
+import pytest
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.runnables import RunnableLambda
+
+import conversationa_form
+from rag_pipeline import aroute_user_input, astream_user_input
+from source.chain import FakeChatModel
+from source.tracing import NOOP_SPAN, Tracer, current_span, span, traced, traced_iter, tracer
+
+
+@pytest.fixture
+def tracing():
+    tracer.reset()
+    tracer.enable()
+    yield tracer
+    tracer.disable()
+    tracer.reset()
+
+
+def test_disabled_tracer_hands_out_the_noop_span():
+    quiet = Tracer()
+    with quiet.span("stage") as stage:
+        stage.add("tokens", 3)
+    assert stage is NOOP_SPAN
+    assert quiet.summary() == {}
+
+
+def test_nested_spans_record_parents_counters_and_errors(tmp_path):
+    path = tmp_path / "spans.jsonl"
+    local = Tracer(enabled=True, jsonl_path=str(path))
+    with local.span("outer", file_type="pdf") as outer:
+        with local.span("inner") as inner:
+            inner.add("documents", 2)
+            inner.add("documents")
+    with pytest.raises(KeyError):
+        with local.span("inner"):
+            raise KeyError("boom")
+    local.disable()
+
+    records = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [record["name"] for record in records] == ["inner", "outer", "inner"]
+    assert records[0]["parent_id"] == outer.span_id and records[1]["parent_id"] is None
+    assert records[1]["attributes"] == {"file_type": "pdf"}
+    assert records[2]["error"] == "KeyError"
+    summary = local.summary()
+    assert summary["inner"]["count"] == 2 and summary["inner"]["errors"] == 1 and summary["inner"]["documents"] == 3
+
+
+def test_prometheus_text():
+    local = Tracer(enabled=True)
+    with local.span("rerank") as rerank:
+        rerank.add("cache_hits")
+    text = local.prometheus_text()
+    assert 'pipeline_span_duration_seconds_bucket{span="rerank",le="+Inf"} 1' in text
+    assert 'pipeline_span_duration_seconds_count{span="rerank"} 1' in text
+    assert 'pipeline_span_errors_total{span="rerank"} 0' in text
+    assert 'pipeline_span_counter_total{span="rerank",counter="cache_hits"} 1' in text
+
+
+def test_traced_functions_get_a_span(tracing):
+    @traced("stage.sync")
+    def work():
+        current_span().add("items", 2)
+        return "done"
+
+    @traced()
+    async def async_work():
+        return "async done"
+
+    assert work() == "done"
+    assert asyncio.run(async_work()) == "async done"
+    summary = tracing.summary()
+    assert summary["stage.sync"]["items"] == 2
+    assert summary[async_work.__qualname__]["count"] == 1
+
+
+def test_spacy_name_extraction_is_traced(tracing, monkeypatch):
+    class NoEntities:
+        def pipe(self, texts, batch_size):
+            return []
+
+    monkeypatch.setattr(conversationa_form, "get_nlp", NoEntities)
+    conversationa_form.extract_person_names([])
+    assert tracing.summary()["form.name_extraction"]["count"] == 1
+
+
+def test_answer_length_has_the_same_unit_streamed_or_not(tracing):
+    answer = "The pool opens at nine."
+    classifier, retriever = RunnableLambda(lambda inputs: "Normal"), RunnableLambda(lambda query: [])
+    answer_chain = (RunnableLambda(lambda inputs: inputs["query"]) | FakeChatModel(response_fn=lambda prompt: answer)
+                    | StrOutputParser())
+
+    async def main():
+        await aroute_user_input("When?", classifier, retriever, answer_chain)
+        async for _ in astream_user_input("When?", classifier, retriever, answer_chain, metrics_recorder=None):
+            pass
+
+    asyncio.run(main())
+    qa = tracing.summary()["qa_chain"]
+    assert qa["count"] == 2
+    assert qa["output_chars"] == 2 * len(answer)
+
+
+def test_module_span_follows_the_global_tracer(tracing):
+    with span("classifier"):
+        pass
+    assert tracing.summary()["classifier"]["count"] == 1
+
+
+def test_streamed_stages_only_time_their_own_work(tracing):
+    def slow(items, seconds):
+        for item in items:
+            time.sleep(seconds)
+            yield item
+
+    parsed = traced_iter("parse", slow(range(3), 0.02))
+    split = traced_iter("split", slow(parsed, 0.01), counter="chunks")
+    for _ in split:
+        time.sleep(0.05)
+    summary = tracing.summary()
+    assert summary["parse"]["count"] == summary["split"]["count"] == 1
+    assert summary["parse"]["items"] == summary["split"]["chunks"] == 3
+    assert 60 <= summary["parse"]["mean_ms"] < 100
+    # neither the parser pulled by the splitter nor the consumer's sleeps are counted
+    assert 30 <= summary["split"]["mean_ms"] < 60
+
+
+def test_streamed_stage_records_errors_and_parents(tracing, tmp_path):
+    def failing():
+        yield 1
+        raise KeyError("boom")
+
+    path = tmp_path / "spans.jsonl"
+    tracing.enable(jsonl_path=str(path))
+    with span("ingest") as ingest:
+        with pytest.raises(KeyError):
+            list(traced_iter("parse", failing(), file_type="txt"))
+    tracing.disable()
+    records = {record["name"]: record for record in map(json.loads, path.read_text().splitlines())}
+    assert records["parse"]["parent_id"] == ingest.span_id
+    assert records["parse"]["error"] == "KeyError" and records["parse"]["counters"] == {"items": 1}
+    assert records["parse"]["attributes"] == {"file_type": "txt"}